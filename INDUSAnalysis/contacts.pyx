@@ -15,11 +15,236 @@ from tqdm import tqdm
 
 from INDUSAnalysis import timeseries
 from INDUSAnalysis.lib import profiling
+from INDUSAnalysis.lib.histogram import FixedBinHistogram
 
 """Cython"""
 cimport numpy as np
 
 
+class ResidueContactsAccumulator:
+    """
+    Accumulates residue-level contact map from the contacts of candidate atom pairs
+    formed at each timestep.
+
+    Atom pairs are mapped to residue pairs through a precomputed index, so that
+    memory and output size scale with the number of residues instead of the
+    number of atoms.
+
+    Args:
+        mode (str): "any" to count a residue pair as in contact if any of its atom pairs
+            is in contact, "count" to count the number of atom pairs in contact
+            (default = "any").
+
+    Raises:
+        ValueError if mode is not recognized.
+    """
+    def __init__(self, mode="any"):
+        if mode not in ["any", "count"]:
+            raise ValueError("Residue contact map mode not recognized")
+        self.mode = mode
+
+    def setup(self, sel, pair_i, pair_j, nframes):
+        """
+        Precomputes residue pair index of each candidate atom pair i < j.
+
+        Args:
+            sel (mda.AtomGroup): Atoms to calculate contacts between.
+            pair_i (np.array): Index i in sel of each candidate pair.
+            pair_j (np.array): Index j in sel of each candidate pair.
+            nframes (int): Number of timesteps.
+        """
+        self.resindices, atom_to_res = np.unique(sel.resindices, return_inverse=True)
+        self.nres = len(self.resindices)
+        # Each atom pair is counted once, and the residue-level map is symmetrized on update
+        self.cand_respair = atom_to_res[pair_i] * self.nres + atom_to_res[pair_j]
+        self.rescontactmatrix = np.zeros(self.nres * self.nres)
+        self.nframes = 0
+
+    def update(self, formed):
+        """
+        Adds residue-level contact map of a single timestep to accumulator.
+
+        Args:
+            formed (np.array): Boolean array of shape (npairs,), True for candidate pairs
+                in contact at timestep.
+        """
+        rescounts = np.bincount(self.cand_respair[formed], minlength=self.nres * self.nres).reshape(self.nres, self.nres)
+        rescounts = (rescounts + rescounts.T - np.diag(np.diag(rescounts))).ravel()
+        if self.mode == "any":
+            self.rescontactmatrix += (rescounts > 0)
+        else:
+            self.rescontactmatrix += rescounts
+        self.nframes += 1
+
+    def mean_rescontactmatrix(self):
+        """
+        Returns:
+            mean_rescontactmatrix (np.array): Array of shape (nres, nres) where
+                mean_rescontactmatrix[i,j] is the fraction of timesteps where residues i and j
+                are in contact ("any" mode) or the mean number of atom contacts between residues
+                i and j ("count" mode).
+        """
+        return self.rescontactmatrix.reshape(self.nres, self.nres) / max(self.nframes, 1)
+
+
+class ContactLifetimesAccumulator:
+    """
+    Records the formation and breaking of candidate contacts along a trajectory by
+    run-length encoding the on/off history of each atom pair on the fly.
+
+    Only a state array and a run start array of size npairs are kept between timesteps.
+    Each time a contact breaks, the run (pair, start frame, length) is appended
+    to the run list. Runs which are still formed at the last timestep are
+    right-censored.
+    """
+    def setup(self, sel, pair_i, pair_j, nframes):
+        """
+        Stores list of candidate atom pairs and initializes run-length encoding.
+
+        Args:
+            sel (mda.AtomGroup): Atoms to calculate contacts between.
+            pair_i (np.array): Index i in sel of each candidate pair.
+            pair_j (np.array): Index j in sel of each candidate pair.
+            nframes (int): Number of timesteps.
+        """
+        self.pair_i, self.pair_j = pair_i, pair_j
+        npairs = len(self.pair_i)
+        self.state = np.zeros(npairs, dtype=bool)
+        self.runstart = np.zeros(npairs, dtype=np.int64)
+        self.run_pairs = []
+        self.run_starts = []
+        self.run_lengths = []
+        self.nformed = []
+        self.nframes = 0
+
+    def update(self, formed):
+        """
+        Updates run-length encoding with contacts formed at a single timestep.
+
+        Args:
+            formed (np.array): Boolean array of shape (npairs,), True for candidate pairs
+                in contact at timestep.
+        """
+        broken = np.nonzero(self.state & ~formed)[0]
+        if len(broken) > 0:
+            self.run_pairs.append(broken)
+            self.run_starts.append(self.runstart[broken])
+            self.run_lengths.append(self.nframes - self.runstart[broken])
+
+        self.runstart[formed & ~self.state] = self.nframes
+        self.state = formed
+        self.nformed.append(np.count_nonzero(formed))
+        self.nframes += 1
+
+    def runs(self):
+        """
+        Returns all contact runs, including runs which are still formed at the last timestep.
+
+        Returns:
+            {
+                pairs (np.array): Index of candidate pair of each run.
+                starts (np.array): Frame at which each run starts.
+                lengths (np.array): Length of each run, in frames.
+                censored (np.array): Boolean array, True if run is still formed at the last timestep.
+            }
+        """
+        openruns = np.nonzero(self.state)[0]
+        pairs = np.concatenate(self.run_pairs + [openruns]).astype(np.int64)
+        starts = np.concatenate(self.run_starts + [self.runstart[openruns]]).astype(np.int64)
+        lengths = np.concatenate(self.run_lengths + [self.nframes - self.runstart[openruns]]).astype(np.int64)
+        censored = np.zeros(len(pairs), dtype=bool)
+        censored[len(pairs) - len(openruns):] = True
+        return pairs, starts, lengths, censored
+
+    def lifetime_distribution(self, include_censored=False):
+        """
+        Calculates distribution of contact lifetimes.
+
+        Args:
+            include_censored (bool): If True, runs which are still formed at the last timestep
+                are included in the distribution.
+
+        Returns:
+            {
+                lifetimes (np.array): Contact lifetimes, in frames.
+                counts (np.array): Number of runs with each lifetime.
+            }
+        """
+        pairs, starts, lengths, censored = self.runs()
+        if not include_censored:
+            lengths = lengths[~censored]
+        counts = np.bincount(lengths, minlength=self.nframes + 1)[1:]
+        lifetimes = np.arange(1, self.nframes + 1)
+        return lifetimes, counts
+
+    def survival_function(self):
+        """
+        Calculates contact survival function S(tau), the probability that a contact
+        formed at time t remains continuously formed until time t + tau,
+        averaged over all pairs and time origins.
+
+        The number of time origins at which contacts are formed with lag tau
+        inside the trajectory is obtained from the run lengths as sum(max(L - tau, 0)).
+
+        Returns:
+            S (np.array): Survival function at lags 0, 1, ..., nframes - 1 (in frames).
+        """
+        pairs, starts, lengths, censored = self.runs()
+        lcounts = np.bincount(lengths, minlength=self.nframes + 1).astype(np.float64)
+        ls = np.arange(self.nframes + 1)
+        # Sums over L > tau of counts(L) * L and counts(L)
+        sum_l = np.cumsum((lcounts * ls)[::-1])[::-1]
+        sum_n = np.cumsum(lcounts[::-1])[::-1]
+        tau = np.arange(self.nframes)
+        numerator = sum_l[tau + 1] - tau * sum_n[tau + 1]
+        return numerator / self._origins()
+
+    def autocorrelation(self, batchsize=256):
+        """
+        Calculates intermittent contact autocorrelation function C(tau) = <h(t) h(t + tau)> / <h(t)>,
+        averaged over all pairs and time origins, which does not require the contact to remain
+        continuously formed.
+
+        Histories are decoded from the runs a batch of pairs at a time, so memory use is
+        limited to batchsize * nframes.
+
+        Args:
+            batchsize (int): Number of pairs to decode at once.
+
+        Returns:
+            C (np.array): Autocorrelation function at lags 0, 1, ..., nframes - 1 (in frames).
+        """
+        pairs, starts, lengths, censored = self.runs()
+        numerator = np.zeros(self.nframes)
+        nfft = 2 * self.nframes
+
+        formed_pairs = np.unique(pairs)
+        for bstart in range(0, len(formed_pairs), batchsize):
+            bpairs = formed_pairs[bstart:bstart + batchsize]
+            rowmap = np.searchsorted(bpairs, pairs)
+            inbatch = (rowmap < len(bpairs))
+            inbatch[inbatch] = (bpairs[rowmap[inbatch]] == pairs[inbatch])
+
+            # Decode runs to histories through +1/-1 steps at run boundaries
+            steps = np.zeros((len(bpairs), self.nframes + 1))
+            np.add.at(steps, (rowmap[inbatch], starts[inbatch]), 1)
+            np.add.at(steps, (rowmap[inbatch], starts[inbatch] + lengths[inbatch]), -1)
+            h = np.cumsum(steps[:, :-1], axis=1)
+
+            hf = np.fft.rfft(h, n=nfft, axis=1)
+            numerator += np.fft.irfft(hf * np.conj(hf), n=nfft, axis=1)[:, :self.nframes].sum(axis=0)
+
+        return numerator / self._origins()
+
+    def _origins(self):
+        """
+        Returns number of formed contacts at time origins t <= nframes - 1 - tau, for each lag tau.
+        """
+        origins = np.cumsum(self.nformed)[::-1].astype(np.float64)
+        origins[origins == 0] = np.inf
+        return origins
+
+
 class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
     def __init__(self):
         super().__init__()
@@ -33,6 +258,15 @@ class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
         self.calc_args.add_argument("-bins", help="Number of bins for histogram (default = 20)")
         self.calc_args.add_argument("-refcontacts", help="Reference number of contacts for fraction (default = mean)")
         self.calc_args.add_argument("-alk_resname", type=str, default="ALK", help="Residue name of alkane atoms (default = ALK)")
+        self.calc_args.add_argument("--lifetimes", action='store_true', help="Also calculate contact lifetime distribution, survival function and autocorrelation")
+        self.calc_args.add_argument("-resmap", help="Calculate residue-level contact map instead of atom-level contact map (any = any atom pair in contact, count = number of atom pairs in contact; default = none)")
+
+        # Native contacts (Best-Hummer-Eaton fraction of native contacts, Q)
+        self.calc_args.add_argument("--native", action='store_true', help="Calculate fraction of native contacts Q(t) over a fixed native pair list instead of all contacts")
+        self.calc_args.add_argument("-nativestructf", help="Structure file (.gro, .pdb) to extract native contacts from (default = frame -nativetstep of trajf)")
+        self.calc_args.add_argument("-nativetstep", help="Frame index of trajf to extract native contacts from, if -nativestructf is not specified (default = 0)")
+        self.calc_args.add_argument("-Qbeta", help="Smoothing parameter of native contacts switching function, in 1/A (default = 5 1/A)")
+        self.calc_args.add_argument("-Qlambda", help="Native distance tolerance factor of native contacts switching function (default = 1.8)")
 
         # Modification useful for polymer simulations.
         #
@@ -79,6 +313,9 @@ class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
 
         self.alk_resname = self.args.alk_resname
 
+        self.resmap = self.args.resmap
+        self.lifetimes = self.args.lifetimes
+
         self.apsp_structf = self.args.apsp_structf
         if self.apsp_structf is None:
             self.apsp_structf = self.structf
@@ -95,13 +332,34 @@ class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
         else:
             self.bins = 20
 
+        self.native = self.args.native
+        self.nativestructf = self.args.nativestructf
+
+        self.nativetstep = self.args.nativetstep
+        if self.nativetstep is not None:
+            self.nativetstep = int(self.nativetstep)
+        else:
+            self.nativetstep = 0
+
+        self.Qbeta = self.args.Qbeta
+        if self.Qbeta is not None:
+            self.Qbeta = float(self.Qbeta)
+        else:
+            self.Qbeta = 5.0
+
+        self.Qlambda = self.args.Qlambda
+        if self.Qlambda is not None:
+            self.Qlambda = float(self.Qlambda)
+        else:
+            self.Qlambda = 1.8
+
         self.verbose = self.args.verbose
 
         # Initialize universes
         self.u = mda.Universe(self.structf, self.trajf)
         self.u_apsp = mda.Universe(self.apsp_structf)
 
-    def calc_trajcontacts(self, u, method, distcutoff, connthreshold, start_time, end_time, skip):
+    def calc_trajcontacts(self, u, method, distcutoff, connthreshold, start_time, end_time, skip, accumulators=(), dense=True):
         """
         Calculates contacts between heavy atoms along a trajectory.
 
@@ -113,6 +371,9 @@ class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
             start_time (float): Time to start averaging at.
             end_time (float): Time to end averaging at.
             skip (int): Frequency.
+            accumulators (list): ContactsAccumulator objects to pass the contacts of candidate pairs
+                formed at each timestep to (optional).
+            dense (bool): If True, calculate dense mean contact matrix (default = True).
 
         Returns:
             {
@@ -121,23 +382,23 @@ class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
 
                 mean_contactmatrix(np.array): Array of shape (nheavy, nheavy) where
                     mean_contactmatrix[i,j] is ratio of number of timesteps where the contact
-                    [i,j] is formed to the total number of timesteps.
+                    [i,j] is formed to the total number of timesteps (None if not dense).
             }
 
         Raises:
             ValueError if calculation method is not recognized.
         """
         if method == "alk-ua":
-            return self.calc_trajcontacts_alk_ua(u, distcutoff, connthreshold, start_time, end_time, skip)
+            return self.calc_trajcontacts_alk_ua(u, distcutoff, connthreshold, start_time, end_time, skip, accumulators, dense)
         elif method == "atomic-h":
-            return self.calc_trajcontacts_atomic_h(u, distcutoff, connthreshold, start_time, end_time, skip)
+            return self.calc_trajcontacts_atomic_h(u, distcutoff, connthreshold, start_time, end_time, skip, accumulators, dense)
         elif method == "atomic-sh":
-            return self.calc_trajcontacts_atomic_sh(u, distcutoff, connthreshold, start_time, end_time, skip)
+            return self.calc_trajcontacts_atomic_sh(u, distcutoff, connthreshold, start_time, end_time, skip, accumulators, dense)
         else:
             raise ValueError("Method not recognized")
 
     @profiling.timefunc
-    def calc_trajcontacts_alk_ua(self, u, distcutoff, connthreshold, start_time, end_time, skip):
+    def calc_trajcontacts_alk_ua(self, u, distcutoff, connthreshold, start_time, end_time, skip, accumulators=(), dense=True):
         """
         Calculates contacts between alkane united atoms along trajectory.
 
@@ -149,235 +410,342 @@ class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
         Side chain heavy atoms i and j form a contact if
         N(i,j) > connthreshold and r(i,j) < distcutoff.
         """
-        # MDAnalysis selection strings
-        alk_sel = "resname %s" % self.alk_resname
+        sel, candidates = self.calc_contact_candidates(u, "alk-ua", connthreshold)
+        return self.calc_trajcontacts_frames(u, sel, candidates, distcutoff, start_time, end_time, skip, accumulators, dense)
 
-        # Select alkane united atoms only
-        alk = u.select_atoms(alk_sel)
-        nalk = len(alk.atoms)
+    @profiling.timefunc
+    def calc_trajcontacts_atomic_h(self, u, distcutoff, connthreshold, start_time, end_time, skip, accumulators=(), dense=True):
+        """
+        Calculates contacts between heavy atoms along trajectory.
 
-        start_index = None
-        stop_index = None
-        for tidx, ts in enumerate(u.trajectory):
-            if start_index is None and ts.time >= start_time:
-                start_index = tidx
-            if ts.time == end_time:
-                stop_index = tidx + 1
+        The connectivity threshold is the number of bonds any pair of heavy atoms
+        have to be separated by on the shortest bond network path between them
+        for it to be a candidate for contact formation. The distance cutoff
+        is the maximum interatomic distance for such a candidate pair
+        to be a valid contact.
 
-        # Select trajectory to average over
-        utraj = u.trajectory[start_index:stop_index:skip]
+        Heavy atoms i and j form a contact if
+        N(i,j) > connthreshold and r(i,j) < distcutoff.
+        """
+        sel, candidates = self.calc_contact_candidates(u, "atomic-h", connthreshold)
+        return self.calc_trajcontacts_frames(u, sel, candidates, distcutoff, start_time, end_time, skip, accumulators, dense)
 
-        # Determine indices to exclude based on connectivity
-        apsp, all_to_alk = self.alk_ua_APSP()
+    @profiling.timefunc
+    def calc_trajcontacts_atomic_sh(self, u, distcutoff, connthreshold, start_time, end_time, skip, accumulators=(), dense=True):
+        """
+        Calculates contacts between side-chain heavy atoms along trajectory.
 
-        if connthreshold < 0:
-            raise ValueError("Connectivity threshold must be an integer value 0 or greater.")
+        The connectivity threshold is the number of bonds any pair of heavy atoms
+        have to be separated by on the shortest bond network path between them
+        for it to be a candidate for contact formation. The distance cutoff
+        is the minimum interatomic distance required for such a candidate pair to
+        be a valid contact.
+
+        Side chain heavy atoms i and j form a contact if
+        N(i,j) > connthreshold and r(i,j) < distcutoff.
+        """
+        sel, candidates = self.calc_contact_candidates(u, "atomic-sh", connthreshold)
+        return self.calc_trajcontacts_frames(u, sel, candidates, distcutoff, start_time, end_time, skip, accumulators, dense)
+
+    def calc_trajcontacts_frames(self, u, sel, candidates, distcutoff, start_time, end_time, skip, accumulators=(), dense=True):
+        """
+        Calculates contacts between candidate pairs of atoms along trajectory.
+
+        Atoms i and j form a contact if candidates[i, j] is True and r(i,j) < distcutoff.
+        Distances are only calculated for candidate pairs i < j, and accumulators are passed
+        the contacts formed by these pairs at each timestep.
+
+        Args:
+            u (mda.Universe): Trajectory.
+            sel (mda.AtomGroup): Atoms to calculate contacts between.
+            candidates (np.array): Symmetric boolean array of shape (nsel, nsel) containing candidate pairs.
+            distcutoff (float): Distance cutoff (in A).
+            start_time (float): Time to start averaging at.
+            end_time (float): Time to end averaging at.
+            skip (int): Frequency.
+            accumulators (list): ContactsAccumulator objects to pass the contacts of candidate pairs
+                formed at each timestep to (optional).
+            dense (bool): If True, calculate dense mean contact matrix (default = True).
+
+        Returns:
+            {
+                ts_contacts (timeseries.TimeSeries): TimeSeries objects containing total
+                    number of contacts formed at each timestep.
+
+                mean_contactmatrix(np.array): Array of shape (nsel, nsel) where
+                    mean_contactmatrix[i,j] is ratio of number of timesteps where the contact
+                    [i,j] is formed to the total number of timesteps (None if not dense).
+            }
+        """
+        nsel = len(sel.atoms)
+        pair_i, pair_j = np.nonzero(np.triu(candidates, k=1))
+
+        # Select trajectory to average over
+        utraj = self.select_trajectory(u, start_time, end_time, skip)
 
         # Variables to store computed contacts to
         times = np.zeros(len(utraj))
         total_contacts = np.zeros(len(utraj))
-        mean_contactmatrix = np.zeros((nalk, nalk))
+        if dense:
+            paircounts = np.zeros(len(pair_i))
+
+        for accumulator in accumulators:
+            accumulator.setup(sel, pair_i, pair_j, len(utraj))
 
         if self.verbose:
             pbar = tqdm(desc="Calculating contacts", total=len(utraj))
 
         for tidx, ts in enumerate(utraj):
-            # Fast MDAnalysis distance matrix computation
-            dmatrix = mda.lib.distances.distance_array(alk.positions, alk.positions)
+            # Impose distance cutoff on candidate pairs
+            positions = sel.positions
+            formed = mda.lib.distances.calc_bonds(positions[pair_i], positions[pair_j]) < distcutoff
 
-            # Exclude i-j interactions below connectivity threshold from distance matrix
-            for i in range(apsp.shape[0]):
-                for j in range(apsp.shape[1]):
-                    if i == j and apsp[i, j] > 0:
-                        raise ValueError("Distance matrix is inconsistent: shortest path between same atom should be 0.")
-                    if apsp[i, j] <= connthreshold:
-                        dmatrix[i, j] = np.Inf
-
-            # Impose distance cutoff
-            contactmatrix = np.array(dmatrix < distcutoff)
-
-            # Store timeseries
+            # Store timeseries (counting both [i,j] and [j,i])
             times[tidx] = ts.time
-            total_contacts[tidx] = np.sum(contactmatrix)
+            total_contacts[tidx] = 2 * np.count_nonzero(formed)
 
             # Add to mean
-            mean_contactmatrix += contactmatrix
+            if dense:
+                paircounts += formed
+
+            for accumulator in accumulators:
+                accumulator.update(formed)
 
             if self.verbose:
                 pbar.update(1)
 
         ts_contacts = timeseries.TimeSeries(times, total_contacts, labels=['Number of contacts'])
-        mean_contactmatrix = mean_contactmatrix / len(utraj)
+
+        mean_contactmatrix = None
+        if dense:
+            mean_contactmatrix = np.zeros((nsel, nsel))
+            mean_contactmatrix[pair_i, pair_j] = paircounts / len(utraj)
+            mean_contactmatrix[pair_j, pair_i] = paircounts / len(utraj)
 
         return ts_contacts, mean_contactmatrix
 
-    @profiling.timefunc
-    def calc_trajcontacts_atomic_h(self, u, distcutoff, connthreshold, start_time, end_time, skip):
+    def select_trajectory(self, u, start_time, end_time, skip):
         """
-        Calculates contacts between heavy atoms along trajectory.
+        Selects the slice of a trajectory between two times, resampled at a fixed interval.
 
-        The connectivity threshold is the number of bonds any pair of heavy atoms
-        have to be separated by on the shortest bond network path between them
-        for it to be a candidate for contact formation. The distance cutoff
-        is the maximum interatomic distance for such a candidate pair
-        to be a valid contact.
+        Args:
+            u (mda.Universe): Trajectory.
+            start_time (float): Time to start at (default = start of trajectory if None).
+            end_time (float): Time to end at (default = end of trajectory if None).
+            skip (int): Frequency.
 
-        Heavy atoms i and j form a contact if
-        N(i,j) > connthreshold and r(i,j) < distcutoff.
+        Returns:
+            Sliced trajectory (mda FrameIteratorSliced).
         """
-        # MDAnalysis selection strings
-        heavy_sel = "protein and not name H*"
-        not_heavy_sel = "protein and name H*"
-
-        # Select heavy atoms only
-        protein_heavy = u.select_atoms(heavy_sel)
-        nheavy = len(protein_heavy.atoms)
-
         start_index = None
         stop_index = None
         for tidx, ts in enumerate(u.trajectory):
-            if start_index is None and ts.time >= start_time:
+            if start_index is None and (start_time is None or ts.time >= start_time):
                 start_index = tidx
-            if ts.time == end_time:
+            if end_time is not None and ts.time == end_time:
                 stop_index = tidx + 1
 
-        # Select trajectory to average over
-        utraj = u.trajectory[start_index:stop_index:skip]
+        return u.trajectory[start_index:stop_index:skip]
 
-        # Determine indices to exclude based on connectivity
-        apsp, all_to_heavy = self.protein_heavy_APSP()
+    def contacts_selection(self, method):
+        """
+        Returns the MDAnalysis selection string for the atoms contacts are computed between.
 
+        Args:
+            method (str): Calculation method to use to compute contacts.
+
+        Raises:
+            ValueError if calculation method is not recognized.
+        """
+        if method == "alk-ua":
+            return "resname %s" % self.alk_resname
+        elif method == "atomic-h" or method == "atomic-sh":
+            return "protein and not name H*"
+        else:
+            raise ValueError("Method not recognized")
+
+    def calc_contact_candidates(self, u, method, connthreshold):
+        """
+        Determines the atoms contacts are computed between, and the pairs of these atoms
+        which are candidates for contact formation.
+
+        Applies the same connectivity exclusions as `calc_trajcontacts`: for every method, pairs
+        separated by `connthreshold` or fewer bonds are excluded, and for atomic-sh, pairs involving
+        backbone heavy atoms are also excluded.
+
+        Args:
+            u (mda.Universe): Trajectory.
+            method (str): Calculation method to use to compute contacts.
+            connthreshold (int): Connectivity threshold.
+
+        Returns:
+            {
+                sel (mda.AtomGroup): Atoms contacts are computed between.
+
+                candidates (np.array): Boolean array of shape (nsel, nsel), where candidates[i, j]
+                    is True if the pair [i, j] is a candidate for contact formation.
+            }
+
+        Raises:
+            ValueError if calculation method is not recognized, or if connectivity threshold is invalid.
+        """
         if connthreshold < 0:
             raise ValueError("Connectivity threshold must be an integer value 0 or greater.")
 
-        # Variables to store computed contacts to
-        times = np.zeros(len(utraj))
-        total_contacts = np.zeros(len(utraj))
-        mean_contactmatrix = np.zeros((nheavy, nheavy))
+        sel = u.select_atoms(self.contacts_selection(method))
 
-        if self.verbose:
-            pbar = tqdm(desc="Calculating contacts", total=len(utraj))
+        if method == "alk-ua":
+            apsp, all_to_sel = self.alk_ua_APSP()
+        else:
+            apsp, all_to_sel = self.protein_heavy_APSP()
 
-        for tidx, ts in enumerate(utraj):
-            # Fast MDAnalysis distance matrix computation
-            dmatrix = mda.lib.distances.distance_array(protein_heavy.positions, protein_heavy.positions)
+        if np.any(np.diag(apsp) > 0):
+            raise ValueError("Distance matrix is inconsistent: shortest path between same atom should be 0.")
 
-            # Exclude i-j interactions below connectivity threshold from distance matrix
-            for i in range(apsp.shape[0]):
-                for j in range(apsp.shape[1]):
-                    if i == j and apsp[i, j] > 0:
-                        raise ValueError("Distance matrix is inconsistent: shortest path between same atom should be 0.")
-                    if apsp[i, j] <= connthreshold:
-                        dmatrix[i, j] = np.Inf
+        # Exclude i-j interactions below connectivity threshold
+        candidates = apsp > connthreshold
 
-            # Impose distance cutoff
-            contactmatrix = np.array(dmatrix < distcutoff)
+        # Exclude pairs containing non-side-chain-heavy atoms
+        if method == "atomic-sh":
+            not_side_heavy_sel = "protein and (name N or name CA or name C or name O or name OC1 or name OC2 or name H*)"
+            not_sh = np.isin(sel.indices, self.u.select_atoms(not_side_heavy_sel).indices)
+            candidates[not_sh, :] = False
+            candidates[:, not_sh] = False
 
-            # Store timeseries
-            times[tidx] = ts.time
-            total_contacts[tidx] = np.sum(contactmatrix)
+        return sel, candidates
 
-            # Add to mean
-            mean_contactmatrix += contactmatrix
+    ###################################################
+    # Fraction of native contacts                     #
+    # Q(t)                                            #
+    ###################################################
 
-            if self.verbose:
-                pbar.update(1)
+    def calc_native_pairs(self, refcoords, candidates, distcutoff):
+        """
+        Extracts the list of native contacts from a reference structure.
 
-        ts_contacts = timeseries.TimeSeries(times, total_contacts, labels=['Number of contacts'])
-        mean_contactmatrix = mean_contactmatrix / len(utraj)
+        Native contacts are the candidate pairs [i, j] (i < j) which are in contact,
+        i.e. r(i,j) < distcutoff, in the reference structure.
 
-        return ts_contacts, mean_contactmatrix
+        Args:
+            refcoords (np.array): Array of shape (N, 3) containing reference coordinates.
+            candidates (np.array): Boolean array of shape (N, N) containing candidate pairs.
+            distcutoff (float): Distance cutoff (in A).
 
-    @profiling.timefunc
-    def calc_trajcontacts_atomic_sh(self, u, distcutoff, connthreshold, start_time, end_time, skip):
+        Returns:
+            {
+                native_i (np.array): Indices of first atom of each native pair.
+
+                native_j (np.array): Indices of second atom of each native pair.
+
+                native_r0 (np.array): Distance between atoms of each native pair in the reference structure.
+            }
+
+        Raises:
+            ValueError if refcoords and candidates do not have consistent shapes.
         """
-        Calculates contacts between side-chain heavy atoms along trajectory.
+        if refcoords.shape[1] != 3:
+            raise ValueError("coords not 3 dimensional")
+        if candidates.shape != (refcoords.shape[0], refcoords.shape[0]):
+            raise ValueError("Candidate pairs and reference coordinates do not match")
 
-        The connectivity threshold is the number of bonds any pair of heavy atoms
-        have to be separated by on the shortest bond network path between them
-        for it to be a candidate for contact formation. The distance cutoff
-        is the minimum interatomic distance required for such a candidate pair to
-        be a valid contact.
+        dmatrix = mda.lib.distances.distance_array(refcoords, refcoords)
+        native = np.triu(np.logical_and(candidates, dmatrix < distcutoff), k=1)
+        native_i, native_j = np.nonzero(native)
 
-        Side chain heavy atoms i and j form a contact if
-        N(i,j) > connthreshold and r(i,j) < distcutoff.
+        return native_i, native_j, dmatrix[native_i, native_j]
+
+    def calc_Q_worker(self, coords, native_i, native_j, native_r0, Qbeta, Qlambda):
+        r"""
+        Calculates the fraction of native contacts with a smooth switching function
+        (Best, Hummer and Eaton, PNAS 2013).
+
+        .. math:: Q = \frac{1}{N} \sum_{(i,j)} \frac{1}{1 + \exp[\beta (r_{ij} - \lambda r_{ij}^0)]}
+
+        where the sum runs over all N native pairs (i,j), and
+
+        .. math:: r_{ij}^0
+
+        is the distance between atoms *i* and *j* in the native structure.
+
+        Only the native pair distances are evaluated, so the cost is O(N) and not O(n^2).
+
+        Args:
+            coords (np.array): Array of shape (n, 3) containing coordinates.
+            native_i (np.array): Indices of first atom of each native pair.
+            native_j (np.array): Indices of second atom of each native pair.
+            native_r0 (np.array): Native distance of each native pair.
+            Qbeta (float): Smoothing parameter (in 1/A).
+            Qlambda (float): Native distance tolerance factor.
+
+        Returns:
+            Q (np.float).
         """
-        # MDAnalysis selection strings
-        heavy_sel = "protein and not name H*"
-        not_side_heavy_sel = "protein and (name N or name CA or name C or name O or name OC1 or name OC2 or name H*)"
+        if len(native_r0) == 0:
+            return 0.0
+        r = mda.lib.distances.calc_bonds(coords[native_i], coords[native_j])
+        return np.mean(1.0 / (1.0 + np.exp(Qbeta * (r - Qlambda * native_r0))))
 
-        # Select heavy atoms only
-        protein_heavy = u.select_atoms(heavy_sel)
-        nheavy = len(protein_heavy.atoms)
+    @profiling.timefunc
+    def calc_trajQ(self, u, method, distcutoff, connthreshold, start_time, end_time, skip, refu, reftstep, Qbeta, Qlambda):
+        """
+        Calculates the fraction of native contacts, Q, along a trajectory.
 
-        start_index = None
-        stop_index = None
-        for tidx, ts in enumerate(u.trajectory):
-            if start_index is None and ts.time >= start_time:
-                start_index = tidx
-            if ts.time == end_time:
-                stop_index = tidx + 1
+        The native pair list is extracted once from the reference structure (using the same
+        connectivity exclusions as `calc_trajcontacts`), after which only the native pair
+        distances are evaluated at each frame.
 
-        # Select trajectory to average over
-        utraj = u.trajectory[start_index:stop_index:skip]
+        Args:
+            u (mda.Universe): Trajectory.
+            method (str): Calculation method to use to compute contacts.
+            distcutoff (float): Distance cutoff (in A) for native contacts.
+            connthreshold (int): Connectivity threshold.
+            start_time (float): Time to start averaging at.
+            end_time (float): Time to end averaging at.
+            skip (int): Frequency.
+            refu (mda.Universe): Universe containing reference (native) structure.
+            reftstep (int): Frame of refu to extract native contacts from.
+            Qbeta (float): Smoothing parameter (in 1/A).
+            Qlambda (float): Native distance tolerance factor.
 
-        # Determine indices to exclude based on connectivity
-        apsp, all_to_heavy = self.protein_heavy_APSP()
+        Returns:
+            {
+                ts_Q (timeseries.TimeSeries): TimeSeries object containing Q at each timestep.
 
-        if connthreshold < 0:
-            raise ValueError("Connectivity threshold must be an integer value 0 or greater.")
+                native_pairs (np.array): Array of shape (3, nnative) containing the indices (i, j) of
+                    each native pair, and its native distance.
+            }
 
-        # Determine indices to exclude because they are not side-chain-heavy
-        not_sh_all_idx = self.u.select_atoms(not_side_heavy_sel).indices
-        not_sh_heavy_idx = []
-        for all_idx in not_sh_all_idx:
-            try:
-                not_sh_heavy_idx.append(all_to_heavy[all_idx])
-            except KeyError:
-                pass  # Not a heavy atom => already excluded
+        Raises:
+            ValueError if the reference structure does not contain the same atoms as the trajectory.
+        """
+        sel, candidates = self.calc_contact_candidates(u, method, connthreshold)
+        refsel = refu.select_atoms(self.contacts_selection(method))
+
+        if len(refsel) != len(sel):
+            raise ValueError("Reference structure and trajectory selections do not have the same number of atoms.")
+
+        refu.trajectory[reftstep]
+        native_i, native_j, native_r0 = self.calc_native_pairs(refsel.positions.copy(), candidates, distcutoff)
+
+        utraj = self.select_trajectory(u, start_time, end_time, skip)
 
-        # Variables to store computed contacts to
         times = np.zeros(len(utraj))
-        total_contacts = np.zeros(len(utraj))
-        mean_contactmatrix = np.zeros((nheavy, nheavy))
+        Qs = np.zeros(len(utraj))
 
         if self.verbose:
-            pbar = tqdm(desc="Calculating contacts", total=len(utraj))
+            pbar = tqdm(desc="Calculating native contacts", total=len(utraj))
 
         for tidx, ts in enumerate(utraj):
-            # Fast MDAnalysis distance matrix computation
-            dmatrix = mda.lib.distances.distance_array(protein_heavy.positions, protein_heavy.positions)
-
-            # Exclude pairs containing non-side-chain-heavy atoms by setting their distances to infinity
-            for i in not_sh_heavy_idx:
-                dmatrix[i, :] = np.Inf
-                dmatrix[:, i] = np.Inf
-
-            # Exclude i-j interactions below connectivity threshold from distance matrix
-            for i in range(apsp.shape[0]):
-                for j in range(apsp.shape[1]):
-                    if i == j and apsp[i, j] > 0:
-                        raise ValueError("Distance matrix is inconsistent: shortest path between same atom should be 0.")
-                    if apsp[i, j] <= connthreshold:
-                        dmatrix[i, j] = np.Inf
-
-            # Impose distance cutoff
-            contactmatrix = np.array(dmatrix < distcutoff)
-
-            # Store timeseries
             times[tidx] = ts.time
-            total_contacts[tidx] = np.sum(contactmatrix)
-
-            # Add to mean
-            mean_contactmatrix += contactmatrix
+            Qs[tidx] = self.calc_Q_worker(sel.positions, native_i, native_j, native_r0, Qbeta, Qlambda)
 
             if self.verbose:
                 pbar.update(1)
 
-        ts_contacts = timeseries.TimeSeries(times, total_contacts, labels=['Number of contacts'])
-        mean_contactmatrix = mean_contactmatrix / len(utraj)
+        ts_Q = timeseries.TimeSeries(times, Qs, labels=['Q'])
+        native_pairs = np.vstack((native_i, native_j, native_r0))
 
-        return ts_contacts, mean_contactmatrix
+        return ts_Q, native_pairs
 
     def alk_ua_APSP(self):
         """
@@ -482,6 +850,25 @@ class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
         else:
             plt.close()
 
+    def plot_mean_rescontactmatrix(self, mean_rescontactmatrix):
+        """
+        Plots mean residue-level contact matrix.
+
+        Args:
+            mean_rescontactmatrix (np.array): Mean residue-level contactmatrix.
+        """
+        fig, ax = plt.subplots()
+        im = ax.imshow(mean_rescontactmatrix.T, origin="lower", cmap="hot")
+        fig.colorbar(im)
+        ax.set_xlabel('Residue $i$')
+        ax.set_ylabel('Residue $j$')
+        fig.set_dpi(self.dpi)
+        self.save_figure(fig, suffix="mean_rescontactmatrix")
+        if self.show:
+            plt.show()
+        else:
+            plt.close()
+
     def plot_total_fraction_contacts(self, ts_contacts, refcontacts):
         """
         Plots timeseries number of contacts and fraction of contacts.
@@ -518,8 +905,14 @@ class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
             ts_contacts (timeseries.TimeSeries): Timeseries of total contacts.
             bins (int): Number of bins for histogram
         """
-        hist, bin_edges = np.histogram(ts_contacts.data_array, bins=bins)
-        bin_centers = 0.5 * (bin_edges[1:] + bin_edges[:-1])
+        # Bins span range of data, as np.histogram
+        cmin, cmax = np.min(ts_contacts.data_array), np.max(ts_contacts.data_array)
+        if cmin == cmax:
+            cmin, cmax = cmin - 0.5, cmax + 0.5
+        contacts_hist = FixedBinHistogram(cmin, cmax, bins)
+        contacts_hist.add(ts_contacts.data_array)
+        hist = contacts_hist.counts[0]
+        bin_centers = contacts_hist.centers
 
         histogram = np.zeros((2, len(hist)))
         histogram[0, :] = bin_centers
@@ -538,17 +931,143 @@ class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
         else:
             plt.close()
 
+    def calc_save_lifetimes(self, ts_contacts, ltacc):
+        """
+        Calculates contact lifetime distribution, survival function and autocorrelation from
+        run-length encoded contact histories, and saves them to file.
+
+        Args:
+            ts_contacts (timeseries.TimeSeries): Timeseries of total contacts (used for frame times).
+            ltacc (ContactLifetimesAccumulator): Accumulator containing contact runs.
+
+        Returns:
+            {
+                lifetimes_hist (np.array): Array of shape (2, nlifetimes) containing lifetimes (in ps)
+                    and number of (uncensored) runs with each lifetime.
+                survival (np.array): Array of shape (3, nlags) containing lag times (in ps),
+                    survival function and autocorrelation.
+            }
+        """
+        times = ts_contacts.time_array
+        dt = times[1] - times[0] if len(times) > 1 else 0
+
+        # Runs, with pair indices converted to selection atom indices
+        pairs, starts, lengths, censored = ltacc.runs()
+        runs = np.vstack((ltacc.pair_i[pairs], ltacc.pair_j[pairs], starts, lengths, censored))
+        np.save(self.opref + "_contact_runs.npy", runs)
+
+        lifetimes, counts = ltacc.lifetime_distribution()
+        lifetimes_hist = np.zeros((2, len(lifetimes)))
+        lifetimes_hist[0, :] = lifetimes * dt
+        lifetimes_hist[1, :] = counts
+        np.save(self.opref + "_lifetimes_hist.npy", lifetimes_hist)
+
+        S = ltacc.survival_function()
+        C = ltacc.autocorrelation()
+        survival = np.zeros((3, len(S)))
+        survival[0, :] = np.arange(len(S)) * dt
+        survival[1, :] = S
+        survival[2, :] = C
+        np.save(self.opref + "_contact_survival.npy", survival)
+
+        return lifetimes_hist, survival
+
+    def plot_lifetimes(self, lifetimes_hist, survival):
+        """
+        Plots contact lifetime distribution, survival function and autocorrelation.
+
+        Args:
+            lifetimes_hist (np.array): Array of shape (2, nlifetimes) containing lifetimes and counts.
+            survival (np.array): Array of shape (3, nlags) containing lag times, survival function
+                and autocorrelation.
+        """
+
+        fig, ax = plt.subplots()
+        ax.plot(lifetimes_hist[0, :], lifetimes_hist[1, :])
+        ax.set_xlabel('Contact lifetime (ps)')
+        ax.set_ylabel('Frequency')
+        fig.set_dpi(self.dpi)
+        self.save_figure(fig, suffix="hist_lifetimes")
+
+        fig2, ax = plt.subplots()
+        ax.plot(survival[0, :], survival[1, :], label=r"Survival $S(\tau)$")
+        ax.plot(survival[0, :], survival[2, :], label=r"Autocorrelation $C(\tau)$")
+        ax.set_xlabel(r'$\tau$ (ps)')
+        ax.set_ylim([0, 1])
+        ax.legend()
+        fig2.set_dpi(self.dpi)
+        self.save_figure(fig2, suffix="contact_survival")
+
+        if self.show:
+            plt.show()
+        else:
+            plt.close()
+
+    def plot_Q(self, ts_Q):
+        """
+        Plots timeseries fraction of native contacts.
+
+        Args:
+            ts_Q (timeseries.TimeSeries): Timeseries of fraction of native contacts.
+        """
+        fig = ts_Q.plot()
+        ax = fig.gca()
+        ax.set_ylim([0, 1])
+        fig.set_dpi(self.dpi)
+        self.save_figure(fig, suffix="Q")
+        if self.show:
+            plt.show()
+        else:
+            plt.close()
+
     """call"""
     def __call__(self):
         """Performs analysis."""
 
-        # Calculate contacts along trajectory and mean contactmatrix
+        if self.native:
+            # Native contacts mode: extract native pairs once, then calculate Q along trajectory
+            if self.nativestructf is not None:
+                refu = mda.Universe(self.nativestructf)
+                reftstep = 0
+            else:
+                refu = self.u
+                reftstep = self.nativetstep
+
+            ts_Q, native_pairs = self.calc_trajQ(self.u, self.method, self.distcutoff, self.connthreshold,
+                                                 self.obsstart, self.obsend, self.skip, refu, reftstep,
+                                                 self.Qbeta, self.Qlambda)
+
+            # Save data
+            self.save_TimeSeries(ts_Q, self.opref + "_Q.pkl")
+            np.save(self.opref + "_native_pairs.npy", native_pairs)
+
+            """Plots"""
+            self.plot_Q(ts_Q)
+            return
+
+        accumulators = []
+        if self.resmap is not None:
+            resacc = ResidueContactsAccumulator(self.resmap)
+            accumulators.append(resacc)
+        if self.lifetimes:
+            ltacc = ContactLifetimesAccumulator()
+            accumulators.append(ltacc)
+
+        # Calculate contacts along trajectory and mean contactmatrix (atom-level, unless residue-level map
+        # is calculated instead)
         ts_contacts, mean_contactmatrix = self.calc_trajcontacts(self.u, self.method, self.distcutoff, self.connthreshold,
-                                                                 self.obsstart, self.obsend, self.skip)
+                                                                 self.obsstart, self.obsend, self.skip, accumulators,
+                                                                 dense=self.resmap is None)
 
         # Save data
         self.save_TimeSeries(ts_contacts, self.opref + "_contacts.pkl")
-        np.save(self.opref + "_mean_contactmatrix.npy", mean_contactmatrix)
+        if self.resmap is None:
+            np.save(self.opref + "_mean_contactmatrix.npy", mean_contactmatrix)
+        else:
+            mean_rescontactmatrix = resacc.mean_rescontactmatrix()
+            np.save(self.opref + "_mean_rescontactmatrix.npy", mean_rescontactmatrix)
+        if self.lifetimes:
+            lifetimes_hist, survival = self.calc_save_lifetimes(ts_contacts, ltacc)
 
         # Calculate mean number of contacts along trajectory
         mean_contacts = ts_contacts[self.obsstart:self.obsend].mean()
@@ -557,6 +1076,11 @@ class ContactsAnalysis(timeseries.TimeSeriesAnalysis):
             self.refcontacts = mean_contacts
 
         """Plots"""
-        self.plot_mean_contactmatrix(mean_contactmatrix)
+        if self.resmap is None:
+            self.plot_mean_contactmatrix(mean_contactmatrix)
+        else:
+            self.plot_mean_rescontactmatrix(mean_rescontactmatrix)
+        if self.lifetimes:
+            self.plot_lifetimes(lifetimes_hist, survival)
         self.plot_total_fraction_contacts(ts_contacts, self.refcontacts)
         self.calc_plot_histogram_contacts(ts_contacts, self.bins)
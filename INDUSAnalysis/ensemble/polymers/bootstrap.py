@@ -0,0 +1,383 @@
+"""
+Bootstrap engine which holds umbrella window data and bootstrap results in shared memory,
+so that worker processes receive only replica indices instead of pickled copies of the data,
+along with the replica and peak-finding functions used to bootstrap WHAM calculations.
+"""
+import logging
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+from scipy.signal import find_peaks
+
+from INDUSAnalysis.ensemble.polymers.phi_ensemble import reweight_phi_ensemble
+
+# Logging
+logger = logging.getLogger(__name__)
+
+# Per-process state of bootstrap workers
+_worker = {}
+
+
+def replica_seed(seed, replica):
+    """Returns random seed of bootstrap replica."""
+    return (seed + 17 * replica) % 824633720831
+
+
+def resample_windows(data, offsets, seed):
+    """
+    Resamples each window with replacement.
+
+    Args:
+        data (np.array): Concatenated samples of all windows.
+        offsets (np.array): Offsets of windows in data, of length nwindows + 1.
+        seed (int): Random seed.
+
+    Returns:
+        List of resampled arrays, one per window.
+    """
+    rng = np.random.RandomState(seed)
+    windows_boot = []
+    for i in range(len(offsets) - 1):
+        n = offsets[i + 1] - offsets[i]
+        windows_boot.append(data[offsets[i] + rng.randint(0, n, size=n)])
+    return windows_boot
+
+
+def relative_change(new, old):
+    """
+    Returns relative change ||new - old|| / ||old|| between two arrays, over elements finite in both.
+    """
+    finite = np.isfinite(new) & np.isfinite(old)
+    norm_old = np.linalg.norm(old[finite])
+    norm_diff = np.linalg.norm(new[finite] - old[finite])
+    if norm_old == 0:
+        return 0.0 if norm_diff == 0 else np.inf
+    return norm_diff / norm_old
+
+
+class RunningStats:
+    """
+    Online mean and standard deviation of array-valued samples, updated with batches of samples
+    (using the pairwise update of Chan et al.), so that results of earlier batches need not be kept.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self.M2 = None
+
+    def update(self, batch):
+        """
+        Args:
+            batch (np.array): Array of shape (nsamples, *shape) containing a batch of samples.
+        """
+        batch = np.asarray(batch, dtype=np.float64)
+        nbatch = len(batch)
+        if nbatch == 0:
+            return
+        batch_mean = batch.mean(axis=0)
+        batch_M2 = ((batch - batch_mean) ** 2).sum(axis=0)
+        if self.n == 0:
+            self.n, self.mean, self.M2 = nbatch, batch_mean, batch_M2
+            return
+        n = self.n + nbatch
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * nbatch / n
+        self.M2 = self.M2 + batch_M2 + delta ** 2 * self.n * nbatch / n
+        self.n = n
+
+    def std(self):
+        """Returns standard deviation of samples (ddof = 0, as np.std)."""
+        return np.sqrt(self.M2 / self.n)
+
+
+def boot_replica(Ntw_win_boot, n_star_win, kappa, bin_points, phi_vals, beta):
+    """
+    Computes 1D free energy profile and phi-ensemble averages from resampled window data
+    (picklable bootstrap worker function).
+
+    Args:
+        Ntw_win_boot: List containing an array of resampled N~ values for each umbrella window.
+        n_star_win: List of all simulation Nstar values for each umbrella window (first window unbiased).
+        kappa: Spring constant of umbrella potentials, in kJ/mol.
+        bin_points: Points defining bins (centers) for constructing free energy profile.
+        phi_vals: Values of phi to reweight to.
+        beta: 1/kbT for the simulation, in units of mol/kJ.
+
+    Returns:
+        Dictionary containing free energy profile (betaF), <N~> (Navg), Var(N~) (Nvar) and
+        susceptibility (Nsusc) of the bootstrap replica.
+    """
+    # WHAM is only required by bootstrap replicas of WHAM calculations, not by the bootstrap engine
+    import WHAM.binless
+    from WHAM.lib import potentials
+
+    umbrella_win = [lambda x: 0]
+    for n_star in n_star_win[1:]:
+        umbrella_win.append(potentials.harmonic(kappa, n_star))
+
+    # Perform WHAM calculation
+    calc = WHAM.binless.Calc1D()
+    betaF_bin, betaF_bin_counts, status = calc.compute_betaF_profile(Ntw_win_boot, bin_points, umbrella_win, beta,
+                                                                     bin_style='center', solver='log-likelihood')  # solver kwargs
+
+    betaF_bin = betaF_bin - np.min(betaF_bin)  # reposition zero so that unbiased free energy is zero
+
+    # Perform phi-ensemble reweighting
+    N_avg_vals, N_var_vals = reweight_phi_ensemble(calc, phi_vals, beta)
+
+    dx = phi_vals[1] - phi_vals[0]
+    dydx = np.gradient(N_avg_vals, dx)
+    susc = -1 / beta * dydx
+
+    # Return
+    return {"betaF": betaF_bin,
+            "Navg": N_avg_vals,
+            "Nvar": N_var_vals,
+            "Nsusc": susc}
+
+
+def boot_phi_stars(N_var_all, phi_vals, peak_cut):
+    """
+    Finds phi_1* and phi_2* of each bootstrap replica, as the phi values of the two highest peaks of Var(N~).
+
+    Args:
+        N_var_all: Array of shape (nboot, len(phi_vals)) containing Var(N~) of each replica.
+        phi_vals: Values of phi.
+        peak_cut: Minimum height of peaks.
+
+    Returns:
+        tuple(phi_1_stars, phi_2_stars, all_peaks), where all_peaks is a list containing the phi values
+        of all peaks of each replica, sorted by decreasing peak height.
+    """
+    nboot = len(N_var_all)
+    phi_1_stars = np.zeros(nboot)
+    phi_2_stars = np.zeros(nboot)
+    all_peaks = []
+
+    for nb in range(nboot):
+        # Find peak indices
+        peaks, _ = find_peaks(N_var_all[nb, :], height=peak_cut)
+
+        # Sort peak heights
+        peak_heights = N_var_all[nb, peaks]
+
+        # Sort peaks by peak heights: largest two peaks are phi_1* and phi_2*
+        sort_order = np.argsort(peak_heights)[::-1]
+        peaks = peaks[sort_order]
+
+        all_peaks.append(phi_vals[peaks])
+
+        # Smaller index is phi_1*, larger index is phi_2*
+        phi_1_stars[nb] = phi_vals[min(peaks[0], peaks[1])]
+        phi_2_stars[nb] = phi_vals[max(peaks[0], peaks[1])]
+
+    return phi_1_stars, phi_2_stars, all_peaks
+
+
+def _attach(spec):
+    """Attaches to shared memory block described by spec = (name, shape, dtype)."""
+    shm = shared_memory.SharedMemory(name=spec[0])
+    return shm, np.ndarray(spec[1], dtype=spec[2], buffer=shm.buf)
+
+
+def _detach(attached):
+    """Releases arrays and closes shared memory blocks in dictionary of blocks attached with _attach."""
+    for key in list(attached.keys()):
+        shm, arr = attached.pop(key)
+        del arr
+        shm.close()
+
+
+def _init_worker(data_spec, offsets, func, args, seed):
+    """Attaches worker process to shared window data."""
+    _worker.clear()
+    _worker.update(data={"data": _attach(data_spec)}, offsets=offsets, func=func, args=args, seed=seed, outputs={})
+
+
+def _run_replicas(task):
+    """
+    Computes bootstrap replicas start, ..., stop - 1 and writes results to shared output arrays.
+
+    Args:
+        task (tuple): (batch_start, start, stop, out_specs), where out_specs maps output names to
+            (shared memory name, shape, dtype) of the output arrays of the batch starting at replica batch_start.
+
+    Returns:
+        Number of replicas computed.
+    """
+    batch_start, start, stop, out_specs = task
+
+    # Attach to output arrays of this batch, detaching from those of previous batches
+    if set(spec[0] for spec in out_specs.values()) != set(_worker["outputs"].keys()):
+        _detach(_worker["outputs"])
+        _worker["outputs"].update({spec[0]: _attach(spec) for spec in out_specs.values()})
+
+    data = _worker["data"]["data"][1]
+    for replica in range(start, stop):
+        windows_boot = resample_windows(data, _worker["offsets"], replica_seed(_worker["seed"], replica))
+        results = _worker["func"](windows_boot, *_worker["args"])
+        for name, spec in out_specs.items():
+            _worker["outputs"][spec[0]][1][replica - batch_start] = results[name]
+        logger.debug("Bootstrap replica {} done.".format(replica))
+    return stop - start
+
+
+class SharedBootstrap:
+    """
+    Computes bootstrap replicas of a calculation on umbrella window data over a process pool.
+
+    The samples of all windows are copied once into a shared memory block which worker processes
+    attach to when they start. Each task sent to a worker is a range of replica indices; the worker
+    resamples the windows with a seed derived from each replica index (so results do not depend on how
+    replicas are assigned to workers), calls `func`, and writes the results into preallocated shared output arrays.
+
+    Args:
+        windows (list): List of 1-D arrays containing samples of each window.
+        func (callable): Picklable (module-level) function called as func(windows_boot, *args) for each
+            replica, returning a dictionary of arrays.
+        outputs (dict): Mapping of names of results returned by func to their shapes.
+        args (tuple): Additional arguments to func (default = ()).
+        nworkers (int): Number of worker processes (default = 1, compute in this process).
+        seed (int): Base random seed (default = 16091).
+
+    Examples:
+        >>> with SharedBootstrap(Ntw_win, boot_replica, {"betaF": (nbins,)}, args, nworkers=8) as boot:
+        ...     results = boot.run(0, 1000)
+    """
+    def __init__(self, windows, func, outputs, args=(), nworkers=1, seed=16091):
+        self.windows = windows
+        self.func = func
+        self.outputs = outputs
+        self.args = args
+        self.nworkers = nworkers
+        self.seed = seed
+        self.shm = None
+        self.pool = None
+
+    def __enter__(self):
+        self.offsets = np.concatenate(([0], np.cumsum([len(win) for win in self.windows]))).astype(np.int64)
+        nsamples = int(self.offsets[-1])
+        self.shm = shared_memory.SharedMemory(create=True, size=max(nsamples, 1) * 8)
+        data = np.ndarray((nsamples,), dtype=np.float64, buffer=self.shm.buf)
+        for i, win in enumerate(self.windows):
+            data[self.offsets[i]:self.offsets[i + 1]] = win
+        del data
+
+        initargs = ((self.shm.name, (nsamples,), np.float64), self.offsets, self.func, self.args, self.seed)
+        if self.nworkers > 1:
+            self.pool = Pool(processes=self.nworkers, initializer=_init_worker, initargs=initargs)
+        else:
+            _init_worker(*initargs)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        else:
+            _detach(_worker["outputs"])
+            _detach(_worker["data"])
+            _worker.clear()
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def run(self, start, nboot, chunksize=None):
+        """
+        Computes bootstrap replicas start, ..., start + nboot - 1.
+
+        Args:
+            start (int): Index of first replica.
+            nboot (int): Number of replicas.
+            chunksize (int): Number of replicas per task (default = None, split replicas into
+                about 4 tasks per worker).
+
+        Returns:
+            Dictionary mapping each output name to array of shape (nboot, *shape) containing results of all replicas.
+        """
+        if self.shm is None:
+            raise ValueError("SharedBootstrap must be used as a context manager.")
+        if chunksize is None:
+            chunksize = max(1, int(np.ceil(nboot / (4 * self.nworkers))))
+
+        out_shms = {}
+        out_specs = {}
+        try:
+            for name, shape in self.outputs.items():
+                shape = (nboot,) + tuple(shape)
+                out_shms[name] = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)), 1) * 8)
+                out_specs[name] = (out_shms[name].name, shape, np.float64)
+
+            tasks = [(start, task_start, min(task_start + chunksize, start + nboot), out_specs)
+                     for task_start in range(start, start + nboot, chunksize)]
+            if self.pool is not None:
+                ndone = sum(self.pool.imap_unordered(_run_replicas, tasks))
+            else:
+                ndone = sum(map(_run_replicas, tasks))
+            logger.info("Computed {} bootstrap replicas.".format(ndone))
+
+            results = {}
+            for name, spec in out_specs.items():
+                results[name] = np.ndarray(spec[1], dtype=spec[2], buffer=out_shms[name].buf).copy()
+        finally:
+            if self.pool is None:
+                _detach(_worker["outputs"])
+            for shm in out_shms.values():
+                shm.close()
+                shm.unlink()
+
+        return results
+
+    def run_adaptive(self, batch, tol, max_boot, derived=None, chunksize=None):
+        """
+        Computes bootstrap replicas in batches until the error bars (standard deviations over replicas)
+        of all outputs converge, or max_boot replicas have been computed.
+
+        After each batch, the error bars are updated with online estimators, and the relative change
+        in the error bars of each output since the previous batch is computed. Replicas stop once the
+        largest relative change is below tol.
+
+        Args:
+            batch (int): Number of replicas per batch.
+            tol (float): Tolerance on relative change in error bars between batches.
+            max_boot (int): Maximum number of replicas.
+            derived (callable): Function of dictionary of results of a batch (as returned by run),
+                returning dictionary of arrays of shape (nboot, *shape) of derived quantities whose
+                error bars must also converge (default = None).
+            chunksize (int): Number of replicas per task (default = None, see run).
+
+        Returns:
+            Dictionary mapping each output name to array of shape (nboot, *shape) containing results of
+            all replicas computed.
+        """
+        if batch < 1:
+            raise ValueError("Batch size must be at least 1.")
+
+        batches = []
+        stats = {}
+        prev_errors = None
+        start = 0
+        while start < max_boot:
+            nboot = min(batch, max_boot - start)
+            results = self.run(start, nboot, chunksize=chunksize)
+            batches.append(results)
+            start += nboot
+
+            tracked = dict(results)
+            if derived is not None:
+                tracked.update(derived(results))
+            for name, values in tracked.items():
+                stats.setdefault(name, RunningStats()).update(values)
+            errors = {name: stat.std() for name, stat in stats.items()}
+
+            if prev_errors is not None:
+                change = max(relative_change(errors[name], prev_errors[name]) for name in errors)
+                logger.info("{} bootstrap replicas: relative change in error bars = {:.5f}.".format(start, change))
+                if change < tol:
+                    break
+            prev_errors = errors
+        else:
+            logger.warning("Bootstrap error bars did not converge to tolerance {} in {} replicas.".format(tol, max_boot))
+
+        return {name: np.concatenate([results[name] for results in batches]) for name in self.outputs}
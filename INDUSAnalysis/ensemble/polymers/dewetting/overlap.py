@@ -19,6 +19,7 @@ from scipy.interpolate import UnivariateSpline
 from tqdm import tqdm
 
 from INDUSAnalysis import timeseries
+from INDUSAnalysis.lib.histogram import FixedBinHistogram
 
 
 def overlap(phivals: list, start_time: int, datformat: str, skip: int, imgfile: str, Nmin=0, Nmax=3000, Nbins=200):
@@ -41,15 +42,20 @@ def overlap(phivals: list, start_time: int, datformat: str, skip: int, imgfile:
     normalize = mcolors.Normalize(vmin=min(phivals), vmax=max(phivals))
     colormap = cm.rainbow
 
+    hist = FixedBinHistogram(Ntw_range[0], Ntw_range[1], Ntw_bins, nseries=len(phivals))
+
     for phi_idx, phi in enumerate(tqdm(phivals, desc="Looping over phis")):
         ts_waters = timeseries.loadTimeSeriesFromDAT(
             datformat.format(phi=phi), tcol=0, datacols=[2], labels=["c1", "c2"]
         )
         ts_waters = ts_waters[start_time:]
+        hist.add(ts_waters.data_array, series=phi_idx)
+
+    density = hist.density()
 
-        hist, edges = np.histogram(ts_waters.data_array, bins=Ntw_bins, range=Ntw_range, density=True)
-        x = 0.5 * (edges[1:] + edges[:-1])
-        y = hist
+    for phi_idx, phi in enumerate(phivals):
+        x = hist.centers
+        y = density[phi_idx]
         ax.plot(x, y, color=colormap(normalize(float(phi))))
         ax.fill_between(x, 0, y, color=colormap(normalize(float(phi))), alpha=0.4)
 
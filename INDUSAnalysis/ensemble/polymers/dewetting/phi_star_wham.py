@@ -20,9 +20,9 @@ from tqdm import tqdm
 
 import WHAM.binless
 from WHAM.lib import potentials
-from WHAM import statistics
 
 from INDUSAnalysis import timeseries
+from INDUSAnalysis.ensemble.polymers.phi_ensemble import reweight_phi_ensemble
 
 
 def phi_star_wham(
@@ -79,7 +79,7 @@ def phi_star_wham(
     phivals = np.array([float(phi) for phi in phivals])
     phivalbins = np.linspace(phivals.min(), phivals.max(), phibins)
 
-    N_avg, N_var = statistics.binless_reweight_phi_ensemble(calc, phivalbins, beta)
+    N_avg, N_var = reweight_phi_ensemble(calc, phivalbins, beta)
     max_idx = np.argmax(N_var)
     print(phivalbins[max_idx])
 
@@ -0,0 +1,363 @@
+"""
+Reweighting of binless WHAM calculations to the phi-ensemble, computing cumulants of the order
+parameter over fine phi grids with bounded memory.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+import numpy as np
+import scipy.optimize
+from scipy.special import binom, logsumexp
+
+# Logging
+logger = logging.getLogger(__name__)
+
+
+def moments_to_cumulants(moments):
+    """
+    Converts raw moments to cumulants.
+
+    Args:
+        moments (np.array): Array of shape (ncumulants, ...) containing raw moments <x>, <x^2>, ...
+
+    Returns:
+        Array of shape (ncumulants, ...) containing cumulants k_1, k_2, ...
+    """
+    cumulants = np.zeros_like(moments)
+    for n in range(1, len(moments) + 1):
+        cumulants[n - 1] = moments[n - 1]
+        for m in range(1, n):
+            cumulants[n - 1] -= binom(n - 1, m - 1) * cumulants[m - 1] * moments[n - m - 1]
+    return cumulants
+
+
+def _phi_block_moments(x_l, G_l, phi_block, beta, shift, ncumulants, sample_chunk):
+    """
+    Computes raw moments of (x - shift) in the phi-ensemble for a block of phi values, streaming
+    over chunks of samples with a running logsumexp.
+
+    Returns:
+        Array of shape (ncumulants, len(phi_block)).
+    """
+    nphi = len(phi_block)
+    lw_max = np.full(nphi, -np.inf)
+    sums = np.zeros((nphi, ncumulants + 1))
+
+    for start in range(0, len(x_l), sample_chunk):
+        x = np.asarray(x_l[start:start + sample_chunk], dtype=np.float64)
+        G = np.asarray(G_l[start:start + sample_chunk], dtype=np.float64)
+
+        # (phi x samples) log weights of chunk
+        lw = G[np.newaxis, :] - beta * phi_block[:, np.newaxis] * x[np.newaxis, :]
+        chunk_max = lw.max(axis=1)
+        new_max = np.maximum(lw_max, chunk_max)
+        new_max[np.isneginf(new_max)] = 0
+
+        # Rescale running sums to new maximum
+        sums *= np.exp(lw_max - new_max)[:, np.newaxis]
+        lw_max = new_max
+
+        lw -= new_max[:, np.newaxis]
+        np.exp(lw, out=lw)
+        powers = np.vander(x - shift, ncumulants + 1, increasing=True)
+        sums += lw @ powers
+
+    return (sums[:, 1:] / sums[:, [0]]).T
+
+
+def phi_ensemble_cumulants(x_l, G_l, phi_vals, beta, ncumulants=2, phi_chunk=64, sample_chunk=65536, nthreads=1):
+    """
+    Computes cumulants of x in the phi-ensemble, i.e. with sample log weights G_l - beta * phi * x_l,
+    for each phi value.
+
+    The (phi x samples) log weight matrix is never built in full. The phi values are split into
+    blocks which are processed in parallel threads, and each block streams over chunks of samples,
+    accumulating all moments in a single logsumexp pass. Peak memory is about
+    3 * nthreads * phi_chunk * sample_chunk * 8 bytes.
+
+    Args:
+        x_l (np.array): Samples from all windows (concatenated).
+        G_l (np.array): Log weights of samples in the unbiased ensemble.
+        phi_vals (np.array): Values of phi to reweight to.
+        beta (float): 1/kbT, in units of mol/kJ.
+        ncumulants (int): Number of cumulants to compute (default = 2, <x> and Var(x)).
+        phi_chunk (int): Number of phi values per block (default = 64).
+        sample_chunk (int): Number of samples per chunk (default = 65536).
+        nthreads (int): Number of threads (default = 1).
+
+    Returns:
+        Array of shape (ncumulants, len(phi_vals)) containing cumulants <x>, Var(x), ...
+    """
+    phi_vals = np.asarray(phi_vals, dtype=np.float64)
+    if ncumulants < 1:
+        raise ValueError("ncumulants must be at least 1.")
+
+    # Moments are accumulated about the sample mean, to limit cancellation in higher cumulants
+    shift = float(np.mean(x_l))
+
+    blocks = [phi_vals[start:start + phi_chunk] for start in range(0, len(phi_vals), phi_chunk)]
+
+    def block_moments(phi_block):
+        return _phi_block_moments(x_l, G_l, phi_block, beta, shift, ncumulants, sample_chunk)
+
+    if nthreads > 1:
+        with ThreadPoolExecutor(max_workers=nthreads) as pool:
+            moments = list(pool.map(block_moments, blocks))
+    else:
+        moments = [block_moments(phi_block) for phi_block in blocks]
+
+    cumulants = moments_to_cumulants(np.hstack(moments))
+    cumulants[0] += shift
+    return cumulants
+
+
+def reweight_phi_ensemble(calc, phi_vals, beta, nthreads=1):
+    """
+    Computes <x> and Var(x) in the phi-ensemble from a solved binless WHAM calculation.
+
+    Args:
+        calc: Solved binless WHAM calculation (WHAM.binless.Calc1D or object with x_l and G_l attributes).
+        phi_vals (np.array): Values of phi to reweight to.
+        beta (float): 1/kbT, in units of mol/kJ.
+        nthreads (int): Number of threads (default = 1).
+
+    Returns:
+        tuple(N_avg, N_var)
+    """
+    N_avg, N_var = phi_ensemble_cumulants(calc.x_l, calc.G_l, phi_vals, beta, ncumulants=2, nthreads=nthreads)
+    return N_avg, N_var
+
+
+def refine_phi_peaks(calc, phi_vals, peaks, beta, tol=1e-4):
+    """
+    Refines maxima of Var(x)(phi) located on a coarse phi grid, by maximizing Var(x) with bounded
+    Brent's method between the grid points neighbouring each peak.
+
+    Args:
+        calc: Solved binless WHAM calculation (object with x_l and G_l attributes).
+        phi_vals (np.array): Coarse grid of phi values.
+        peaks (list): Indices of peaks of Var(x) on the coarse grid.
+        beta (float): 1/kbT, in units of mol/kJ.
+        tol (float): Absolute tolerance of refined phi values (default = 1e-4).
+
+    Returns:
+        tuple(phi_peaks, N_avg_peaks, N_var_peaks) of refined phi values of peaks and <x> and
+        Var(x) at them.
+    """
+    phi_peaks = np.zeros(len(peaks))
+    N_avg_peaks = np.zeros(len(peaks))
+    N_var_peaks = np.zeros(len(peaks))
+
+    def neg_var(phi):
+        return -phi_ensemble_cumulants(calc.x_l, calc.G_l, [phi], beta)[1, 0]
+
+    for i, peak in enumerate(peaks):
+        bounds = (phi_vals[max(peak - 1, 0)], phi_vals[min(peak + 1, len(phi_vals) - 1)])
+        res = scipy.optimize.minimize_scalar(neg_var, bounds=bounds, method='bounded', options={'xatol': tol})
+        logger.debug("Refined peak {} at phi = {:.5f} in {} evaluations.".format(i, res.x, res.nfev))
+        phi_peaks[i] = res.x
+        N_avg_peaks[i], N_var_peaks[i] = phi_ensemble_cumulants(calc.x_l, calc.G_l, [res.x], beta)[:, 0]
+
+    return phi_peaks, N_avg_peaks, N_var_peaks
+
+
+def sample_bins(x_l, bin_points, bin_style='center'):
+    """
+    Assigns samples to bins of a uniform grid, with the same bin edges as binned free energy profiles.
+
+    Args:
+        x_l (np.array): Samples.
+        bin_points (np.array): Points defining bins.
+        bin_style (str): 'left' if bin_points are left edges of bins, 'center' if bin_points are
+            bin centers (default = 'center').
+
+    Returns:
+        Array of bin indices of samples, with -1 for samples outside all bins.
+    """
+    bin_points = np.asarray(bin_points, dtype=np.float64)
+    dx = bin_points[1] - bin_points[0]
+    if bin_style == 'center':
+        edges = np.append(bin_points - dx / 2, bin_points[-1] + dx / 2)
+    elif bin_style == 'left':
+        edges = np.append(bin_points, bin_points[-1] + dx)
+    else:
+        raise ValueError("Bin style {} not recognized.".format(bin_style))
+    idx = np.searchsorted(edges, x_l, side='right') - 1
+    idx[(idx < 0) | (idx >= len(bin_points))] = -1
+    return idx
+
+
+class BasinRatio:
+    """
+    Log ratio ln(P_A / P_B) of the probabilities of two sets of samples A and B in the phi-ensemble,
+    and its derivative with respect to phi.
+
+    The log weights and order parameter values of the samples in each set are extracted once, so each
+    evaluation is a logsumexp over the two sets. The derivative is
+    d ln(P_A / P_B) / d phi = -beta * (<x>_A - <x>_B), where the averages are over each set in the
+    phi-ensemble.
+
+    Args:
+        x_l (np.array): Samples from all windows (concatenated).
+        G_l (np.array): Log weights of samples in the unbiased ensemble.
+        mask_A (np.array): Boolean mask of samples in set A.
+        mask_B (np.array): Boolean mask of samples in set B.
+        beta (float): 1/kbT, in units of mol/kJ.
+
+    Raises:
+        ValueError if either set contains no samples.
+    """
+    def __init__(self, x_l, G_l, mask_A, mask_B, beta):
+        if not np.any(mask_A) or not np.any(mask_B):
+            raise ValueError("Basins must contain at least one sample each.")
+        x_l = np.asarray(x_l, dtype=np.float64)
+        G_l = np.asarray(G_l, dtype=np.float64)
+        self.x_A = x_l[mask_A]
+        self.G_A = G_l[mask_A]
+        self.x_B = x_l[mask_B]
+        self.G_B = G_l[mask_B]
+        self.beta = beta
+        self.nevals = 0
+
+    def _log_prob(self, x, G, phi):
+        """Returns unnormalized log probability of set and average of x over it."""
+        log_w = G - self.beta * phi * x
+        lse = logsumexp(log_w)
+        return lse, np.sum(np.exp(log_w - lse) * x)
+
+    def __call__(self, phi):
+        """
+        Returns:
+            tuple(ln(P_A / P_B), d ln(P_A / P_B) / d phi) at phi.
+        """
+        self.nevals += 1
+        lse_A, avg_A = self._log_prob(self.x_A, self.G_A, phi)
+        lse_B, avg_B = self._log_prob(self.x_B, self.G_B, phi)
+        return lse_A - lse_B, -self.beta * (avg_A - avg_B)
+
+    def root(self, phi0, tol=1e-4, maxiter=100):
+        """
+        Finds phi at which P_A = P_B, by bracketing the root starting from phi0 and refining it with
+        Newton's method safeguarded by bisection.
+
+        Args:
+            phi0 (float): Initial guess.
+            tol (float): Absolute tolerance in phi (default = 1e-4).
+            maxiter (int): Maximum number of bracketing and refinement iterations (default = 100).
+
+        Returns:
+            phi at which P_A = P_B.
+
+        Raises:
+            ValueError if the root cannot be bracketed or does not converge in maxiter iterations.
+        """
+        f0, df0 = self(phi0)
+        if f0 == 0:
+            return float(phi0)
+
+        # Expand bracket in the direction in which |f| decreases, starting from the Newton step
+        direction = -np.sign(f0 * df0) if df0 != 0 else 1.0
+        step = max(1.5 * abs(f0 / df0) if df0 != 0 else 1.0, tol)
+        a, fa = phi0, f0
+        b, (fb, _) = phi0 + direction * step, self(phi0 + direction * step)
+        for _ in range(maxiter):
+            if np.sign(fb) != np.sign(fa):
+                break
+            a, fa = b, fb
+            step *= 2
+            b = a + direction * step
+            fb, _ = self(b)
+        else:
+            raise ValueError("Could not bracket phi at which basin probabilities are equal.")
+
+        # Orient bracket so that f(lo) < 0 < f(hi)
+        lo, hi = (a, b) if fa < 0 else (b, a)
+        phi = b if abs(fb) < abs(fa) else a
+        for _ in range(maxiter):
+            f, df = self(phi)
+            if f == 0:
+                return float(phi)
+            if f < 0:
+                lo = phi
+            else:
+                hi = phi
+            phi_new = phi - f / df if df != 0 else None
+            if phi_new is None or not (min(lo, hi) < phi_new < max(lo, hi)):
+                phi_new = 0.5 * (lo + hi)
+            if abs(phi_new - phi) < tol or abs(hi - lo) < tol:
+                return float(phi_new)
+            phi = phi_new
+
+        raise ValueError("Root finding did not converge in {} iterations.".format(maxiter))
+
+
+class PhiEnsemble2D:
+    """
+    Reweights a binless WHAM calculation on x to phi-ensembles, binned in x and a second coordinate y.
+
+    The 2D bin of every sample is computed once, so the free energy profile at each phi value is a
+    single weighted bincount.
+
+    Args:
+        x_l (np.array): Samples of x from all windows (concatenated), in the order of G_l.
+        y_l (np.array): Samples of y, in the same order as x_l.
+        G_l (np.array): Log weights of samples in the unbiased ensemble.
+        x_bin_points (np.array): Points defining bins in x.
+        y_bin_points (np.array): Points defining bins in y.
+        beta (float): 1/kbT, in units of mol/kJ.
+        x_bin_style (str): 'left' or 'center' (default = 'center').
+        y_bin_style (str): 'left' or 'center' (default = 'center').
+
+    Examples:
+        >>> ens = PhiEnsemble2D(calc.x_l, y_l, calc.G_l, x_bin_points, y_bin_points, beta)
+        >>> betaF_2D = ens.betaF(phi_star)
+    """
+    def __init__(self, x_l, y_l, G_l, x_bin_points, y_bin_points, beta, x_bin_style='center', y_bin_style='center'):
+        x_l = np.asarray(x_l, dtype=np.float64)
+        y_l = np.asarray(y_l, dtype=np.float64)
+        G_l = np.asarray(G_l, dtype=np.float64)
+        if not (len(x_l) == len(y_l) == len(G_l)):
+            raise ValueError("x_l, y_l and G_l must have the same length.")
+
+        self.shape = (len(x_bin_points), len(y_bin_points))
+        self.log_bin_area = np.log((x_bin_points[1] - x_bin_points[0]) * (y_bin_points[1] - y_bin_points[0]))
+        self.log_bin_width_y = np.log(y_bin_points[1] - y_bin_points[0])
+        self.beta = beta
+
+        x_bins = sample_bins(x_l, x_bin_points, bin_style=x_bin_style)
+        y_bins = sample_bins(y_l, y_bin_points, bin_style=y_bin_style)
+        inside = (x_bins >= 0) & (y_bins >= 0)
+
+        self.x_l = x_l[inside]
+        self.G_l = G_l[inside]
+        self.y_bins = y_bins[inside]
+        self.bins = x_bins[inside] * self.shape[1] + self.y_bins
+        self.bin_counts = np.bincount(self.bins, minlength=self.shape[0] * self.shape[1]).reshape(self.shape)
+
+    def _weights(self, phi):
+        """Returns weights of samples in the phi-ensemble, scaled by exp(-shift), and shift."""
+        log_w = self.G_l - self.beta * phi * self.x_l
+        shift = log_w.max()
+        return np.exp(log_w - shift), shift
+
+    def betaF(self, phi):
+        """
+        Returns:
+            Free energy profile in (x, y) in the phi-ensemble, of shape (len(x_bin_points), len(y_bin_points)),
+            up to an additive constant (np.inf in empty bins).
+        """
+        w, shift = self._weights(phi)
+        p = np.bincount(self.bins, weights=w, minlength=self.shape[0] * self.shape[1]).reshape(self.shape)
+        with np.errstate(divide='ignore'):
+            return -np.log(p) - shift + self.log_bin_area
+
+    def betaF_second(self, phi):
+        """
+        Returns:
+            Free energy profile in y in the phi-ensemble, with x integrated out over the x bins, up to an
+            additive constant (np.inf in empty bins).
+        """
+        w, shift = self._weights(phi)
+        p = np.bincount(self.y_bins, weights=w, minlength=self.shape[1])
+        with np.errstate(divide='ignore'):
+            return -np.log(p) - shift + self.log_bin_width_y
@@ -0,0 +1,272 @@
+"""
+Dependency graph of analysis stages with content-hash invalidation, so that repeated runs of an
+analysis pipeline only re-run stages whose inputs have changed.
+"""
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+
+# Logging
+logger = logging.getLogger(__name__)
+
+# Stage executor of parallel runs, inherited by forked worker processes
+_parallel = {}
+
+
+def config_value(config, key):
+    """
+    Returns value of dotted key (e.g. "func_params.run_kappa_checks") in nested config dictionary,
+    or None if the key does not exist.
+    """
+    value = config
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def set_config_value(config, key, value):
+    """Sets value of dotted key in nested config dictionary, creating intermediate dictionaries."""
+    parts = key.split(".")
+    for part in parts[:-1]:
+        config = config.setdefault(part, {})
+    config[parts[-1]] = value
+
+
+def canonical(value):
+    """Returns copy of nested config value with all dictionary keys converted to strings, for hashing."""
+    if isinstance(value, dict):
+        return {str(k): canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    return value
+
+
+def file_signature(path):
+    """Returns string identifying contents of file by its path, size and modification time."""
+    if not os.path.exists(path):
+        return "{}:missing".format(os.path.abspath(path))
+    return "{}:{}:{}".format(os.path.abspath(path), os.path.getsize(path), os.path.getmtime(path))
+
+
+def _execute_stage(name):
+    """Runs stage in worker process of a parallel run."""
+    return _parallel["execute"](name)
+
+
+class Stage:
+    """
+    Analysis stage in a dependency graph.
+
+    Args:
+        name (str): Name of stage.
+        func (callable): Function with no arguments which runs the stage.
+        deps (list): Names of stages whose results this stage uses (default = []).
+        config_keys (list): Dotted keys of config entries this stage reads (default = []).
+        files (callable): Function of config returning list of input files this stage reads
+            (default = None, no input files).
+        writes (list): Dotted keys of config entries this stage writes (default = []). These are
+            excluded from the hash of the stage, so that stages which update entries they read
+            (e.g. an initial guess) do not invalidate themselves.
+    """
+    def __init__(self, name, func, deps=[], config_keys=[], files=None, writes=[]):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.config_keys = list(config_keys)
+        self.files = files
+        self.writes = list(writes)
+
+    def key(self, config, dep_keys):
+        """
+        Returns hash of the inputs of the stage: the config entries it reads, the signatures of its
+        input files, and the hashes of its dependencies.
+
+        Args:
+            config (dict): Configuration dictionary.
+            dep_keys (dict): Hashes of dependency stages.
+
+        Returns:
+            Hex digest.
+        """
+        inputs = {"name": self.name,
+                  "config": {key: canonical(config_value(config, key)) for key in self.config_keys if key not in self.writes},
+                  "files": [file_signature(f) for f in (self.files(config) if self.files is not None else [])],
+                  "deps": {dep: dep_keys[dep] for dep in self.deps}}
+        return hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class StageGraph:
+    """
+    Dependency graph of analysis stages.
+
+    Running a set of target stages runs their dependencies first. The hash of the inputs of each
+    stage (see Stage.key) is recorded in a JSON state file when the stage completes, and a stage
+    is skipped if its hash matches the recorded hash. As hashes of stages include the hashes of their
+    dependencies, changes propagate to all downstream stages.
+
+    Args:
+        stages (list): List of Stage objects.
+
+    Raises:
+        ValueError if a dependency is not a stage of the graph, or if the graph contains a cycle.
+    """
+    def __init__(self, stages):
+        self.stages = OrderedDict((stage.name, stage) for stage in stages)
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError("Dependency {} of stage {} not recognized.".format(dep, stage.name))
+        self.order(list(self.stages.keys()))
+
+    def order(self, targets):
+        """
+        Returns:
+            List of names of target stages and all their dependencies, in an order in which every stage
+            comes after its dependencies.
+
+        Raises:
+            ValueError if a target is not a stage of the graph, or if the graph contains a cycle.
+        """
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name not in self.stages:
+                raise ValueError("Calc type {} not recognized.".format(name))
+            if name in visiting:
+                raise ValueError("Stage dependency graph contains a cycle through {}.".format(name))
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.remove(name)
+            order.append(name)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    @staticmethod
+    def load_state(statefile):
+        """Returns dictionary of recorded stage hashes (empty if state file does not exist)."""
+        if not os.path.exists(statefile):
+            return {}
+        with open(statefile) as f:
+            return json.load(f)
+
+    @staticmethod
+    def save_state(statefile, state):
+        """Writes dictionary of recorded stage hashes atomically."""
+        fd, tmpf = tempfile.mkstemp(suffix=".json", dir=os.path.dirname(os.path.abspath(statefile)))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmpf, statefile)
+
+    def run(self, targets, load_config, statefile, force=False, nworkers=1, execute=None, apply_updates=None):
+        """
+        Runs target stages and their dependencies, skipping stages whose inputs are unchanged.
+
+        With nworkers > 1, stages whose dependencies have completed run concurrently in forked worker
+        processes. Workers do not write the config; instead, each stage is run in its worker as
+        execute(name), which returns a dictionary mapping dotted config keys to the values the
+        stage wrote. This process acts as the single coordinator of the config, applying the updates of
+        each completed stage through apply_updates(updates) before scheduling its dependents. Stages
+        running concurrently must therefore not read entries written by one another, which holds for
+        all stages that do not depend on each other if `writes` are declared correctly.
+
+        Args:
+            targets (list): Names of stages to run.
+            load_config (callable): Function with no arguments returning current configuration dictionary
+                (called before each stage, as earlier stages may update the config).
+            statefile (str): Path of JSON file to record stage hashes in.
+            force (bool): If true, run all stages regardless of recorded hashes (default = False).
+            nworkers (int): Number of stages to run concurrently (default = 1, run stages in this process).
+            execute (callable): Function of stage name which runs the stage in a worker process and returns
+                dictionary of config updates (default = None, call stage function and apply no updates).
+            apply_updates (callable): Function of dictionary of config updates which writes them to the
+                config (default = None, updates are discarded).
+
+        Returns:
+            List of names of stages which were run, in order of completion.
+        """
+        if nworkers > 1:
+            return self._run_parallel(targets, load_config, statefile, force, nworkers, execute, apply_updates)
+
+        state = self.load_state(statefile)
+        keys = {}
+        ran = []
+        for name in self.order(targets):
+            stage = self.stages[name]
+            keys[name] = stage.key(load_config(), keys)
+            if not force and state.get(name) == keys[name]:
+                logger.info("Stage {}: inputs unchanged, skipping.".format(name))
+                continue
+            logger.info("Stage {}: running.".format(name))
+            stage.func()
+            ran.append(name)
+            state[name] = keys[name]
+            self.save_state(statefile, state)
+        return ran
+
+    def _run_parallel(self, targets, load_config, statefile, force, nworkers, execute, apply_updates):
+        """Runs target stages and their dependencies over a pool of worker processes (see run)."""
+        if execute is None:
+            def execute(name):
+                self.stages[name].func()
+                return {}
+
+        state = self.load_state(statefile)
+        pending = self.order(targets)
+        done = set()
+        keys = {}
+        ran = []
+        running = {}
+
+        # Worker processes are forked (on submission), inheriting the executor and stage functions without pickling
+        _parallel["execute"] = execute
+        try:
+            with ProcessPoolExecutor(max_workers=nworkers, mp_context=multiprocessing.get_context("fork")) as pool:
+                while pending or running:
+                    # Schedule stages whose dependencies have completed, until no more become ready
+                    scheduled = True
+                    while scheduled:
+                        scheduled = False
+                        for name in list(pending):
+                            stage = self.stages[name]
+                            if not all(dep in done for dep in stage.deps):
+                                continue
+                            pending.remove(name)
+                            keys[name] = stage.key(load_config(), keys)
+                            if not force and state.get(name) == keys[name]:
+                                logger.info("Stage {}: inputs unchanged, skipping.".format(name))
+                                done.add(name)
+                                scheduled = True
+                            else:
+                                logger.info("Stage {}: running.".format(name))
+                                running[pool.submit(_execute_stage, name)] = name
+
+                    if not running:
+                        continue
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name = running.pop(future)
+                        updates = future.result()
+                        if updates and apply_updates is not None:
+                            apply_updates(updates)
+                        logger.info("Stage {}: done.".format(name))
+                        done.add(name)
+                        ran.append(name)
+                        state[name] = keys[name]
+                        self.save_state(statefile, state)
+        finally:
+            _parallel.clear()
+        return ran
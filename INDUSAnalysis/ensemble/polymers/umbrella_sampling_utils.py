@@ -14,6 +14,7 @@ import numpy as np
 
 from INDUSAnalysis import timeseries
 from INDUSAnalysis.indus_waters import WatersAnalysis
+from INDUSAnalysis.lib.histogram import FixedBinHistogram
 
 
 def estimate_kappa(datf: str, temp: float, start_time: float = 0, end_time: float = None):
@@ -115,13 +116,18 @@ def energy_overlap(temps: list,
     normalize = mcolors.Normalize(vmin=temps[0], vmax=temps[-1])
     colormap = cm.rainbow
 
-    bin_points = np.linspace(e_bin_min, e_bin_max, nbins)
+    # nbins bin points => nbins - 1 bins
+    hist = FixedBinHistogram(e_bin_min, e_bin_max, nbins - 1, nseries=len(temps))
 
     for t in range(len(temps)):
         ts = _read_energy_xvg(xvgfs[t])
-        hist, edges = np.histogram(ts[start_time:end_time].data_array, bins=bin_points, density=True)
-        x = 0.5 * (edges[1:] + edges[:-1])
-        y = hist
+        hist.add(ts[start_time:end_time].data_array, series=t)
+
+    density = hist.density()
+
+    for t in range(len(temps)):
+        x = hist.centers
+        y = density[t]
         ax.plot(x, y, color=colormap(normalize(temps[t])), label="%d" % temps[t])
         ax.fill_between(x, 0, y, color=colormap(normalize(temps[t])), alpha=0.4)
 
@@ -5,9 +5,9 @@ Calculates 1D and 2D free energy profiles (in Nt and a second order parameter) f
 import argparse
 from collections import OrderedDict
 import logging
-from multiprocessing import Pool
 import os
 import pickle
+import tempfile
 import yaml
 
 import matplotlib.colors as mcolors
@@ -16,13 +16,17 @@ import matplotlib.pyplot as plt
 from matplotlib.ticker import AutoMinorLocator
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 import numpy as np
-import scipy.optimize
 from scipy.signal import find_peaks
 from scipy.special import logsumexp
-from WHAM.lib import potentials, timeseries
+from WHAM.lib import potentials
 import WHAM.binless
 import WHAM.statistics
 
+from INDUSAnalysis.ensemble.polymers.bootstrap import SharedBootstrap, boot_phi_stars, boot_replica
+from INDUSAnalysis.ensemble.polymers.phi_ensemble import BasinRatio, PhiEnsemble2D, refine_phi_peaks, reweight_phi_ensemble, sample_bins
+from INDUSAnalysis.ensemble.polymers.pipeline import Stage, StageGraph, config_value, set_config_value
+from INDUSAnalysis.ensemble.polymers.wham_state import CalcState
+from INDUSAnalysis.ensemble.polymers.window_cache import WindowCache
 from INDUSAnalysis.indus_waters import WatersAnalysis
 from INDUSAnalysis.timeseries import TimeSeries
 from INDUSAnalysis.timeseries import TimeSeriesAnalysis
@@ -36,6 +40,16 @@ mpl_logger = logging.getLogger("matplotlib")
 mpl_logger.setLevel(logging.ERROR)
 
 
+def window_files(*keys):
+    """
+    Returns function listing the files of all umbrella windows in a config dictionary, for the given
+    window file keys (e.g. "Nt_file").
+    """
+    def files(config):
+        return [config["windows"][n_star][key] for key in keys for n_star in sorted(config["windows"].keys(), key=str)]
+    return files
+
+
 class WHAM_analysis_biasN:
     """
     Class for performing calculations and plotting figures.
@@ -51,7 +65,11 @@ class WHAM_analysis_biasN:
 
     def __init__(self, config_file="config.yaml"):
         self.config_file = config_file
+        # If set, update_config records config instead of writing it (parallel runs, see run_stage_deferred)
+        self.defer_config_writes = False
+        self.deferred_config = None
         self.register()
+        self.register_stages()
 
     def register(self):
         self.func_registry = OrderedDict([
@@ -78,6 +96,79 @@ class WHAM_analysis_biasN:
         ])
         return self.func_registry
 
+    def register_stages(self):
+        """
+        Builds dependency graph of the analysis stages in `func_registry`, for incremental runs.
+
+        Each stage declares the stages whose results it uses, the config entries it reads and writes,
+        and the window data files it reads. A stage is re-run only if the hash of these inputs changes.
+        """
+        data_keys = ["system", "umbrellas", "windows", "io_global",
+                     "data_collection.TSTART", "data_collection.TEND", "data_collection.BASE_SAMP_FREQ"]
+        data2_keys = ["system", "umbrellas", "windows", "io_global",
+                      "data_collection.TSTART", "data_collection.TEND", "data_collection.BASE_SAMP_FREQ2", "2d_binning"]
+        nt_files = window_files("Nt_file")
+        nt_sec_OP_files = window_files("Nt_file", "sec_OP_file")
+        phi_star_keys = ["1d_phi_star.PHI_STAR", "1d_phi_star.PHI_STAR_EQ", "1d_phi_star.PHI_STAR_COEX",
+                         "2d_phi_star.PHI_STAR2", "2d_phi_star.PHI_STAR_EQ2", "2d_phi_star.PHI_STAR_COEX2"]
+
+        def boot_files(config):
+            if config["func_params"]["calc_deltaGu_diff_method"]["boot_errors"]:
+                return [config["io_global"]["calcoutdir"] + "/" + config["func_params"]["run_bootstrap_ll_phi_ensemble"]["betaFboot_datfile"]]
+            return []
+
+        f = self.func_registry
+        stages = [
+            Stage("get", f["get"], config_keys=data_keys + ["1d_binning"], files=nt_files),
+            Stage("get2", f["get2"], config_keys=data2_keys, files=nt_sec_OP_files),
+            Stage("hist", f["hist"], config_keys=data_keys + ["1d_binning", "func_params.plot_hist"], files=nt_files),
+            Stage("1D", f["1D"], config_keys=data_keys + ["1d_binning", "func_params.run_binless_log_likelihood"], files=nt_files),
+            Stage("kappa", f["kappa"], deps=["1D"],
+                  config_keys=data_keys + ["1d_binning", "func_params.run_kappa_checks"]),
+            Stage("win_KLD", f["win_KLD"], deps=["1D"],
+                  config_keys=data_keys + ["1d_binning", "func_params.run_reweighting_checks"], files=nt_files),
+            Stage("phi", f["phi"], deps=["1D"],
+                  config_keys=data_keys + ["1d_phi_ensemble", "func_params.run_phi_ensemble_reweight"],
+                  writes=phi_star_keys),
+            Stage("phi_1_star", f["phi_1_star"], deps=["phi"],
+                  config_keys=data_keys + ["1d_binning", "1d_phi_star.PHI_STAR", "1d_plot_phi_star", "func_params.run_reweight_phi_1_star"]),
+            Stage("basins", f["basins"], deps=["phi_1_star"],
+                  config_keys=["io_global", "find_basins", "func_params.run_reweight_phi_1_star"],
+                  writes=["basins"]),
+            Stage("phi_e_star", f["phi_e_star"], deps=["1D", "phi", "basins"],
+                  config_keys=data_keys + ["1d_binning", "basins", "1d_phi_star.PHI_STAR_EQ", "1d_plot_phi_star", "func_params.run_phi_e_star_opt"],
+                  writes=["1d_phi_star.PHI_STAR_EQ", "2d_phi_star.PHI_STAR_EQ2"]),
+            Stage("phi_c_star", f["phi_c_star"], deps=["1D", "phi"],
+                  config_keys=data_keys + ["1d_binning", "coex", "1d_phi_star.PHI_STAR_COEX", "1d_plot_phi_star", "func_params.run_phi_c_star_opt"],
+                  writes=["1d_phi_star.PHI_STAR_COEX", "2d_phi_star.PHI_STAR_COEX2"]),
+            Stage("1D_boot_phi", f["1D_boot_phi"],
+                  config_keys=data_keys + ["1d_binning", "1d_bootstrap", "1d_phi_ensemble", "func_params.run_bootstrap_ll_phi_ensemble"],
+                  files=nt_files),
+            Stage("deltaG_diff", f["deltaG_diff"], deps=["1D", "basins"],
+                  config_keys=["io_global", "basins", "func_params.calc_deltaGu_diff_method",
+                               "func_params.run_binless_log_likelihood.betaF_datfile"],
+                  files=boot_files),
+            Stage("deltaG_int", f["deltaG_int"], deps=["1D"],
+                  config_keys=["io_global", "coex", "func_params.calc_deltaGu_int_method_1D",
+                               "func_params.run_binless_log_likelihood.betaF_datfile"]),
+            Stage("2D", f["2D"], deps=["1D"],
+                  config_keys=data2_keys + ["2d_plot", "func_params.run_2D_binless_log_likelihood"], files=nt_sec_OP_files),
+            Stage("sec_OP", f["sec_OP"], deps=["1D"],
+                  config_keys=data2_keys + ["func_params.run_2D_bin_sec_OP"], files=nt_sec_OP_files),
+            Stage("2D_phi_stars", f["2D_phi_stars"], deps=["1D", "phi", "phi_e_star", "phi_c_star"],
+                  config_keys=data2_keys + ["2d_phi_star", "2d_plot_phi_star", "func_params.run_2D_reweight_phi_star"],
+                  files=nt_sec_OP_files),
+            Stage("sec_OP_phi_stars", f["sec_OP_phi_stars"], deps=["1D", "phi", "phi_e_star", "phi_c_star"],
+                  config_keys=data2_keys + ["2d_phi_star", "2d_plot_phi_star", "func_params.run_2D_reweight_phi_star_bin_sec_OP"],
+                  files=nt_sec_OP_files),
+            Stage("2D_coex", f["2D_coex"], deps=["2D_phi_stars"],
+                  config_keys=["io_global", "coex", "coex2", "coexsec_OP", "2d_plot_phi_star", "func_params.run_coex_integration_2D"]),
+            Stage("sec_OP_coex", f["sec_OP_coex"], deps=["sec_OP_phi_stars"],
+                  config_keys=["io_global", "coex2", "coexsec_OP", "2d_plot_phi_star", "func_params.run_coex_integration_sec_OP"])
+        ]
+        self.stage_graph = StageGraph(stages)
+        return self.stage_graph
+
     def load_config(self):
         with open(self.config_file, 'r') as f:
             self.config = yaml.safe_load(f)
@@ -107,10 +198,123 @@ class WHAM_analysis_biasN:
             for k, v in self.config[category].items():
                 setattr(self, k, v)
 
+        # Directory to cache parsed window data in
+        if self.config["io_global"].get("cachedir") is None:
+            self.cachedir = self.calcoutdir + "/cache"
+
+        # Number of threads for phi-ensemble reweighting
+        self.PHI_NTHREADS = self.config["1d_phi_ensemble"].get("PHI_NTHREADS") or 1
+
+        # Tolerance of refined phi_1_star (None = grid resolution)
+        self.PHI_STAR_TOL = self.config["1d_phi_ensemble"].get("PHI_STAR_TOL")
+
+        # Number of bootstrap replicas per worker task (None = automatic)
+        self.BOOT_CHUNKSIZE = self.config["1d_bootstrap"].get("BOOT_CHUNKSIZE")
+
+        # Adaptive bootstrapping: tolerance on relative change in error bars (None = run NBOOT replicas),
+        # and number of replicas per batch
+        self.BOOT_TOL = self.config["1d_bootstrap"].get("BOOT_TOL")
+        self.BOOT_BATCH = self.config["1d_bootstrap"].get("BOOT_BATCH") or 2 * self.NWORKERS
+
     def update_config(self):
+        if self.defer_config_writes:
+            self.deferred_config = self.config
+            return
         with open(self.config_file, 'w') as f:
             yaml.dump(self.config, f)
 
+    def apply_config_updates(self, updates):
+        """
+        Writes config updates of a stage to the config file. The file is re-read before applying the
+        updates, so that updates of concurrently run stages are merged, and replaced atomically, so that
+        stages reading the config concurrently never see a partially written file.
+
+        Args:
+            updates (dict): Mapping of dotted config keys to values.
+        """
+        with open(self.config_file, 'r') as f:
+            config = yaml.safe_load(f)
+        for key, value in updates.items():
+            set_config_value(config, key, value)
+        fd, tmpf = tempfile.mkstemp(suffix=".yaml", dir=os.path.dirname(os.path.abspath(self.config_file)))
+        with os.fdopen(fd, 'w') as f:
+            yaml.dump(config, f)
+        os.replace(tmpf, self.config_file)
+
+    def run_stage_deferred(self, name):
+        """
+        Runs stage in a worker process of a parallel incremental run. Instead of writing the config
+        file, returns the config entries the stage declares it writes, for the coordinating process
+        to apply with apply_config_updates.
+
+        Args:
+            name (str): Name of stage.
+
+        Returns:
+            Dictionary mapping dotted config keys to values.
+        """
+        self.defer_config_writes = True
+        self.deferred_config = None
+        self.func_registry[name]()
+        if self.deferred_config is None:
+            return {}
+        return {key: config_value(self.deferred_config, key) for key in self.stage_graph.stages[name].writes}
+
+    def read_Ntw_win(self, n_star_win, base_samp_freq):
+        """
+        Reads N~ timeseries of umbrella windows from TSTART to TEND, sampled every base_samp_freq
+        frames.
+
+        Parsed data is cached in `cachedir`, keyed by the waters files and the slicing parameters, so
+        that later stages and bootstrap workers memory-map the cache instead of re-parsing the files.
+
+        Args:
+            n_star_win: List of N* values of umbrella windows.
+            base_samp_freq: Sampling frequency, in frames.
+
+        Returns:
+            Ntw_win: List containing an array of N~ values for each umbrella window.
+        """
+        files = [self.config["windows"][n_star]["Nt_file"] for n_star in n_star_win]
+        scales = [int(self.config["windows"][n_star]["XTCDT"] / self.config["windows"][n_star]["UMBDT"]) for n_star in n_star_win]
+        params = {"TSTART": self.TSTART, "TEND": self.TEND, "NTSCALE": scales, "BASE_SAMP_FREQ": base_samp_freq}
+
+        def reader():
+            Ntw_win = []
+            for Nt_file, NTSCALE in zip(files, scales):
+                ts_N, ts_Ntw, _ = WatersAnalysis.read_waters(Nt_file)
+                Ntw_win.append(ts_Ntw[self.TSTART:self.TEND:NTSCALE * base_samp_freq].data_array)
+            return Ntw_win
+
+        Ntw_win = WindowCache(self.cachedir).get("Ntw", files, params, reader)
+        for n_star, Ntw in zip(n_star_win, Ntw_win):
+            logger.debug("(N~) N*={}: {} to end, skipping {}. {} entries.".format(n_star, self.TSTART, base_samp_freq, len(Ntw)))
+        return Ntw_win
+
+    def read_sec_OP_win(self, n_star_win, base_samp_freq):
+        """
+        Reads sec_OP timeseries of umbrella windows from TSTART to TEND, sampled every base_samp_freq
+        frames. Parsed data is cached in `cachedir`.
+
+        Args:
+            n_star_win: List of N* values of umbrella windows.
+            base_samp_freq: Sampling frequency, in frames.
+
+        Returns:
+            sec_OP_win: List containing an array of sec_OP values for each umbrella window.
+        """
+        files = [self.config["windows"][n_star]["sec_OP_file"] for n_star in n_star_win]
+        params = {"TSTART": self.TSTART, "TEND": self.TEND, "BASE_SAMP_FREQ": base_samp_freq}
+
+        def reader():
+            tsa = TimeSeriesAnalysis()
+            return [tsa.load_TimeSeries(sec_OP_file)[self.TSTART:self.TEND:base_samp_freq].data_array for sec_OP_file in files]
+
+        sec_OP_win = WindowCache(self.cachedir).get("sec_OP", files, params, reader)
+        for n_star, sec_OP in zip(n_star_win, sec_OP_win):
+            logger.debug("(sec_OP) N*={}: {} to end, skipping {}. {} entries.".format(n_star, self.TSTART, base_samp_freq, len(sec_OP)))
+        return sec_OP_win
+
     def get_test_data(self):
         """
         Returns:
@@ -150,15 +354,7 @@ class WHAM_analysis_biasN:
         bin_points = np.linspace(self.NMIN, self.NMAX, self.NBINS)
 
         # Raw, correlated timeseries CV data from each window
-        Ntw_win = []
-
-        # Read waters
-        for n_star in n_star_win:
-            ts_N, ts_Ntw, _ = WatersAnalysis.read_waters(self.config["windows"][n_star]["Nt_file"])
-            NTSCALE = int(self.config["windows"][n_star]["XTCDT"] / self.config["windows"][n_star]["UMBDT"])
-            Ntw_win.append(ts_Ntw[self.TSTART:self.TEND:NTSCALE * self.BASE_SAMP_FREQ].data_array)
-            logger.debug("(N~) N*={}: {} to end, skipping {}. {} entries.".format(n_star, self.TSTART, self.BASE_SAMP_FREQ,
-                         len(ts_N[self.TSTART:self.TEND:NTSCALE * self.BASE_SAMP_FREQ].data_array)))
+        Ntw_win = self.read_Ntw_win(n_star_win, self.BASE_SAMP_FREQ)
 
         beta = 1000 / (8.314 * int(self.TEMP))  # at T, in kJ/mol units
 
@@ -216,25 +412,8 @@ class WHAM_analysis_biasN:
         y_bin_points = np.linspace(self.SECOPMIN2, self.SECOPMAX2, self.SECOPBINS2)
 
         # Raw, correlated timeseries CV data from each window
-        Ntw_win = []
-
-        # Read waters
-        for n_star in n_star_win:
-            ts_N, ts_Ntw, _ = WatersAnalysis.read_waters(self.config["windows"][n_star]["Nt_file"])
-            NTSCALE = int(self.config["windows"][n_star]["XTCDT"] / self.config["windows"][n_star]["UMBDT"])
-            Ntw_win.append(ts_Ntw[self.TSTART:self.TEND:NTSCALE * self.BASE_SAMP_FREQ2].data_array)
-            logger.debug("(N~) N*={}: {} to end, skipping {}. {} entries.".format(n_star, self.TSTART, self.BASE_SAMP_FREQ2,
-                         len(ts_N[self.TSTART:self.TEND:NTSCALE * self.BASE_SAMP_FREQ].data_array)))
-
-        tsa = TimeSeriesAnalysis()
-
-        sec_OP_win = []
-
-        for n_star in n_star_win:
-            ts = tsa.load_TimeSeries(self.config["windows"][n_star]["sec_OP_file"])
-            sec_OP_win.append(ts[self.TSTART:self.TEND:self.BASE_SAMP_FREQ2].data_array)
-            logger.debug("(sec_OP) N*={}: {} to end, skipping {}. {} entries.".format(n_star, self.TSTART, self.BASE_SAMP_FREQ2,
-                         len(ts[self.TSTART:self.TEND:self.BASE_SAMP_FREQ2].data_array)))
+        Ntw_win = self.read_Ntw_win(n_star_win, self.BASE_SAMP_FREQ2)
+        sec_OP_win = self.read_sec_OP_win(n_star_win, self.BASE_SAMP_FREQ2)
 
         beta = 1000 / (8.314 * int(self.TEMP))  # at T K, in kJ/mol units
 
@@ -258,6 +437,37 @@ class WHAM_analysis_biasN:
 
         return n_star_win, Ntw_win, sec_OP_win, x_bin_points, y_bin_points, umbrella_win, beta
 
+    def save_calc(self, calc, calcfile, N_i, n_star_win, beta):
+        """
+        Saves solved state of binless WHAM calculation to `calcoutdir`/calcfile, as raw arrays which
+        can be memory-mapped (see CalcState).
+
+        Args:
+            calc: Solved WHAM.binless.Calc1D object.
+            calcfile: Name of directory to save state to.
+            N_i: Number of samples in each umbrella window.
+            n_star_win: List of all simulation Nstar values for each umbrella window.
+            beta: 1/kbT for the simulation, in units of mol/kJ.
+        """
+        umbrellas = {"potential": "harmonic", "KAPPA": float(self.KAPPA), "n_star_win": list(n_star_win)}
+        CalcState.from_calc(calc, N_i, beta, umbrellas).save(self.calcoutdir + "/" + calcfile)
+
+    def load_calc(self, calcfile):
+        """
+        Loads solved binless WHAM calculation, ready for reweighting and binning.
+
+        Args:
+            calcfile: Name of directory containing state saved by save_calc, or of pickled calculation object.
+
+        Returns:
+            WHAM.binless.Calc1D object.
+        """
+        saveloc = self.calcoutdir + "/" + calcfile
+        if os.path.isfile(saveloc):
+            with open(saveloc, "rb") as calcf:
+                return pickle.load(calcf)
+        return CalcState.load(saveloc).restore(WHAM.binless.Calc1D())
+
     ############################################################################
     # Histogram
     ############################################################################
@@ -347,8 +557,7 @@ class WHAM_analysis_biasN:
         g_i = calc.g_i
 
         # Save calc
-        with open(self.calcoutdir + "/" + params["calcfile"], "wb") as calcf:
-            pickle.dump(calc, calcf)
+        self.save_calc(calc, params["calcfile"], [len(Ntw) for Ntw in Ntw_win], n_star_win, beta)
 
         # Optimized?
         logger.debug(status)
@@ -418,8 +627,7 @@ class WHAM_analysis_biasN:
         n_star_win, Ntw_win, bin_points, umbrella_win, beta = self.get_test_data()
         kappa = self.KAPPA
 
-        saveloc = self.calcoutdir + "/" + params["in_calcfile"]
-        calc = pickle.load(open(saveloc, "rb"))
+        calc = self.load_calc(params["in_calcfile"])
 
         betaF, betaF_bin_counts = calc.bin_betaF_profile(bin_points, bin_style="center")
         betaF = betaF - np.min(betaF)
@@ -464,8 +672,7 @@ class WHAM_analysis_biasN:
 
         n_star_win, Ntw_win, bin_points, umbrella_win, beta = self.get_test_data()
 
-        saveloc = self.calcoutdir + "/" + params["in_calcfile"]
-        calc = pickle.load(open(saveloc, "rb"))
+        calc = self.load_calc(params["in_calcfile"])
 
         betaF_il, _ = WHAM.statistics.win_betaF(Ntw_win, bin_points, umbrella_win, beta,
                                                 bin_style='center')
@@ -527,6 +734,10 @@ class WHAM_analysis_biasN:
         Reweights 1D profile and calculates average N~ and Var(N~) in the phi-ensemble.
         Uses averages to estimate phi_1_star.
 
+        If 1d_phi_ensemble.PHI_STAR_TOL is set, peaks of Var(N~) found on the (coarse) phi grid are
+        refined to this tolerance by maximizing Var(N~) between neighbouring grid points, so that
+        phi_1_star does not depend on the grid spacing.
+
         Loads the following params from the config file:
             saved:
             in_calcfile:
@@ -544,18 +755,23 @@ class WHAM_analysis_biasN:
 
         n_star_win, Ntw_win, bin_points, umbrella_win, beta = self.get_test_data()
 
-        saveloc = self.calcoutdir + "/" + params["in_calcfile"]
-        calc = pickle.load(open(saveloc, "rb"))
+        calc = self.load_calc(params["in_calcfile"])
 
         phi_vals = np.linspace(self.PHI_BIN_MIN, self.PHI_BIN_MAX, self.PHI_BINS)
 
-        N_avg_vals, N_var_vals = WHAM.statistics.binless_reweight_phi_ensemble(calc, phi_vals, beta)
+        N_avg_vals, N_var_vals = reweight_phi_ensemble(calc, phi_vals, beta, nthreads=self.PHI_NTHREADS)
 
         peaks, _ = find_peaks(N_var_vals, height=self.PEAK_CUT)
+        phi_peaks = phi_vals[peaks]
+        N_avg_peaks = N_avg_vals[peaks]
+        N_var_peaks = N_var_vals[peaks]
+
+        if self.PHI_STAR_TOL is not None:
+            phi_peaks, N_avg_peaks, N_var_peaks = refine_phi_peaks(calc, phi_vals, peaks, beta, tol=float(self.PHI_STAR_TOL))
 
         fig, ax = plt.subplots(2, 1, figsize=(4, 8), dpi=150)
         ax[0].plot(beta * phi_vals, N_avg_vals)
-        ax[0].plot(beta * phi_vals[peaks], N_avg_vals[peaks], 'x')
+        ax[0].plot(beta * phi_peaks, N_avg_peaks, 'x')
         ax[0].set_xlabel(r"$\beta \phi$")
         ax[0].set_ylabel(r"$\langle \tilde{N} \rangle_\phi$")
 
@@ -573,10 +789,9 @@ class WHAM_analysis_biasN:
 
         logger.debug(phi_vals[np.argmax(N_var_vals)])
 
-        sorted_peaks = sorted(peaks)
-        for i, peak in enumerate(sorted_peaks):
-            logger.debug(beta * phi_vals[peak])
-            ax[1].text(beta * phi_vals[peak], N_var_vals[peak], r"$\beta \phi_{}* = {:.3f}$".format(i + 1, beta * phi_vals[peak]))
+        for i, phi_peak in enumerate(phi_peaks):
+            logger.debug(beta * phi_peak)
+            ax[1].text(beta * phi_peak, N_var_peaks[i], r"$\beta \phi_{}* = {:.3f}$".format(i + 1, beta * phi_peak))
 
         plt.savefig(self.plotoutdir + "/" + params["phi_ens_imgfile"], bbox_inches='tight')
         plt.close()
@@ -591,16 +806,16 @@ class WHAM_analysis_biasN:
         # Write peak information to text file
         of = open(self.calcoutdir + "/" + params["phi_ens_peaks_datfile"], "w")
         of.write("# phi    beta*phi\n")
-        for i, peak in enumerate(sorted(peaks)):
-            of.write("{:.5f} {:.5f}\n".format(phi_vals[peak], beta * phi_vals[peak]))
+        for phi_peak in phi_peaks:
+            of.write("{:.5f} {:.5f}\n".format(phi_peak, beta * phi_peak))
         of.close()
 
-        self.config["1d_phi_star"]["PHI_STAR"] = float("{:.5f}".format(sorted(phi_vals[peaks])[0]))
-        self.config["2d_phi_star"]["PHI_STAR2"] = float("{:.5f}".format(sorted(phi_vals[peaks])[0]))
-        self.config["1d_phi_star"]["PHI_STAR_EQ"] = float("{:.5f}".format(sorted(phi_vals[peaks])[0]))
-        self.config["2d_phi_star"]["PHI_STAR_EQ2"] = float("{:.5f}".format(sorted(phi_vals[peaks])[0]))
-        self.config["1d_phi_star"]["PHI_STAR_COEX"] = float("{:.5f}".format(sorted(phi_vals[peaks])[0]))
-        self.config["2d_phi_star"]["PHI_STAR_COEX2"] = float("{:.5f}".format(sorted(phi_vals[peaks])[0]))
+        self.config["1d_phi_star"]["PHI_STAR"] = float("{:.5f}".format(phi_peaks[0]))
+        self.config["2d_phi_star"]["PHI_STAR2"] = float("{:.5f}".format(phi_peaks[0]))
+        self.config["1d_phi_star"]["PHI_STAR_EQ"] = float("{:.5f}".format(phi_peaks[0]))
+        self.config["2d_phi_star"]["PHI_STAR_EQ2"] = float("{:.5f}".format(phi_peaks[0]))
+        self.config["1d_phi_star"]["PHI_STAR_COEX"] = float("{:.5f}".format(phi_peaks[0]))
+        self.config["2d_phi_star"]["PHI_STAR_COEX2"] = float("{:.5f}".format(phi_peaks[0]))
         self.update_config()
 
     ############################################################################
@@ -629,8 +844,7 @@ class WHAM_analysis_biasN:
 
         n_star_win, Ntw_win, bin_points, umbrella_win, beta = self.get_test_data()
 
-        saveloc = self.calcoutdir + "/" + params["in_calcfile"]
-        calc = pickle.load(open(saveloc, "rb"))
+        calc = self.load_calc(params["in_calcfile"])
 
         phi_1_star = self.PHI_STAR
         logger.debug(phi_1_star)
@@ -727,22 +941,14 @@ class WHAM_analysis_biasN:
 
         self.update_config()
 
-    def reweight_get_basin_diff2(self, phi, calc, bin_points, beta):
+    def basin_ratio_diff(self, calc, bin_points, beta):
         """
-        Objective function to minimize to calculate phi_e*
+        Returns BasinRatio of the samples in the bins at NC and NE, which is zero at phi_e*.
         """
-        umb_phi = potentials.linear(phi)
-        betaF_il_reweight = WHAM.statistics.binless_reweighted_win_betaF(calc, bin_points, [umb_phi],
-                                                                         beta, bin_style='center')
-        betaF_rew = betaF_il_reweight[0]
-        betaF_rew = betaF_rew - np.min(betaF_rew)
-        ne_idx = np.argmin(np.abs(bin_points - self.NE))
+        bins = sample_bins(calc.x_l, bin_points, bin_style='center')
         nc_idx = np.argmin(np.abs(bin_points - self.NC))
-        objective = (betaF_rew[ne_idx] - betaF_rew[nc_idx]) ** 2
-        logger.debug("phi = {:.5f}, betaphi = {:.5f}, objective = {:.5f}".format(float(phi),
-                                                                                 beta * float(phi),
-                                                                                 float(objective)))
-        return objective
+        ne_idx = np.argmin(np.abs(bin_points - self.NE))
+        return BasinRatio(calc.x_l, calc.G_l, bins == nc_idx, bins == ne_idx, beta)
 
     def run_phi_e_star_opt(self):
         """
@@ -767,17 +973,12 @@ class WHAM_analysis_biasN:
 
         # Load params
         n_star_win, Ntw_win, bin_points, umbrella_win, beta = self.get_test_data()
-        saveloc = self.calcoutdir + "/" + params["in_calcfile"]
-        calc = pickle.load(open(saveloc, "rb"))
-
-        # Optimize
-        res = scipy.optimize.minimize(self.reweight_get_basin_diff2,
-                                      self.PHI_STAR_EQ,
-                                      args=(calc, bin_points, beta),
-                                      method='Nelder-Mead',
-                                      tol=params["opt_thresh"])
+        calc = self.load_calc(params["in_calcfile"])
 
-        phi_e_star = float(res.x)
+        # Find phi at which free energies at NC and NE are equal
+        ratio = self.basin_ratio_diff(calc, bin_points, beta)
+        phi_e_star = ratio.root(self.PHI_STAR_EQ, tol=params["opt_thresh"])
+        logger.debug("phi_e* = {:.5f} found in {} evaluations.".format(phi_e_star, ratio.nevals))
 
         # Save results
         self.config["1d_phi_star"]["PHI_STAR_EQ"] = float("{:.5f}".format(phi_e_star))
@@ -913,27 +1114,13 @@ class WHAM_analysis_biasN:
     # phi_c* optimization
     ############################################################################
 
-    def reweight_get_basin_int2(self, phi, calc, bin_points, beta):
+    def basin_ratio_int(self, calc, bin_points, beta):
         """
-        Objective function to minimize to calculate phi_c*
+        Returns BasinRatio of the samples in bins below and above NT_SPLIT, which is zero at phi_c*.
         """
-        umb_phi = potentials.linear(phi)
-        betaF_il_reweight = WHAM.statistics.binless_reweighted_win_betaF(calc, bin_points, [umb_phi],
-                                                                         beta, bin_style='center')
-        betaF_rew = betaF_il_reweight[0]
-        betaF_rew = betaF_rew - np.min(betaF_rew)
-
-        idxC = np.argwhere(bin_points < self.NT_SPLIT)
-        idxE = np.argwhere(bin_points >= self.NT_SPLIT)
-
-        gC = -logsumexp(-betaF_rew[idxC].flatten())
-        gE = -logsumexp(-betaF_rew[idxE].flatten())
-
-        objective = (gC - gE) ** 2
-        logger.debug("phi = {:.5f}, betaphi = {:.5f}, objective = {:.5f}".format(float(phi),
-                                                                                 beta * float(phi),
-                                                                                 float(objective)))
-        return objective
+        bins = sample_bins(calc.x_l, bin_points, bin_style='center')
+        below = bin_points < self.NT_SPLIT
+        return BasinRatio(calc.x_l, calc.G_l, (bins >= 0) & below[bins], (bins >= 0) & ~below[bins], beta)
 
     def run_phi_c_star_opt(self, plot=True):
         """
@@ -958,17 +1145,12 @@ class WHAM_analysis_biasN:
 
         # Load params
         n_star_win, Ntw_win, bin_points, umbrella_win, beta = self.get_test_data()
-        saveloc = self.calcoutdir + "/" + params["in_calcfile"]
-        calc = pickle.load(open(saveloc, "rb"))
-
-        # Optimize
-        res = scipy.optimize.minimize(self.reweight_get_basin_int2,
-                                      self.PHI_STAR_COEX,
-                                      args=(calc, bin_points, beta),
-                                      method='Nelder-Mead',
-                                      tol=params["opt_thresh"])
+        calc = self.load_calc(params["in_calcfile"])
 
-        phi_c_star = float(res.x)
+        # Find phi at which probabilities of basins below and above NT_SPLIT are equal
+        ratio = self.basin_ratio_int(calc, bin_points, beta)
+        phi_c_star = ratio.root(self.PHI_STAR_COEX, tol=params["opt_thresh"])
+        logger.debug("phi_c* = {:.5f} found in {} evaluations.".format(phi_c_star, ratio.nevals))
 
         # Save results
         self.config["1d_phi_star"]["PHI_STAR_COEX"] = float("{:.5f}".format(phi_c_star))
@@ -1084,42 +1266,15 @@ class WHAM_analysis_biasN:
     # 1D phi-ensemble bootstrapping and phi_1_star + error bar calculation
     ############################################################################
 
-    def boot_worker(self, boot_worker_idx):
-        """Picklable bootstrap worker"""
-        # Get data
-        n_star_win, Ntw_win, bin_points, umbrella_win, beta = self.get_test_data()
-        np.random.seed((16091 + 17 * boot_worker_idx) % 824633720831)
-        Ntw_win_boot = timeseries.bootstrap_window_samples(Ntw_win)
-        logger.info("Worker {}: N* = {}".format(boot_worker_idx, [len(win) for win in Ntw_win_boot]))
-
-        phi_vals = np.linspace(self.PHI_BIN_MIN, self.PHI_BIN_MAX, self.PHI_BINS)
-
-        # Perform WHAM calculation
-        calc = WHAM.binless.Calc1D()
-        betaF_bin, betaF_bin_counts, status = calc.compute_betaF_profile(Ntw_win_boot, bin_points, umbrella_win, beta,
-                                                                         bin_style='center', solver='log-likelihood')  # solver kwargs
-
-        betaF_bin = betaF_bin - np.min(betaF_bin)  # reposition zero so that unbiased free energy is zero
-
-        # Perform phi-ensemble reweighting
-        N_avg_vals, N_var_vals = WHAM.statistics.binless_reweight_phi_ensemble(calc, phi_vals, beta)
-
-        dx = phi_vals[1] - phi_vals[0]
-        dydx = np.gradient(N_avg_vals, dx)
-        susc = -1 / beta * dydx
-
-        # Calculate delta_G_fold (TODO)
-
-        # Return
-        return {"betaF": betaF_bin,
-                "Navg": N_avg_vals,
-                "Nvar": N_var_vals,
-                "Nsusc": susc}
-
     def run_bootstrap_ll_phi_ensemble(self):
         """
         Runs 1D binless log likelihood calculation and phi-ensemble reweighting.
 
+        If 1d_bootstrap.BOOT_TOL is set, replicas are run in batches of BOOT_BATCH until the relative
+        change in the error bars of betaF, <N~>, Var(N~) and phi_1* and phi_2* between batches falls below
+        BOOT_TOL, with NBOOT replicas as budget. Otherwise, NBOOT replicas are run. The number of
+        replicas used is written to the output files.
+
         Loads the following params from the config file:
             betaFboot_datfile:
             betaFboot_imgfile:
@@ -1132,32 +1287,45 @@ class WHAM_analysis_biasN:
         # Load params
         params = self.config["func_params"]["run_bootstrap_ll_phi_ensemble"]
 
-        with Pool(processes=self.NWORKERS) as pool:
-            ret_dicts = pool.map(self.boot_worker, range(self.NBOOT))
+        n_star_win, Ntw_win, bin_points, umbrella_win, beta = self.get_test_data()
+
+        phi_vals = np.linspace(self.PHI_BIN_MIN, self.PHI_BIN_MAX, self.PHI_BINS)
+
+        # Window data is loaded once into shared memory, and workers only receive replica indices
+        outputs = {"betaF": (len(bin_points),),
+                   "Navg": (len(phi_vals),),
+                   "Nvar": (len(phi_vals),),
+                   "Nsusc": (len(phi_vals),)}
+        with SharedBootstrap(Ntw_win, boot_replica, outputs,
+                             args=(n_star_win, float(self.KAPPA), bin_points, phi_vals, beta),
+                             nworkers=self.NWORKERS) as boot:
+            if self.BOOT_TOL is None:
+                boot_results = boot.run(0, self.NBOOT, chunksize=self.BOOT_CHUNKSIZE)
+            else:
+                def phi_stars(results):
+                    phi_1_stars, phi_2_stars, _ = boot_phi_stars(results["Nvar"], phi_vals, self.PEAK_CUT)
+                    return {"phi_stars": np.column_stack((phi_1_stars, phi_2_stars))}
+
+                boot_results = boot.run_adaptive(self.BOOT_BATCH, float(self.BOOT_TOL), self.NBOOT,
+                                                 derived=phi_stars, chunksize=self.BOOT_CHUNKSIZE)
+
+        nboot = len(boot_results["betaF"])
+        logger.info("Used {} bootstrap replicas.".format(nboot))
 
         # Unpack returned values, calculate error bars, etc
-        betaF_all = []
-        N_avg_all = []
-        N_var_all = []
-        for boot_idx in range(self.NBOOT):
-            betaF_all.append(ret_dicts[boot_idx]["betaF"])
-            N_avg_all.append(ret_dicts[boot_idx]["Navg"])
-            N_var_all.append(ret_dicts[boot_idx]["Nvar"])
-
-        betaF_all = np.array(betaF_all)
+        betaF_all = boot_results["betaF"]
         logger.debug(betaF_all.shape)
-        N_avg_all = np.array(N_avg_all)
+        N_avg_all = boot_results["Navg"]
         logger.debug(N_avg_all.shape)
-        N_var_all = np.array(N_var_all)
+        N_var_all = boot_results["Nvar"]
         logger.debug(N_var_all.shape)
 
         betaF = betaF_all.mean(axis=0)
         betaF_err = betaF_all.std(axis=0)
 
-        n_star_win, Ntw_win, bin_points, umbrella_win, beta = self.get_test_data()
-
         # Write to text file
         of = open(self.calcoutdir + "/" + params["betaFboot_datfile"], "w")
+        of.write("# {} bootstrap replicas\n".format(nboot))
         of.write("# Nt    betaF    sem(betaF)\n")
         for i in range(len(bin_points)):
             of.write("{:.5f} {:.5f} {:.5f}\n".format(bin_points[i], betaF[i], betaF_err[i]))
@@ -1180,49 +1348,30 @@ class WHAM_analysis_biasN:
         N_var = N_var_all.mean(axis=0)
         N_var_err = N_var_all.std(axis=0)
 
-        phi_vals = np.linspace(self.PHI_BIN_MIN, self.PHI_BIN_MAX, self.PHI_BINS)
-
         # Write to text file
         of = open(self.calcoutdir + "/" + params["phi_ens_boot_datfile"], "w")
+        of.write("# {} bootstrap replicas\n".format(nboot))
         of.write("# phi    <N>    sem(N)   <dN^2>    sem(dN^2)\n")
         for i in range(len(phi_vals)):
             of.write("{:.5f} {:.5f} {:.5f} {:.5f} {:.5f}\n".format(phi_vals[i], N_avg[i], N_avg_err[i],
                                                                    N_var[i], N_var_err[i]))
         of.close()
 
-        phi_1_stars = np.zeros(self.NBOOT)
-        phi_2_stars = np.zeros(self.NBOOT)
-
         # START
-        all_peaks = []
-
         # Calculate phi_1_star and error bars on phi_1_star from bootstrapping
-        for nb in range(self.NBOOT):
-            # Find peak indices
-            peaks, _ = find_peaks(N_var_all[nb, :], height=self.PEAK_CUT)
-
-            # Sort peak heights
-            peak_heights = N_var_all[nb, peaks]
-
-            # Sort peaks by peak heights: largest two peaks are phi_1* and phi_2*
-            sort_order = np.argsort(peak_heights)[::-1]
-            peaks = peaks[sort_order]
-
-            all_peaks.append(phi_vals[peaks])
-
-            # Smaller index is phi_1*, larger index is phi_2*
-            phi_1_stars[nb] = phi_vals[min(peaks[0], peaks[1])]
-            phi_2_stars[nb] = phi_vals[max(peaks[0], peaks[1])]
+        phi_1_stars, phi_2_stars, all_peaks = boot_phi_stars(N_var_all, phi_vals, self.PEAK_CUT)
 
         of = open(self.calcoutdir + "/" + params["phi_ens_peaks_boot_datfile"], "w")
 
+        of.write("Bootstrap replicas: {}\n\n".format(nboot))
+
         of.write("Peak phi values:\n")
         for phi_peaks in all_peaks:
             of.write(" ".join(["{:.5f}".format(peak) for peak in beta * phi_peaks]) + "\n")
         of.write("\n")
 
         of.write("beta phi_1* and beta phi_2* values:\n")
-        for nb in range(self.NBOOT):
+        for nb in range(nboot):
             of.write("{:.5f} {:.5f}\n".format(beta * phi_1_stars[nb], beta * phi_2_stars[nb]))
         of.write("\n")
 
@@ -1302,34 +1451,28 @@ class WHAM_analysis_biasN:
         # Load params
         params = self.config["func_params"]["run_2D_binless_log_likelihood"]
 
-        savedloc = self.calcoutdir + "/" + params["in_calcfile"]
-
         n_star_win, Ntw_win, sec_OP_win, x_bin_points, y_bin_points, umbrella_win, beta = self.get_test_data2()
 
         assert(len(Ntw_win[0]) == len(sec_OP_win[0]))
         assert(len(Ntw_win[1]) == len(sec_OP_win[1]))
 
         # Unroll Ntw_win into a single array
-        x_l = Ntw_win[0]
-        for i in range(1, len(Ntw_win)):
-            x_l = np.hstack((x_l, Ntw_win[i]))
+        x_l = np.concatenate(Ntw_win)
 
         # Unroll sec_OP_win into a single array
-        y_l = sec_OP_win[0]
-        for i in range(1, len(sec_OP_win)):
-            y_l = np.hstack((y_l, sec_OP_win[i]))
+        y_l = np.concatenate(sec_OP_win)
 
         N_i = np.array([len(arr) for arr in Ntw_win])
 
         if params["saved"]:
-            calc = pickle.load(open(savedloc, "rb"))
+            calc = self.load_calc(params["in_calcfile"])
         else:
             # Perform WHAM calculations
             calc = WHAM.binless.Calc1D()
             status = calc.compute_point_weights(x_l, N_i, umbrella_win, beta,
                                                 solver='log-likelihood',
                                                 logevery=1)
-            pickle.dump(calc, open(self.calcoutdir + "/" + params["calcfile"], "wb"))
+            self.save_calc(calc, params["calcfile"], N_i, n_star_win, beta)
 
             # Optimized?
             logger.debug(status)
@@ -1427,25 +1570,16 @@ class WHAM_analysis_biasN:
         # Load params
         params = self.config["func_params"]["run_2D_bin_sec_OP"]
 
-        savedloc = self.calcoutdir + "/" + params["in_calcfile"]
-
         n_star_win, Ntw_win, sec_OP_win, x_bin_points, y_bin_points, umbrella_win, beta = self.get_test_data2()
 
         assert(len(Ntw_win[0]) == len(sec_OP_win[0]))
         assert(len(Ntw_win[1]) == len(sec_OP_win[1]))
 
-        # Unroll Ntw_win into a single array
-        x_l = Ntw_win[0]
-        for i in range(1, len(Ntw_win)):
-            x_l = np.hstack((x_l, Ntw_win[i]))
-
         # Unroll sec_OP_win into a single array
-        y_l = sec_OP_win[0]
-        for i in range(1, len(sec_OP_win)):
-            y_l = np.hstack((y_l, sec_OP_win[i]))
+        y_l = np.concatenate(sec_OP_win)
 
         if params["saved"]:
-            calc = pickle.load(open(savedloc, "rb"))
+            calc = self.load_calc(params["in_calcfile"])
         else:
             raise RuntimeError("Run WHAM calc first.")
 
@@ -1521,44 +1655,33 @@ class WHAM_analysis_biasN:
         # Load params
         params = self.config["func_params"]["run_2D_reweight_phi_star"]
 
-        # Loop over params
-        for phi_star_key in ["PHI_STAR2", "PHI_STAR_EQ2", "PHI_STAR_COEX2"]:
-
-            savedloc = self.calcoutdir + "/" + params["in_calcfile"]
-
-            n_star_win, Ntw_win, sec_OP_win, x_bin_points, y_bin_points, umbrella_win, beta = self.get_test_data2()
+        n_star_win, Ntw_win, sec_OP_win, x_bin_points, y_bin_points, umbrella_win, beta = self.get_test_data2()
 
-            assert(len(Ntw_win[0]) == len(sec_OP_win[0]))
-            assert(len(Ntw_win[1]) == len(sec_OP_win[1]))
+        assert(len(Ntw_win[0]) == len(sec_OP_win[0]))
+        assert(len(Ntw_win[1]) == len(sec_OP_win[1]))
 
-            # Unroll Ntw_win into a single array
-            x_l = Ntw_win[0]
-            for i in range(1, len(Ntw_win)):
-                x_l = np.hstack((x_l, Ntw_win[i]))
+        # sec_OP samples, in the order of the N~ samples of the calculation
+        y_l = np.concatenate(sec_OP_win)
 
-            # Unroll sec_OP_win into a single array
-            y_l = sec_OP_win[0]
-            for i in range(1, len(sec_OP_win)):
-                y_l = np.hstack((y_l, sec_OP_win[i]))
+        if params["saved"]:
+            calc = self.load_calc(params["in_calcfile"])
+        else:
+            raise RuntimeError("Run WHAM calc first.")
 
-            if params["saved"]:
-                calc = pickle.load(open(savedloc, "rb"))
-            else:
-                raise RuntimeError("Run WHAM calc first.")
+        # Useful for debugging:
+        logger.debug("Window free energies: ", calc.g_i)
 
-            g_i = calc.g_i
+        # Bin samples once, for reweighting to all phi* ensembles
+        ens_2D = PhiEnsemble2D(calc.x_l, y_l, calc.G_l, x_bin_points, y_bin_points, beta)
 
-            # Useful for debugging:
-            logger.debug("Window free energies: ", g_i)
+        # Loop over params
+        for phi_star_key in ["PHI_STAR2", "PHI_STAR_EQ2", "PHI_STAR_COEX2"]:
 
             phi_star = getattr(self, phi_star_key)
 
             logger.debug("phi* = {}".format(phi_star))
 
-            G_l_rew = calc.reweight(beta, u_bias=potentials.linear(phi_star))
-
-            betaF_2D_rew, (betaF_2D_rew_bin_counts, _1, _2) = calc.bin_2D_betaF_profile(y_l, x_bin_points, y_bin_points,
-                                                                                        G_l=G_l_rew, x_bin_style='center', y_bin_style='center')
+            betaF_2D_rew = ens_2D.betaF(phi_star)
             betaF_2D_rew = betaF_2D_rew - np.min(betaF_2D_rew)
 
             # Plot
@@ -1674,44 +1797,33 @@ class WHAM_analysis_biasN:
         # Load params
         params = self.config["func_params"]["run_2D_reweight_phi_star_bin_sec_OP"]
 
-        # Loop over params
-        for phi_star_key in ["PHI_STAR2", "PHI_STAR_EQ2", "PHI_STAR_COEX2"]:
-
-            savedloc = self.calcoutdir + "/" + params["in_calcfile"]
-
-            n_star_win, Ntw_win, sec_OP_win, x_bin_points, y_bin_points, umbrella_win, beta = self.get_test_data2()
+        n_star_win, Ntw_win, sec_OP_win, x_bin_points, y_bin_points, umbrella_win, beta = self.get_test_data2()
 
-            assert(len(Ntw_win[0]) == len(sec_OP_win[0]))
-            assert(len(Ntw_win[1]) == len(sec_OP_win[1]))
+        assert(len(Ntw_win[0]) == len(sec_OP_win[0]))
+        assert(len(Ntw_win[1]) == len(sec_OP_win[1]))
 
-            # Unroll Ntw_win into a single array
-            x_l = Ntw_win[0]
-            for i in range(1, len(Ntw_win)):
-                x_l = np.hstack((x_l, Ntw_win[i]))
+        # sec_OP samples, in the order of the N~ samples of the calculation
+        y_l = np.concatenate(sec_OP_win)
 
-            # Unroll sec_OP_win into a single array
-            y_l = sec_OP_win[0]
-            for i in range(1, len(sec_OP_win)):
-                y_l = np.hstack((y_l, sec_OP_win[i]))
+        if params["saved"]:
+            calc = self.load_calc(params["in_calcfile"])
+        else:
+            raise RuntimeError("Run WHAM calc first.")
 
-            if params["saved"]:
-                calc = pickle.load(open(savedloc, "rb"))
-            else:
-                raise RuntimeError("Run WHAM calc first.")
+        # Useful for debugging:
+        logger.debug("Window free energies: ", calc.g_i)
 
-            g_i = calc.g_i
+        # Bin samples once, for reweighting to all phi* ensembles
+        ens_2D = PhiEnsemble2D(calc.x_l, y_l, calc.G_l, x_bin_points, y_bin_points, beta)
 
-            # Useful for debugging:
-            logger.debug("Window free energies: ", g_i)
+        # Loop over params
+        for phi_star_key in ["PHI_STAR2", "PHI_STAR_EQ2", "PHI_STAR_COEX2"]:
 
             phi_star = getattr(self, phi_star_key)
 
             logger.debug("phi* = {}".format(phi_star))
 
-            G_l_rew = calc.reweight(beta, u_bias=potentials.linear(phi_star))
-
-            betaF_sec_OP_rew = calc.bin_second_betaF_profile(y_l, x_bin_points, y_bin_points,
-                                                         G_l=G_l_rew, x_bin_style='center', y_bin_style='center')
+            betaF_sec_OP_rew = ens_2D.betaF_second(phi_star)
             betaF_sec_OP_rew = betaF_sec_OP_rew - np.min(betaF_sec_OP_rew)
 
             # Plot
@@ -1987,7 +2099,33 @@ class WHAM_analysis_biasN:
     # computation call
     ############################################################################
 
-    def __call__(self, calc_types, calc_args={}):
+    def __call__(self, calc_types, calc_args={}, incremental=False, force=False, nworkers=1):
+        """
+        Runs analysis stages.
+
+        Args:
+            calc_types: List of names of stages in `func_registry` to run, or ["all"].
+            calc_args: Unused.
+            incremental: If true, also run stale dependencies of stages, and skip stages whose inputs
+                (config entries, input files and dependencies) are unchanged since they were last run.
+                Stage input hashes are recorded in `calcoutdir`/stages.json (default = False).
+            force: If true, re-run all stages in incremental mode (default = False).
+            nworkers: Number of independent stages to run concurrently in incremental mode, in separate
+                processes. Config updates of stages are applied by this process (default = 1).
+        """
+        if incremental:
+            if "all" in calc_types:
+                calc_types = list(self.func_registry.keys())
+
+            def current_config():
+                self.load_config()
+                return self.config
+
+            current_config()
+            self.stage_graph.run(calc_types, current_config, self.calcoutdir + "/stages.json", force=force,
+                                 nworkers=nworkers, execute=self.run_stage_deferred, apply_updates=self.apply_config_updates)
+            return
+
         for calc_type in calc_types:
             if calc_type == "all":
                 for key in self.func_registry.keys():
@@ -2007,6 +2145,11 @@ def main():
     allowed_types = list(WHAM_analysis_biasN().register().keys())
     parser.add_argument('type', nargs='+',
                         help='Types of analysis ({}) separated by space OR all'.format(",".join(allowed_types)))
+    parser.add_argument('--incremental', action='store_true',
+                        help='Run stale dependencies of analysis types, and skip analyses whose inputs are unchanged since the last run')
+    parser.add_argument('--force', action='store_true', help='Re-run all analyses in incremental mode')
+    parser.add_argument('--nworkers', type=int, default=1,
+                        help='Number of independent analyses to run concurrently in incremental mode, default=1')
     parser.add_argument('--loglevel', help='Log level (DEBUG, INFO, WARNING, ERROR, CRITICAL), default=INFO', default='INFO')
     args = parser.parse_args()
     anl = WHAM_analysis_biasN(args.config_file)
@@ -2016,7 +2159,7 @@ def main():
         raise ValueError('Invalid log level: %s' % args.loglevel)
     logging.basicConfig(level=numeric_level)
 
-    anl(args.type)
+    anl(args.type, incremental=args.incremental, force=args.force, nworkers=args.nworkers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""
+Compact storage of the solved state of binless WHAM calculations, as raw arrays which can be
+memory-mapped, so that analysis stages do not need to unpickle whole calculation objects.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+class CalcState:
+    """
+    Solved state of a binless WHAM calculation: the samples x_l, their log weights G_l in the
+    unbiased ensemble, the window free energies g_i and the number of samples in each window N_i,
+    along with the specification of the umbrella potentials and beta.
+
+    The state is stored in a directory containing one .npy file per array and a small JSON file
+    containing beta and the umbrella specification. Arrays are memory-mapped on loading, and the
+    state can be restored onto a new calculation object (e.g. WHAM.binless.Calc1D) for reweighting,
+    independent of the pickled layout of the calculation class.
+
+    Args:
+        x_l (np.array): Samples from all windows (concatenated).
+        G_l (np.array): Log weights of samples.
+        g_i (np.array): Free energies of windows.
+        N_i (np.array): Number of samples in each window.
+        beta (float): 1/kbT, in units of mol/kJ.
+        umbrellas (dict): JSON-serializable specification of umbrella potentials (default = None).
+    """
+    arrays = ["x_l", "G_l", "g_i", "N_i"]
+
+    def __init__(self, x_l, G_l, g_i, N_i, beta, umbrellas=None):
+        self.x_l = x_l
+        self.G_l = G_l
+        self.g_i = g_i
+        self.N_i = N_i
+        self.beta = beta
+        self.umbrellas = {} if umbrellas is None else umbrellas
+
+    @classmethod
+    def from_calc(cls, calc, N_i, beta, umbrellas=None):
+        """
+        Extracts solved state from a binless WHAM calculation object.
+
+        Args:
+            calc: Calculation object with solved x_l, G_l and g_i attributes.
+            N_i (np.array): Number of samples in each window.
+            beta (float): 1/kbT, in units of mol/kJ.
+            umbrellas (dict): JSON-serializable specification of umbrella potentials (default = None).
+
+        Returns:
+            CalcState object.
+        """
+        return cls(np.asarray(calc.x_l), np.asarray(calc.G_l), np.asarray(calc.g_i), np.asarray(N_i), beta, umbrellas)
+
+    def restore(self, calc):
+        """
+        Sets solved state of a new binless WHAM calculation object, for reweighting and binning.
+
+        Args:
+            calc: Calculation object (e.g. WHAM.binless.Calc1D()).
+
+        Returns:
+            calc, with x_l, G_l and g_i attributes set.
+        """
+        calc.x_l = self.x_l
+        calc.G_l = self.G_l
+        calc.g_i = self.g_i
+        return calc
+
+    def save(self, path):
+        """
+        Writes state to directory `path`, replacing any existing state.
+
+        Args:
+            path (str): Path of directory to write state to.
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        tmpdir = tempfile.mkdtemp(dir=parent)
+        for name in self.arrays:
+            np.save(os.path.join(tmpdir, name + ".npy"), getattr(self, name))
+        with open(os.path.join(tmpdir, "state.json"), "w") as f:
+            json.dump({"beta": float(self.beta), "umbrellas": self.umbrellas}, f, default=str)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpdir, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Loads state from directory `path`.
+
+        Args:
+            path (str): Path of directory containing state.
+            mmap_mode (str): Memory-map mode of arrays (default = 'r', None to read arrays into memory).
+
+        Returns:
+            CalcState object.
+
+        Raises:
+            ValueError if `path` does not contain a saved state.
+        """
+        if not os.path.isfile(os.path.join(path, "state.json")):
+            raise ValueError("{} does not contain a saved WHAM calculation state.".format(path))
+        with open(os.path.join(path, "state.json")) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode) for name in cls.arrays}
+        return cls(beta=meta["beta"], umbrellas=meta["umbrellas"], **arrays)
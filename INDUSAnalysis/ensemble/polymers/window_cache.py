@@ -0,0 +1,110 @@
+"""
+Binary cache of parsed umbrella window data, so that WHAM analysis stages and bootstrap
+workers can memory-map window timeseries instead of re-parsing text files.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import warnings
+
+import numpy as np
+
+
+class WindowCache:
+    """
+    Cache of per-window sample arrays (e.g. N~ or Rg values, after slicing), stored as a
+    flat .npy file containing the samples of all windows and a .npy file containing window offsets.
+    Cached arrays are returned as views into the memory-mapped data file, so loading a cache entry
+    does not read the data until it is used.
+
+    Cache entries are keyed by the source files (path, size and modification time) and by the
+    parameters used to slice the data (e.g. TSTART, TEND, XTCDT/UMBDT, BASE_SAMP_FREQ), so editing a
+    data file or a slicing parameter creates a new entry. Entries are written to a temporary directory
+    which is renamed into place, so that concurrent processes can share the cache.
+
+    Args:
+        cachedir (str): Directory to store cache entries in.
+
+    Examples:
+        >>> cache = WindowCache("calc/cache")
+        >>> Ntw_win = cache.get("Ntw", files, params, lambda: [read(f) for f in files])
+    """
+    def __init__(self, cachedir):
+        self.cachedir = cachedir
+
+    def key(self, name, files, params):
+        """
+        Returns:
+            Hash key of cache entry for source files and slicing parameters.
+        """
+        entries = [name]
+        entries.extend("{}:{}:{}".format(os.path.abspath(f), os.path.getsize(f), os.path.getmtime(f)) for f in files)
+        entries.append(json.dumps(params, sort_keys=True, default=str))
+        return hashlib.sha1("|".join(entries).encode()).hexdigest()[:16]
+
+    def entrydir(self, name, key):
+        """Returns path of directory containing cache entry."""
+        return os.path.join(self.cachedir, "{}_{}".format(name, key))
+
+    def load(self, name, key):
+        """
+        Loads cache entry.
+
+        Returns:
+            List of memory-mapped arrays, one per window, or None if the entry does not exist.
+        """
+        entrydir = self.entrydir(name, key)
+        if not os.path.exists(os.path.join(entrydir, "data.npy")):
+            return None
+        offsets = np.load(os.path.join(entrydir, "offsets.npy"))
+        data = np.load(os.path.join(entrydir, "data.npy"), mmap_mode='r')
+        return [data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+    def store(self, name, key, arrays):
+        """
+        Writes cache entry. Failures to write are reported as warnings, as the cache is optional.
+
+        Args:
+            name (str): Name of data (e.g. "Ntw").
+            key (str): Hash key of cache entry.
+            arrays (list): List of 1-D arrays, one per window.
+        """
+        entrydir = self.entrydir(name, key)
+        offsets = np.concatenate(([0], np.cumsum([len(arr) for arr in arrays]))).astype(np.int64)
+        try:
+            os.makedirs(self.cachedir, exist_ok=True)
+            tmpdir = tempfile.mkdtemp(dir=self.cachedir)
+            np.save(os.path.join(tmpdir, "offsets.npy"), offsets)
+            np.save(os.path.join(tmpdir, "data.npy"), np.concatenate(arrays))
+            try:
+                os.rename(tmpdir, entrydir)
+            except OSError:
+                # Entry written by another process in the meantime
+                shutil.rmtree(tmpdir, ignore_errors=True)
+        except OSError as e:
+            warnings.warn("Could not write window cache entry {}: {}".format(entrydir, e))
+
+    def get(self, name, files, params, reader):
+        """
+        Returns cached window data, reading and caching it if no valid cache entry exists.
+
+        Args:
+            name (str): Name of data (e.g. "Ntw").
+            files (list): List of source files the data is read from.
+            params: JSON-serializable parameters used to slice the data.
+            reader (callable): Function with no arguments returning list of 1-D arrays, one per window.
+
+        Returns:
+            List of arrays, one per window.
+        """
+        key = self.key(name, files, params)
+        arrays = self.load(name, key)
+        if arrays is None:
+            arrays = reader()
+            self.store(name, key, arrays)
+            cached = self.load(name, key)
+            if cached is not None:
+                arrays = cached
+        return arrays
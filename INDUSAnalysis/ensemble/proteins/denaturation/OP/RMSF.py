@@ -19,6 +19,26 @@ from INDUSAnalysis.timeseries import TimeSeriesAnalysis
 matplotlib.use('Agg')
 
 
+def load_RMSF_run(tsa, filename, start_time):
+    """
+    Calculates per-atom RMSF (root mean square deviation from reference) of a single run.
+
+    Args:
+        tsa (TimeSeriesAnalysis): TimeSeriesAnalysis object to load deviations with.
+        filename (str): Path to deviations .pkl file, or to streamed RMSF .npy file written by
+            OrderParamsAnalysis --rmsf (in which case the averaging window is set by -obsstart/-obsend
+            of that calculation and start_time is ignored).
+        start_time (int): Time (ps) to start computing averages at.
+
+    Returns:
+        Array containing RMSF of each atom.
+    """
+    if filename.endswith(".npy"):
+        return np.load(filename)[2, :]
+    dev_unfold = tsa.load_TimeSeries(filename)
+    return np.sqrt(np.mean(dev_unfold[start_time:].data_array ** 2, axis=0))
+
+
 def RMSF(nprot: int,
          structfs: list,
          names: list,
@@ -143,8 +163,7 @@ def RMSF(nprot: int,
         for phi_idx, phi in enumerate(phivals):
             RMSF_phi = []
             for run_idx, run in enumerate(runs):
-                dev_unfold = tsa.load_TimeSeries(calc_dir + di_format.format(phi=phi, run=run))
-                RMSF_run = np.sqrt(np.mean(dev_unfold[start_time:].data_array ** 2, axis=0))
+                RMSF_run = load_RMSF_run(tsa, calc_dir + di_format.format(phi=phi, run=run), start_time)
                 RMSF_phi.append(RMSF_run)
             RMSF.append(RMSF_phi)
 
@@ -278,8 +297,7 @@ def RMSF(nprot: int,
             for phi_idx, phi in enumerate(phivals):
                 RMSF_phi = []
                 for run_idx, run in enumerate(runs):
-                    dev_unfold = tsa.load_TimeSeries(calc_dir + di_format.format(phi=phi, run=run))
-                    RMSF_run = np.sqrt(np.mean(dev_unfold[start_time:].data_array ** 2, axis=0))
+                    RMSF_run = load_RMSF_run(tsa, calc_dir + di_format.format(phi=phi, run=run), start_time)
                     RMSF_phi.append(RMSF_run)
                 RMSF.append(RMSF_phi)
 
@@ -394,7 +412,7 @@ if __name__ == "__main__":
     parser.add_argument("-runs", type=int, nargs='+', help="runs to read")
     parser.add_argument("-start", type=int, help="time (ps) to start computing averages")
     parser.add_argument("-calc_dirs", type=str, nargs='+', help="directory containing hydration OPs extracted by INDUSAnalysis, one for each protein (space separated)")
-    parser.add_argument("-di_formats", type=str, nargs='+', help="format of .pkl file containing residue deviations, with {phi} placeholders for phi value and {run} placeholders for run value, one for each protein (space separated)")
+    parser.add_argument("-di_formats", type=str, nargs='+', help="format of .pkl file containing residue deviations (or of .npy file containing streamed RMSF), with {phi} placeholders for phi value and {run} placeholders for run value, one for each protein (space separated)")
     parser.add_argument("-imgformat", help="output image format, with {phi} placeholders for phi value")
     parser.add_argument("--plot_native", action='store_true', help="plot band indicating average RMSF in native state")
     parser.add_argument("--set_max", action='store_true', help="set a fixed maximum value on the y-axis, determined by the max RMSF across the simulation")
@@ -0,0 +1,321 @@
+"""
+Calculates sparse mean contact maps across phi-ensemble, their differences relative
+to phi=0, and the phi value at which each contact breaks.
+
+Contacts are defined as in INDUSAnalysis.contacts: atoms i and j form a contact if they
+are separated by more than connthreshold bonds and r(i,j) < distcutoff. Only pairs within the
+distance cutoff are found at each frame (using a neighbor search) and accumulated in sparse
+form, so dense (natoms x natoms) matrices are never constructed.
+"""
+import argparse
+from multiprocessing import Pool
+
+import matplotlib.pyplot as plt
+from matplotlib.ticker import AutoMinorLocator
+import MDAnalysis as mda
+import numpy as np
+from scipy import sparse
+
+selection_parser = {
+    'alk-ua': "resname {alk_resname}",
+    'atomic-h': "protein and not name H*",
+    'atomic-sh': "protein and not name H*"
+}
+
+not_side_heavy_sel = "protein and (name N or name CA or name C or name O or name OC1 or name OC2 or name H*)"
+
+
+def excluded_pair_keys(sel, connthreshold):
+    """
+    Determines pairs of atoms separated by connthreshold or fewer bonds by taking
+    powers of the sparse bond adjacency matrix.
+
+    Args:
+        sel (mda.AtomGroup): Atoms to calculate contacts between, with bond information.
+        connthreshold (int): Connectivity threshold.
+
+    Returns:
+        keys (np.array): Sorted keys i * nsel + j (i < j) of excluded pairs, where i and j
+            are indices in sel.
+
+    Raises:
+        ValueError if connectivity threshold is invalid.
+    """
+    if connthreshold < 0:
+        raise ValueError("Connectivity threshold must be an integer value 0 or greater.")
+
+    nsel = len(sel)
+    bonds = sel.bonds.indices
+    bonds = bonds[np.all(np.isin(bonds, sel.indices), axis=1)]
+    bi = np.searchsorted(sel.indices, bonds[:, 0])
+    bj = np.searchsorted(sel.indices, bonds[:, 1])
+
+    adj = sparse.csr_matrix((np.ones(len(bi), dtype=bool), (bi, bj)), shape=(nsel, nsel))
+    adj = (adj + adj.T).astype(bool)
+
+    # Pairs reachable in connthreshold or fewer bonds
+    frontier = sparse.identity(nsel, dtype=bool, format='csr')
+    reach = frontier.copy()
+    for nbonds in range(connthreshold):
+        frontier = (frontier @ adj).astype(bool)
+        reach = (reach + frontier).astype(bool)
+
+    ri, rj = sparse.triu(reach, k=1).nonzero()
+    return np.sort(ri.astype(np.int64) * nsel + rj)
+
+
+def frame_contact_keys(positions, distcutoff, excluded_keys, allowed=None):
+    """
+    Finds contacts formed at a single frame.
+
+    Args:
+        positions (np.array): Array of shape (nsel, 3) containing atom positions.
+        distcutoff (float): Distance cutoff (in A).
+        excluded_keys (np.array): Sorted keys of excluded pairs.
+        allowed (np.array): Boolean array of shape (nsel,), if not None, only pairs of atoms
+            which are both allowed form contacts.
+
+    Returns:
+        keys (np.array): Keys i * nsel + j (i < j) of contacts formed.
+    """
+    nsel = len(positions)
+    pairs, distances = mda.lib.distances.capped_distance(positions, positions, max_cutoff=distcutoff)
+    pi = pairs[:, 0].astype(np.int64)
+    pj = pairs[:, 1].astype(np.int64)
+    keep = (pi < pj) & (distances < distcutoff)
+    if allowed is not None:
+        keep &= allowed[pi] & allowed[pj]
+    keys = pi[keep] * nsel + pj[keep]
+    return keys[~np.isin(keys, excluded_keys, assume_unique=True)]
+
+
+class SparseContactsAccumulator:
+    """
+    Accumulates number of frames each pair of atoms is in contact in sparse form.
+
+    Keys of contacts formed at each frame are buffered and periodically merged
+    into sorted unique keys and counts.
+
+    Args:
+        nsel (int): Number of atoms contacts are computed between.
+        buffersize (int): Number of buffered keys to merge at (default = 1000000).
+    """
+    def __init__(self, nsel, buffersize=1000000):
+        self.nsel = nsel
+        self.buffersize = buffersize
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.nframes = 0
+        self._buffer = []
+        self._buffered = 0
+
+    def update(self, keys):
+        """Adds keys of contacts formed at a single frame to accumulator."""
+        self._buffer.append(keys)
+        self._buffered += len(keys)
+        self.nframes += 1
+        if self._buffered >= self.buffersize:
+            self.merge()
+
+    def merge(self):
+        """Merges buffered keys into sorted unique keys and counts."""
+        if len(self._buffer) == 0:
+            return
+        keys = np.concatenate([self.keys] + self._buffer)
+        weights = np.concatenate([self.counts, np.ones(self._buffered, dtype=np.int64)])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=weights).astype(np.int64)
+        self._buffer = []
+        self._buffered = 0
+
+
+def contact_break_phi(phivals, mean_contacts, breakfrac):
+    """
+    Determines the phi value at which each contact formed at phi=0 breaks.
+
+    Args:
+        phivals (np.array): Array of phi values, phi=0 first.
+        mean_contacts (np.array): Array of shape (nphi, npairs) containing the fraction of frames
+            each pair is in contact at each phi value.
+        breakfrac (float): Fraction of frames below which a contact is considered broken.
+
+    Returns:
+        {
+            formed (np.array): Boolean array of shape (npairs,), True for pairs formed for at least
+                breakfrac of frames at phi=0.
+            break_phi (np.array): First phi value (in the order given) at which the fraction of frames
+                each formed pair is in contact drops below breakfrac (nan if the contact never breaks).
+        }
+    """
+    formed = mean_contacts[0] >= breakfrac
+    broken = mean_contacts[:, formed] < breakfrac
+    break_idx = np.argmax(broken, axis=0)
+    break_phi = np.where(np.any(broken, axis=0), phivals[break_idx], np.nan)
+    return formed, break_phi
+
+
+def run_contacts(structf, trajf, selstr, excluded_keys, allowed, distcutoff, start_time, skip):
+    """
+    Streams a single trajectory through a sparse contacts accumulator.
+
+    Returns:
+        {
+            keys (np.array): Sorted keys of pairs in contact at any frame.
+            counts (np.array): Number of frames each pair is in contact.
+            nframes (int): Number of frames read.
+        }
+    """
+    u = mda.Universe(structf, trajf)
+    sel = u.select_atoms(selstr)
+    acc = SparseContactsAccumulator(len(sel))
+
+    for ts in u.trajectory[::skip]:
+        if ts.time >= start_time:
+            acc.update(frame_contact_keys(sel.positions, distcutoff, excluded_keys, allowed))
+
+    acc.merge()
+    return acc.keys, acc.counts, acc.nframes
+
+
+def _run_contacts_worker(args):
+    return run_contacts(*args)
+
+
+def phi_ensemble(phivals: list,
+                 runs: list,
+                 start_time: int,
+                 structf_format: str,
+                 trajf_format: str,
+                 apsp_structf: str,
+                 method: str = "atomic-h",
+                 distcutoff: float = 6.0,
+                 connthreshold: int = 0,
+                 skip: int = 1,
+                 alk_resname: str = "ALK",
+                 breakfrac: float = 0.5,
+                 nworkers: int = 1,
+                 opref: str = "contacts",
+                 imgfile: str = "contacts_break_phi.png"):
+    """
+    Calculates sparse mean contact maps for each phi value (averaged over runs), their difference
+    relative to phi=0, and the phi value at which each contact formed at phi=0 breaks.
+
+    (phi, run) trajectories are processed in parallel. Outputs are saved as:
+        - `{opref}_phi_{phi}_mean.npz`: Sparse (nsel x nsel, upper triangular) mean contact map.
+        - `{opref}_phi_{phi}_diff.npz`: Sparse difference of mean contact map from phi=0.
+        - `{opref}_break_phi.npy`: Array of shape (3, npairs) containing i, j and the first phi value
+          (in the order given) at which the fraction of frames contact [i, j] is formed
+          drops below breakfrac, for pairs formed for at least breakfrac of frames at phi=0
+          (nan if the contact never breaks).
+        - `{opref}_sel_indices.npy`: Universe atom indices of selection atoms i, j.
+
+    Args:
+        phivals: List of phi values (as strings), phi=0 first.
+        runs: List of runs.
+        start_time: Time (ps) to start averaging at.
+        structf_format: Format of structure file, with {phi} and {run} placeholders.
+        trajf_format: Format of trajectory file, with {phi} and {run} placeholders.
+        apsp_structf: Structure file (.tpr) containing bond information.
+        method: Contacts calculation method (alk-ua, atomic-h, atomic-sh).
+        distcutoff: Distance cutoff for contacts, in A.
+        connthreshold: Connectivity threshold for contacts.
+        skip: Number of frames to skip between analyses.
+        alk_resname: Residue name of alkane atoms (for alk-ua method).
+        breakfrac: Fraction of frames below which a contact is considered broken.
+        nworkers: Number of worker processes.
+        opref: Prefix of output data files.
+        imgfile: Output image of number of contacts broken v/s phi.
+
+    Raises:
+        ValueError if calculation method is not recognized.
+    """
+    if method not in selection_parser:
+        raise ValueError("Method not recognized")
+    selstr = selection_parser[method].format(alk_resname=alk_resname)
+
+    # Exclusions from bond network
+    u_apsp = mda.Universe(apsp_structf)
+    sel = u_apsp.select_atoms(selstr)
+    nsel = len(sel)
+    excluded_keys = excluded_pair_keys(sel, connthreshold)
+    allowed = None
+    if method == "atomic-sh":
+        allowed = ~np.isin(sel.indices, u_apsp.select_atoms(not_side_heavy_sel).indices)
+    np.save(opref + "_sel_indices.npy", sel.indices)
+
+    # Stream trajectories in parallel
+    tasks = [(structf_format.format(phi=phi, run=run), trajf_format.format(phi=phi, run=run), selstr,
+              excluded_keys, allowed, distcutoff, start_time, skip)
+             for phi in phivals for run in runs]
+    with Pool(processes=nworkers) as pool:
+        results = pool.map(_run_contacts_worker, tasks)
+
+    # Mean contact maps, over union of pairs in contact at any phi
+    allkeys = np.unique(np.concatenate([keys for keys, counts, nframes in results]))
+    mean_contacts = np.zeros((len(phivals), len(allkeys)))
+    for phi_idx in range(len(phivals)):
+        counts = np.zeros(len(allkeys))
+        nframes = 0
+        for run_idx in range(len(runs)):
+            rkeys, rcounts, rnframes = results[phi_idx * len(runs) + run_idx]
+            counts[np.searchsorted(allkeys, rkeys)] += rcounts
+            nframes += rnframes
+        mean_contacts[phi_idx] = counts / max(nframes, 1)
+
+    pi, pj = np.divmod(allkeys, nsel)
+
+    for phi_idx, phi in enumerate(phivals):
+        mean_map = sparse.csr_matrix((mean_contacts[phi_idx], (pi, pj)), shape=(nsel, nsel))
+        mean_map.eliminate_zeros()
+        sparse.save_npz(opref + "_phi_{}_mean.npz".format(phi), mean_map)
+
+        diff_map = sparse.csr_matrix((mean_contacts[phi_idx] - mean_contacts[0], (pi, pj)), shape=(nsel, nsel))
+        diff_map.eliminate_zeros()
+        sparse.save_npz(opref + "_phi_{}_diff.npz".format(phi), diff_map)
+
+    # phi at which contacts formed at phi=0 break
+    phivals_numeric = np.array([float(phi) for phi in phivals])
+    formed, break_phi = contact_break_phi(phivals_numeric, mean_contacts, breakfrac)
+
+    np.save(opref + "_break_phi.npy", np.vstack((pi[formed], pj[formed], break_phi)))
+
+    # Plot number of contacts broken v/s phi
+    nbroken = np.array([np.sum(break_phi <= phi) for phi in phivals_numeric])
+
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=300)
+    ax.plot(phivals_numeric, nbroken, 's:')
+    ax.set_xlabel(r"$\phi$ (kJ/mol)")
+    ax.set_ylabel("Number of contacts broken")
+
+    x_minor_locator = AutoMinorLocator(10)
+    ax.xaxis.set_minor_locator(x_minor_locator)
+    ax.grid(which='major', linestyle='-')
+    ax.grid(which='minor', linestyle=':')
+
+    plt.savefig(imgfile, format="png")
+    plt.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate sparse contact maps across phi-ensemble.")
+    parser.add_argument("-phi", type=str, nargs='+', help="phi values to read (phi=0 must be first)")
+    parser.add_argument("-runs", type=int, nargs='+', help="runs to read")
+    parser.add_argument("-start", type=int, help="time (ps) to start computing averages")
+    parser.add_argument("-structf_format", help="format of structure file, with {phi} placeholders for phi value and {run} placeholders for run value")
+    parser.add_argument("-trajf_format", help="format of trajectory file, with {phi} placeholders for phi value and {run} placeholders for run value")
+    parser.add_argument("-apsp_structf", help="portable binary run (.tpr) file containing bond information")
+    parser.add_argument("-method", default="atomic-h", help="method for calculating contacts (alk-ua, atomic-h, atomic-sh; default=atomic-h)")
+    parser.add_argument("-distcutoff", type=float, default=6.0, help="distance cutoff for contacts, in A (default=6 A)")
+    parser.add_argument("-connthreshold", type=int, default=0, help="connectivity threshold for contacts (default=0)")
+    parser.add_argument("-skip", type=int, default=1, help="number of frames to skip between analyses (default=1)")
+    parser.add_argument("-alk_resname", default="ALK", help="residue name of alkane atoms (default=ALK)")
+    parser.add_argument("-breakfrac", type=float, default=0.5, help="fraction of frames below which a contact is broken (default=0.5)")
+    parser.add_argument("-nworkers", type=int, default=1, help="number of worker processes (default=1)")
+    parser.add_argument("-opref", default="contacts", help="prefix of output data files (default=contacts)")
+    parser.add_argument("-imgfile", default="contacts_break_phi.png", help="output image (default=contacts_break_phi.png)")
+
+    a = parser.parse_args()
+
+    phi_ensemble(a.phi, a.runs, a.start, a.structf_format, a.trajf_format, a.apsp_structf,
+                 a.method, a.distcutoff, a.connthreshold, a.skip, a.alk_resname, a.breakfrac,
+                 a.nworkers, a.opref, a.imgfile)
@@ -10,6 +10,7 @@ from matplotlib.ticker import AutoMinorLocator
 import MDAnalysis as mda
 import numpy as np
 
+from INDUSAnalysis.lib.histogram import FixedBinHistogram
 from INDUSAnalysis.timeseries import TimeSeries
 from INDUSAnalysis.timeseries import TimeSeriesAnalysis
 
@@ -38,20 +39,20 @@ def phi_ensemble(phivals: list,
     normalize = mcolors.Normalize(vmin=min(phivals_numeric), vmax=max(phivals_numeric))
     colormap = cm.rainbow
 
-    for phi_idx, phi in enumerate(phivals):
-
-        waters = []
+    # Accumulate histograms of all phi values, one file at a time
+    hist = FixedBinHistogram(Ntw_range[0], Ntw_range[1], Ntw_bins, nseries=len(phivals))
 
+    for phi_idx, phi in enumerate(phivals):
         for run_idx, run in enumerate(runs):
             ts = tsa.load_TimeSeries(calc_dir + Ntw_format.format(phi=phi, run=run))
             ts = ts[start_time:]
-            waters.append(ts.data_array)
+            hist.add(ts.data_array, series=phi_idx)
 
-        waters = np.array(waters)
+    density = hist.density()
 
-        hist, edges = np.histogram(waters, bins=Ntw_bins, range=Ntw_range, density=True)
-        x = 0.5 * (edges[1:] + edges[:-1])
-        y = hist
+    for phi_idx, phi in enumerate(phivals):
+        x = hist.centers
+        y = density[phi_idx]
         ax.plot(x, y, color=colormap(normalize(float(phi))))
         ax.fill_between(x, 0, y, color=colormap(normalize(float(phi))), alpha=0.4)
 
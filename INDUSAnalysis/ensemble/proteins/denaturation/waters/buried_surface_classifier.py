@@ -1,5 +1,8 @@
 """
 Plots histograms of <N_i~> (binning across i) for native (folded) state and unfolded state.
+
+Alternatively (-classifier sasa), plots histograms of per-atom solvent accessible surface areas <SASA_i>
+computed by INDUSAnalysis.sasa, and classifies atoms by their native state SASA.
 """
 import argparse
 
@@ -13,7 +16,11 @@ from INDUSAnalysis.timeseries import TimeSeries
 from INDUSAnalysis.timeseries import TimeSeriesAnalysis
 
 
-def buried_surface_classifier(struct_file, traj_file, ni_native_format, ni_unfolded_format, runs, start, nirange, nbins, buried_cut, imgfile, classfile, classpdb):
+def buried_surface_classifier(struct_file, traj_file, ni_native_format, ni_unfolded_format, runs, start, nirange, nbins, buried_cut, imgfile, classfile, classpdb,
+                              classifier="waters"):
+    if classifier not in ["waters", "sasa"]:
+        raise ValueError("Classifier must be one of waters or sasa")
+
     tsa = TimeSeriesAnalysis()
 
     ni_range = [nirange[0], nirange[1]]
@@ -21,7 +28,10 @@ def buried_surface_classifier(struct_file, traj_file, ni_native_format, ni_unfol
 
     """Prepare histogram"""
     fig, ax = plt.subplots(figsize=(12, 6), dpi=300)
-    ax.set_xlabel(r"$n_i$")
+    if classifier == "sasa":
+        ax.set_xlabel(r"SASA$_i$ ($\AA^2$)")
+    else:
+        ax.set_xlabel(r"$n_i$")
     ax.set_ylabel("Number of h. atoms")
 
     u = mda.Universe(struct_file)
@@ -41,7 +51,13 @@ def buried_surface_classifier(struct_file, traj_file, ni_native_format, ni_unfol
         for runidx, run in enumerate(runs):
             ts = tsa.load_TimeSeries(ni_format.format(run=run))
             ts = ts[start:]
-            hwaters = ts.data_array[:, protein_heavy_indices]
+            if classifier == "sasa":
+                # SASA TimeSeries contain only the heavy atoms they were calculated for
+                if ts.data_array.shape[1] != len(protein_heavy_indices):
+                    raise ValueError("SASA data does not contain the same number of atoms as protein heavy atom selection")
+                hwaters = ts.data_array
+            else:
+                hwaters = ts.data_array[:, protein_heavy_indices]
             meanhwaters = hwaters.mean(axis=0)
             heavy_mean_waters.append(meanhwaters)
 
@@ -105,17 +121,19 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Plot Nv v/s phi and phi* for simulation.")
     parser.add_argument("-struct_file", help="path to structure file (.gro or .tpr)")
     parser.add_argument("-traj_file", help="path to trajectory file (.xtc) to extract first frame from")
-    parser.add_argument("-ni_native_format", help="format of .pkl file containing native probe waters with {run} placeholders for run value")
-    parser.add_argument("-ni_unfolded_format", help="format of .pkl file containing unfolded probe waters, relative to calc_dir, with {run} placeholders for run value")
+    parser.add_argument("-ni_native_format", help="format of .pkl file containing native probe waters (or SASA) with {run} placeholders for run value")
+    parser.add_argument("-ni_unfolded_format", help="format of .pkl file containing unfolded probe waters (or SASA), relative to calc_dir, with {run} placeholders for run value")
     parser.add_argument("-runs", type=int, nargs='+', help="runs to read")
     parser.add_argument("-start", type=int, help="time (ps) to start computing averages")
     parser.add_argument("-nirange", type=float, nargs=2, help="min and max value of ni to bin over")
     parser.add_argument("-nbins", type=int, help="number of bins")
-    parser.add_argument("-buried_cut", type=int, help="cutoff folded state <ni> at or below which (<=) atom i is classified as a buried atom")
+    parser.add_argument("-buried_cut", type=float, help="cutoff folded state <ni> (or <SASA_i>, in A^2) at or below which (<=) atom i is classified as a buried atom")
+    parser.add_argument("-classifier", default="waters", help="classify atoms by probe waters (waters) or by solvent accessible surface area from INDUSAnalysis.sasa (sasa) (default=waters)")
     parser.add_argument("-imgfile", default="buried_surface.png", help="output image (default=buried_surface.png)")
     parser.add_argument("-classfile", default="buried_surface_indicator.npy", help="output numpy file buried v/s surface classes for heavy atoms(default=buried_surface_indicator.npy)")
     parser.add_argument("-classpdb", default="buried_surface_indicator.pdb", help="output PDB buried v/s surface classes as bfactors (default=buried_surface_indicator.pdb)")
 
     a = parser.parse_args()
 
-    buried_surface_classifier(a.struct_file, a.traj_file, a.ni_native_format, a.ni_unfolded_format, a.runs, a.start, a.nirange, a.nbins, a.buried_cut, a.imgfile, a.classfile, a.classpdb)
+    buried_surface_classifier(a.struct_file, a.traj_file, a.ni_native_format, a.ni_unfolded_format, a.runs, a.start, a.nirange, a.nbins, a.buried_cut, a.imgfile, a.classfile, a.classpdb,
+                              a.classifier)
@@ -0,0 +1,133 @@
+"""
+Class for computing histograms of one or more series over a fixed bin specification
+"""
+import numpy as np
+
+
+class FixedBinHistogram:
+    """
+    Accumulates histograms of one or more series over fixed, uniformly spaced bins.
+
+    Bin indices are computed directly from the bin spec and counted with a single
+    np.bincount call, with each series offset by a multiple of the number of bins, so
+    that many series (e.g. phi values) can be histogrammed in one call and
+    counts can be accumulated incrementally across files without concatenating data.
+
+    Bins follow the same convention as np.histogram: all bins are half-open
+    [edge_i, edge_{i+1}) except the last, which also includes xmax. Values outside
+    [xmin, xmax] are ignored.
+
+    Attributes:
+        edges (ndarray): Bin edges, of length nbins + 1.
+        centers (ndarray): Bin centers, of length nbins.
+        counts (ndarray): Integer array of shape (nseries, nbins) containing accumulated counts.
+
+    Examples:
+        >>> hist = FixedBinHistogram(0, 4, 4, nseries=2)
+        >>> hist.add([0, 1, 1, 4], series=0)
+        >>> hist.add_series([[2.5, 3], [0.5, 5]])
+        >>> hist.counts
+        array([[1, 2, 1, 2],
+               [1, 0, 0, 0]])
+    """
+    def __init__(self, xmin, xmax, nbins, nseries=1):
+        """
+        Creates histogram with fixed bins.
+
+        Args:
+            xmin (float): Left edge of first bin.
+            xmax (float): Right edge of last bin.
+            nbins (int): Number of bins.
+            nseries (int): Number of series to accumulate histograms for (default = 1).
+
+        Raises:
+            ValueError if xmax <= xmin or nbins < 1.
+        """
+        if xmax <= xmin:
+            raise ValueError("xmax must be greater than xmin")
+        if nbins < 1:
+            raise ValueError("Number of bins must be at least 1")
+        self.xmin = xmin
+        self.xmax = xmax
+        self.nbins = int(nbins)
+        self.nseries = int(nseries)
+        self.edges = np.linspace(xmin, xmax, self.nbins + 1)
+        self.centers = 0.5 * (self.edges[1:] + self.edges[:-1])
+        self.counts = np.zeros((self.nseries, self.nbins), dtype=np.int64)
+
+    @classmethod
+    def integer(cls, nmin, nmax, nseries=1):
+        """
+        Creates histogram with unit-width bins centered on the integers nmin, ..., nmax,
+        for integer-valued data (e.g. water or contact counts).
+
+        Args:
+            nmin (int): Smallest integer value to bin.
+            nmax (int): Largest integer value to bin.
+            nseries (int): Number of series to accumulate histograms for (default = 1).
+
+        Returns:
+            FixedBinHistogram object.
+        """
+        return cls(nmin - 0.5, nmax + 0.5, nmax - nmin + 1, nseries)
+
+    def bin_indices(self, x):
+        """
+        Computes bin index of each value.
+
+        Args:
+            x (ndarray): Values to bin.
+
+        Returns:
+            idx (ndarray): Integer array of the same shape as x containing bin indices,
+                with -1 for values outside [xmin, xmax].
+        """
+        x = np.asarray(x, dtype=np.float64)
+        inrange = (x >= self.xmin) & (x <= self.xmax)
+        idx = np.floor((x - self.xmin) * (self.nbins / (self.xmax - self.xmin)))
+        idx = np.clip(np.nan_to_num(idx), 0, self.nbins - 1).astype(np.int64)
+
+        # Correct floating point round-off at bin edges
+        idx -= (x < self.edges[idx])
+        idx += (x >= self.edges[idx + 1]) & (idx != self.nbins - 1)
+
+        idx[~inrange] = -1
+        return idx
+
+    def add(self, x, series=0):
+        """
+        Adds values to the histogram of a single series.
+
+        Args:
+            x (ndarray): Values to bin.
+            series (int): Index of series to add values to (default = 0).
+        """
+        idx = self.bin_indices(np.ravel(x))
+        self.counts[series] += np.bincount(idx[idx >= 0], minlength=self.nbins)
+
+    def add_series(self, xs, series=None):
+        """
+        Adds values to the histograms of multiple series in one bincount call.
+
+        Args:
+            xs (list): List of arrays of values to bin, one per series (arrays may have different lengths).
+            series (list): Indices of series to add each array to (default = 0, 1, ..., len(xs) - 1).
+        """
+        if series is None:
+            series = np.arange(len(xs))
+        idx = np.concatenate([self.bin_indices(np.ravel(x)) for x in xs])
+        offsets = np.repeat(np.asarray(series, dtype=np.int64) * self.nbins, [np.size(x) for x in xs])
+        valid = (idx >= 0)
+        self.counts += np.bincount(idx[valid] + offsets[valid],
+                                   minlength=self.nseries * self.nbins).reshape(self.nseries, self.nbins)
+
+    def density(self):
+        """
+        Returns:
+            density (ndarray): Array of shape (nseries, nbins) containing histograms normalized
+                such that the integral over the range of each series is 1 (as np.histogram(..., density=True)).
+        """
+        widths = np.diff(self.edges)
+        totals = self.counts.sum(axis=1, keepdims=True).astype(np.float64)
+        totals[totals == 0] = np.nan
+        return self.counts / totals / widths
@@ -3,7 +3,14 @@ Module containing a class for analysing protein (or polymer) order parameters al
 simulation trajectory.
 """
 
+import hashlib
+from multiprocessing import Pool
+import os
+import tempfile
+import warnings
+
 import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
 
 import MDAnalysis as mda
@@ -18,6 +25,615 @@ from INDUSAnalysis.lib import profiling
 cimport numpy as np
 
 
+def batched_rotation_matrices(coords, refcoords):
+    """
+    Calculates rotation matrices which optimally superpose each of a block of centered
+    coordinate sets onto centered reference coordinates, using the Kabsch algorithm
+    with a batched SVD.
+
+    Args:
+        coords (np.array): Array of shape (F, N, 3) containing centered coordinates.
+        refcoords (np.array): Array of shape (N, 3) or (F, N, 3) containing centered reference coordinates.
+
+    Returns:
+        Array of shape (F, 3, 3) containing rotation matrices R, such that
+        np.dot(coords[f], R[f].T) is optimally superposed onto refcoords.
+    """
+    if refcoords.ndim == 2:
+        H = np.einsum('fni,nj->fij', coords, refcoords)
+    else:
+        H = np.einsum('fni,fnj->fij', coords, refcoords)
+    U, S, Vt = np.linalg.svd(H)
+    V = np.swapaxes(Vt, 1, 2)
+    Ut = np.swapaxes(U, 1, 2)
+
+    # Correct for reflections
+    d = np.sign(np.linalg.det(np.matmul(V, Ut)))
+    V[:, :, 2] *= d[:, np.newaxis]
+
+    return np.matmul(V, Ut)
+
+
+def gyration_tensor_descriptors(coords, masses):
+    r"""
+    Calculates mass-weighted gyration tensor eigenvalues and shape descriptors for a block of frames.
+
+    The 3x3 gyration tensors of all F frames are formed with one batched matrix product and
+    diagonalized with a batched eigvalsh. With eigenvalues :math:`\lambda_x \leq \lambda_y \leq \lambda_z`,
+
+    .. math:: R_g^2 = \lambda_x + \lambda_y + \lambda_z
+
+    .. math:: b = \lambda_z - \frac{1}{2} (\lambda_x + \lambda_y)
+
+    .. math:: c = \lambda_y - \lambda_x
+
+    .. math:: \kappa^2 = 1 - 3 \frac{\lambda_x \lambda_y + \lambda_y \lambda_z + \lambda_z \lambda_x}{(\lambda_x + \lambda_y + \lambda_z)^2}
+
+    Args:
+        coords (np.array): Array of shape (F, N, 3) containing coordinates.
+        masses (np.array): Array of shape (N,) containing atomic masses.
+
+    Returns:
+        Array of shape (F, 7) containing, for each frame, [Rg, lambda_x, lambda_y, lambda_z,
+        asphericity b, acylindricity c, relative shape anisotropy kappa^2] (see SHAPE_DESCRIPTORS).
+    """
+    weights = masses / np.sum(masses)
+    com = np.einsum('fni,n->fi', coords, weights)
+    dx = coords - com[:, np.newaxis, :]
+    S = np.matmul(np.swapaxes(dx * weights[:, np.newaxis], 1, 2), dx)
+    lambdas = np.linalg.eigvalsh(S)
+    lx, ly, lz = lambdas[:, 0], lambdas[:, 1], lambdas[:, 2]
+    trace = lx + ly + lz
+
+    descriptors = np.zeros((coords.shape[0], 7))
+    descriptors[:, 0] = np.sqrt(trace)
+    descriptors[:, 1:4] = lambdas
+    descriptors[:, 4] = lz - 0.5 * (lx + ly)
+    descriptors[:, 5] = ly - lx
+    descriptors[:, 6] = 1 - 3 * (lx * ly + ly * lz + lz * lx) / trace**2
+    return descriptors
+
+
+SHAPE_DESCRIPTORS = ['Rg', 'lambda_x', 'lambda_y', 'lambda_z', 'Asphericity', 'Acylindricity', 'Relative shape anisotropy']
+
+
+def calc_dihedrals(coords, quads):
+    """
+    Calculates dihedral angles of atom quadruples for a single frame or a block of frames,
+    with array operations over all quadruples (and frames).
+
+    Args:
+        coords (np.array): Array of shape (N, 3) or (F, N, 3) containing coordinates.
+        quads (np.array): Integer array of shape (K, 4) containing indices of atoms (in coords)
+            defining each dihedral.
+
+    Returns:
+        Array of shape (K,) or (F, K) containing dihedral angles, in degrees, in [-180, 180].
+    """
+    p0 = coords[..., quads[:, 0], :]
+    p1 = coords[..., quads[:, 1], :]
+    p2 = coords[..., quads[:, 2], :]
+    p3 = coords[..., quads[:, 3], :]
+
+    b0 = p0 - p1
+    b1 = p2 - p1
+    b2 = p3 - p2
+    b1 = b1 / np.linalg.norm(b1, axis=-1)[..., np.newaxis]
+
+    # Components of b0 and b2 perpendicular to the central bond
+    v = b0 - np.sum(b0 * b1, axis=-1)[..., np.newaxis] * b1
+    w = b2 - np.sum(b2 * b1, axis=-1)[..., np.newaxis] * b1
+
+    x = np.sum(v * w, axis=-1)
+    y = np.sum(np.cross(b1, v) * w, axis=-1)
+    return np.degrees(np.arctan2(y, x))
+
+
+SS_CODES = ['C', 'H', 'E']
+
+
+def assign_secondary_structure(phi, psi, minhelix=4, minstrand=3):
+    """
+    Assigns a simple secondary structure to each residue from its backbone dihedrals.
+
+    A residue is in the helical region of the Ramachandran plot if -100 <= phi <= -30 and
+    -80 <= psi <= -5, and in the strand region if -180 <= phi <= -45 and (psi >= 90 or psi <= -150).
+    Residues are assigned to a helix (H) or strand (E) only if they belong to a run of at least
+    `minhelix` (or `minstrand`) consecutive residues in that region; all other residues,
+    including residues with undefined dihedrals (NaN), are assigned coil (C).
+
+    Args:
+        phi (np.array): Array of shape (R,) or (F, R) containing phi angles, in degrees.
+        psi (np.array): Array of shape (R,) or (F, R) containing psi angles, in degrees.
+        minhelix (int): Minimum number of consecutive residues in helix (default = 4).
+        minstrand (int): Minimum number of consecutive residues in strand (default = 3).
+
+    Returns:
+        Integer array of the same shape as phi, containing indices into SS_CODES (0 = C, 1 = H, 2 = E).
+    """
+    phi = np.asarray(phi)
+    psi = np.asarray(psi)
+    with np.errstate(invalid='ignore'):
+        helix = (phi >= -100) & (phi <= -30) & (psi >= -80) & (psi <= -5)
+        strand = (phi >= -180) & (phi <= -45) & ((psi >= 90) | (psi <= -150))
+
+    def runs_at_least(mask, minlen):
+        # Residue i is covered if any window of minlen consecutive residues containing i lies entirely in mask
+        nres = mask.shape[-1]
+        if minlen > nres:
+            return np.zeros_like(mask)
+        csum = np.concatenate((np.zeros(mask.shape[:-1] + (1,), dtype=int), np.cumsum(mask, axis=-1)), axis=-1)
+        full = (csum[..., minlen:] - csum[..., :-minlen]) == minlen
+        # Windows starting at j cover residues j, ..., j + minlen - 1
+        fcsum = np.concatenate((np.zeros(full.shape[:-1] + (1,), dtype=int), np.cumsum(full, axis=-1)), axis=-1)
+        start = np.clip(np.arange(nres) - minlen + 1, 0, full.shape[-1])
+        stop = np.clip(np.arange(nres) + 1, 0, full.shape[-1])
+        return (fcsum[..., stop] - fcsum[..., start]) > 0
+
+    ss = np.zeros(phi.shape, dtype=np.int8)
+    ss[runs_at_least(strand, minstrand)] = 2
+    ss[runs_at_least(helix, minhelix)] = 1
+    return ss
+
+
+def pairwise_RMSD_tile(coordsA, coordsB):
+    """
+    Calculates (unweighted) RMSDs after optimal superposition between all pairs of frames in two
+    blocks of centered coordinates.
+
+    The minimum RMSD for each pair is obtained from the singular values of the pair's 3x3
+    covariance matrix (as in the Kabsch algorithm), with all covariance matrices of the tile formed
+    with one BLAS matrix product and decomposed with a batched SVD.
+
+    Args:
+        coordsA (np.array): Array of shape (A, N, 3) containing centered coordinates.
+        coordsB (np.array): Array of shape (B, N, 3) containing centered coordinates.
+
+    Returns:
+        Array of shape (A, B) containing RMSDs.
+    """
+    natoms = coordsA.shape[1]
+    GA = np.sum(coordsA**2, axis=(1, 2))
+    GB = np.sum(coordsB**2, axis=(1, 2))
+
+    # H[a, b, j, k] = sum_n coordsA[a, n, j] * coordsB[b, n, k]
+    H = np.tensordot(coordsA, coordsB, axes=([1], [1])).transpose(0, 2, 1, 3)
+    sigma = np.linalg.svd(H, compute_uv=False)
+
+    # Correct for reflections
+    sigma[:, :, 2] *= np.sign(np.linalg.det(H))
+
+    sq_RMSD = (GA[:, np.newaxis] + GB[np.newaxis, :] - 2 * np.sum(sigma, axis=2)) / natoms
+    return np.sqrt(np.maximum(sq_RMSD, 0))
+
+
+def _pairwise_RMSD_worker(args):
+    """Calculates a tile of the pairwise RMSD matrix and writes it (and its transpose) to memory-mapped file."""
+    coordsf, outf, istart, iend, jstart, jend = args
+    coords = np.load(coordsf, mmap_mode='r')
+    out = np.load(outf, mmap_mode='r+')
+    tile = pairwise_RMSD_tile(np.array(coords[istart:iend], dtype=np.float64),
+                              np.array(coords[jstart:jend], dtype=np.float64))
+    out[istart:iend, jstart:jend] = tile
+    out[jstart:jend, istart:iend] = tile.T
+    out.flush()
+
+
+class FrameAlignment:
+    """
+    Optimal superposition of an alignment group onto its reference coordinates.
+
+    The translation and rotation are computed once per frame (or once per block of frames)
+    and shared between all observables which use the same alignment group.
+
+    Args:
+        align (mda.AtomGroup): Alignment group.
+        aligninitcoords (np.array): Array of shape (N, 3) containing reference coordinates of alignment group.
+    """
+    def __init__(self, align, aligninitcoords):
+        self.align = align
+        self.aligninitcog = np.mean(aligninitcoords, axis=0)
+        self.aligninitcoords = aligninitcoords - self.aligninitcog
+        self.aligncog = np.zeros(3)
+        self.R = np.identity(3)
+
+    def update(self):
+        """Calculates translation and rotation which align current frame to reference."""
+        aligncoords = self.align.positions
+        self.aligncog = np.mean(aligncoords, axis=0)
+        self.R, min_rms = mda.analysis.align.rotation_matrix(aligncoords - self.aligncog, self.aligninitcoords)
+
+    def transform(self, coords):
+        """
+        Applies alignment of current frame to coordinates.
+
+        Args:
+            coords (np.array): Array of shape (N, 3) containing coordinates at current frame.
+
+        Returns:
+            Array of shape (N, 3) containing coordinates, centered on the reference alignment
+            group's center of geometry and rotated onto the reference.
+        """
+        return np.dot(coords - self.aligncog, self.R.T)
+
+    def update_block(self, aligncoords):
+        """
+        Calculates translations and rotations which align a block of frames to reference.
+
+        Args:
+            aligncoords (np.array): Array of shape (F, N, 3) containing coordinates of alignment group.
+        """
+        self.aligncog = np.mean(aligncoords, axis=1)
+        self.R = batched_rotation_matrices(aligncoords - self.aligncog[:, np.newaxis, :], self.aligninitcoords)
+
+    def transform_block(self, coords):
+        """
+        Applies alignment of a block of frames to coordinates.
+
+        Args:
+            coords (np.array): Array of shape (F, N, 3) containing coordinates.
+
+        Returns:
+            Array of shape (F, N, 3) containing aligned coordinates.
+        """
+        return np.einsum('fnj,fij->fni', coords - self.aligncog[:, np.newaxis, :], self.R)
+
+
+class FrameObservable:
+    """
+    Per-frame observable computed by `OrderParamsAnalysis.calc_observables`.
+
+    At each frame, `func(sel, coords, refcoords)` is called, where `sel` is the AtomGroup of
+    `selection`, `coords` are its positions (aligned to the reference if `alignment` is not None)
+    and `refcoords` are its reference positions (centered on the reference alignment group's
+    center of geometry, or None if `alignment` is None). `func` can return a scalar or an array
+    of fixed shape, which is stored for each frame.
+
+    In block mode, `block_func(sel, coords, refcoords)` is called instead with `coords`
+    of shape (F, N, 3) for a block of F frames, and returns the values for all F frames. If
+    `block_func` is None, `func` is called for each frame in the block.
+
+    Args:
+        name (str): Name of observable, used for output files.
+        func (callable): Function computing observable.
+        selection (str): MDAnalysis selection string.
+        alignment (str): MDAnalysis selection string of alignment group (default = None).
+        labels (list): TimeSeries labels (default = [name]).
+        block_func (callable): Vectorized function computing observable for a block of frames (default = None).
+    """
+    def __init__(self, name, func, selection, alignment=None, labels=None, block_func=None):
+        self.name = name
+        self.func = func
+        self.block_func = block_func
+        self.selection = selection
+        self.alignment = alignment
+        if labels is None:
+            labels = [name]
+        self.labels = labels
+
+    def setup(self, sel, refcoords, times):
+        """
+        Stores atom group and reference coordinates, and prepares storage for all frames.
+
+        Args:
+            sel (mda.AtomGroup): Atom group of selection.
+            refcoords (np.array): Reference coordinates of selection (or None).
+            times (np.array): Array of times of frames, filled in as frames are read.
+        """
+        self.sel = sel
+        self.refcoords = refcoords
+        self.times = times
+        self.nframes = len(times)
+        self.values = None
+
+    def update(self, tidx, coords):
+        """Calculates observable at frame tidx."""
+        value = self.func(self.sel, coords, self.refcoords)
+        if self.values is None:
+            self.values = np.zeros((self.nframes,) + np.shape(value))
+        self.values[tidx] = value
+
+    def update_block(self, tstart, coords):
+        """Calculates observable for block of frames starting at frame tstart."""
+        if self.block_func is None:
+            for bidx in range(coords.shape[0]):
+                self.update(tstart + bidx, coords[bidx])
+            return
+        values = self.block_func(self.sel, coords, self.refcoords)
+        if self.values is None:
+            self.values = np.zeros((self.nframes,) + np.shape(values)[1:])
+        self.values[tstart:tstart + coords.shape[0]] = values
+
+    def result(self, times):
+        """Returns TimeSeries object containing observable values along trajectory."""
+        return timeseries.TimeSeries(times, self.values, labels=self.labels)
+
+
+class MemmapFrameObservable(FrameObservable):
+    """
+    Per-frame observable whose values are buffered in fixed-size chunks of frames and written
+    progressively to a memory-mapped .npy file, so that only one chunk is held in memory.
+
+    `result` returns a TimeSeries whose data is the memory-mapped array, which is read lazily
+    and is pickled as a reference to `outf`.
+
+    Args:
+        name (str): Name of observable.
+        func (callable): Function computing observable.
+        selection (str): MDAnalysis selection string.
+        outf (str): Path of .npy file to write values to.
+        alignment (str): MDAnalysis selection string of alignment group (default = None).
+        labels (list): TimeSeries labels (default = [name]).
+        block_func (callable): Vectorized function computing observable for a block of frames (default = None).
+        chunksize (int): Number of frames per chunk (default = 100).
+        dtype (np.dtype): Data type of stored values (default = np.float32).
+    """
+    def __init__(self, name, func, selection, outf, alignment=None, labels=None, block_func=None,
+                 chunksize=100, dtype=np.float32):
+        super().__init__(name, func, selection, alignment, labels, block_func)
+        self.outf = outf
+        self.chunksize = chunksize
+        self.dtype = dtype
+
+    def setup(self, sel, refcoords, times):
+        super().setup(sel, refcoords, times)
+        self.buffer = None
+        self.chunkstart = 0
+
+    def store(self, tstart, values):
+        """Copies values of consecutive frames starting at frame tstart to chunk buffer, writing full chunks to file."""
+        if self.buffer is None:
+            self.values = np.lib.format.open_memmap(self.outf, mode='w+', dtype=self.dtype,
+                                                    shape=(self.nframes,) + np.shape(values)[1:])
+            self.buffer = np.zeros((min(self.chunksize, self.nframes),) + np.shape(values)[1:], dtype=self.dtype)
+
+        pos = 0
+        while pos < len(values):
+            bidx = tstart + pos - self.chunkstart
+            n = min(len(values) - pos, len(self.buffer) - bidx)
+            self.buffer[bidx:bidx + n] = values[pos:pos + n]
+            pos += n
+            if bidx + n == len(self.buffer) or self.chunkstart + bidx + n == self.nframes:
+                self.values[self.chunkstart:self.chunkstart + bidx + n] = self.buffer[:bidx + n]
+                self.values.flush()
+                self.chunkstart += bidx + n
+
+    def update(self, tidx, coords):
+        """Calculates observable at frame tidx."""
+        self.store(tidx, [self.func(self.sel, coords, self.refcoords)])
+
+    def update_block(self, tstart, coords):
+        """Calculates observable for block of frames starting at frame tstart."""
+        if self.block_func is None:
+            for bidx in range(coords.shape[0]):
+                self.update(tstart + bidx, coords[bidx])
+            return
+        self.store(tstart, self.block_func(self.sel, coords, self.refcoords))
+
+    def result(self, times):
+        """Returns TimeSeries object containing lazily read, memory-mapped observable values along trajectory."""
+        self.buffer = None
+        self.values = None
+        return timeseries.TimeSeries(times, np.load(self.outf, mmap_mode='r'), labels=self.labels, copy=False)
+
+
+class RMSFAccumulator(FrameObservable):
+    """
+    Streaming accumulator of the mean structure and per-atom fluctuations of aligned coordinates.
+
+    Uses Welford updates for single frames and Chan et al.'s pairwise update for blocks
+    of frames, so memory use is O(atoms) instead of O(frames x atoms).
+
+    Args:
+        selection (str): MDAnalysis selection string.
+        alignment (str): MDAnalysis selection string of alignment group.
+        start_time (float): Time to begin accumulating at (default = None, first frame).
+        end_time (float): Time to end accumulating at (default = None, last frame).
+    """
+    def __init__(self, selection, alignment, start_time=None, end_time=None):
+        super().__init__("RMSF", None, selection, alignment, labels=['RMSF', 'Atom index'])
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def setup(self, sel, refcoords, times):
+        super().setup(sel, refcoords, times)
+        self.count = 0
+        self.mean = np.zeros((len(sel), 3))
+        self.M2 = np.zeros((len(sel), 3))
+
+    def in_window(self, times):
+        """Returns boolean mask of times inside accumulation window."""
+        mask = np.ones(np.shape(times), dtype=bool)
+        if self.start_time is not None:
+            mask &= (times >= self.start_time)
+        if self.end_time is not None:
+            mask &= (times <= self.end_time)
+        return mask
+
+    def update(self, tidx, coords):
+        """Adds aligned coordinates at frame tidx to accumulator."""
+        if not self.in_window(self.times[tidx]):
+            return
+        self.count += 1
+        delta = coords - self.mean
+        self.mean += delta / self.count
+        self.M2 += delta * (coords - self.mean)
+
+    def update_block(self, tstart, coords):
+        """Adds aligned coordinates of block of frames starting at frame tstart to accumulator."""
+        coords = coords[self.in_window(self.times[tstart:tstart + coords.shape[0]])]
+        nblock = coords.shape[0]
+        if nblock == 0:
+            return
+        block_mean = np.mean(coords, axis=0)
+        block_M2 = np.sum((coords - block_mean)**2, axis=0)
+
+        count = self.count + nblock
+        delta = block_mean - self.mean
+        self.mean += delta * nblock / count
+        self.M2 += block_M2 + delta**2 * self.count * nblock / count
+        self.count = count
+
+    def variance(self):
+        """Returns array of shape (N, 3) containing variance of each aligned coordinate."""
+        return self.M2 / max(self.count, 1)
+
+    def result(self, times=None):
+        """
+        Returns:
+            {
+                RMSF (np.array): Array of shape (N,) containing root mean square fluctuations about the
+                    mean structure.
+                RMSD_ref (np.array): Array of shape (N,) containing root mean square deviations from the reference
+                    structure, sqrt(mean_t(delta_i(t)^2)).
+                mean (np.array): Array of shape (N, 3) containing mean (aligned) structure.
+                variance (np.array): Array of shape (N, 3) containing variance of each aligned coordinate.
+            }
+        """
+        variance = self.variance()
+        RMSF = np.sqrt(np.sum(variance, axis=1))
+        RMSD_ref = np.sqrt(np.sum(variance + (self.mean - self.refcoords)**2, axis=1))
+        return RMSF, RMSD_ref, self.mean, variance
+
+
+class BackboneDihedralsObservable(FrameObservable):
+    """
+    Per-frame backbone phi and psi dihedrals of all residues of a selection.
+
+    The N, CA and C atom index quadruples of all dihedrals are gathered once, and all dihedrals
+    are then calculated for each frame (or block of frames) with array operations. phi is
+    undefined (NaN) for residues without a preceding residue in the same segment, and psi
+    for residues without a following residue in the same segment.
+
+    Args:
+        selection (str): MDAnalysis selection string of residues (default = protein).
+    """
+    def __init__(self, selection="protein"):
+        backbone = "({}) and (name N or name CA or name C)".format(selection)
+        super().__init__("dihedrals", None, backbone, labels=['Dihedral', 'phi/psi', 'Residue index'])
+
+    def setup(self, sel, refcoords, times):
+        super().setup(sel, refcoords, times)
+        residues = sel.residues
+        nres = len(residues)
+        local = {atomidx: localidx for localidx, atomidx in enumerate(sel.indices)}
+
+        bb = -np.ones((nres, 3), dtype=int)
+        for residx, res in enumerate(residues):
+            for nameidx, name in enumerate(['N', 'CA', 'C']):
+                atoms = res.atoms.select_atoms("name " + name)
+                if len(atoms) > 0 and atoms[0].index in local:
+                    bb[residx, nameidx] = local[atoms[0].index]
+
+        # Consecutive residues in the same segment
+        bonded = ((np.diff(residues.resindices) == 1) & (np.diff(residues.segindices) == 0)
+                  & np.all(bb[:-1] >= 0, axis=1) & np.all(bb[1:] >= 0, axis=1))
+
+        self.phi_res = np.nonzero(bonded)[0] + 1
+        self.phi_quads = np.column_stack((bb[self.phi_res - 1, 2], bb[self.phi_res, 0], bb[self.phi_res, 1], bb[self.phi_res, 2]))
+        self.psi_res = np.nonzero(bonded)[0]
+        self.psi_quads = np.column_stack((bb[self.psi_res, 0], bb[self.psi_res, 1], bb[self.psi_res, 2], bb[self.psi_res + 1, 0]))
+
+        self.resids = residues.resids
+        self.values = np.full((self.nframes, 2, nres), np.nan)
+
+    def update(self, tidx, coords):
+        """Calculates dihedrals at frame tidx."""
+        self.values[tidx, 0, self.phi_res] = calc_dihedrals(coords, self.phi_quads)
+        self.values[tidx, 1, self.psi_res] = calc_dihedrals(coords, self.psi_quads)
+
+    def update_block(self, tstart, coords):
+        """Calculates dihedrals for block of frames starting at frame tstart."""
+        tstop = tstart + coords.shape[0]
+        self.values[tstart:tstop, 0, self.phi_res] = calc_dihedrals(coords, self.phi_quads)
+        self.values[tstart:tstop, 1, self.psi_res] = calc_dihedrals(coords, self.psi_quads)
+
+
+class ReferenceCache:
+    """
+    Reference coordinates of atom selections at a timestep of a reference structure/trajectory,
+    cached in a small .npz file so that the reference trajectory is opened at most once across
+    many jobs sharing the same reference.
+
+    Cache files are keyed by the reference structure and trajectory files (path, size and
+    modification time) and the timestep, and contain one coordinate array per selection string.
+    The reference Universe is only created when a requested selection is not yet cached.
+    Cache files are replaced atomically, so that concurrent jobs can share them.
+
+    Args:
+        structf (str): Reference structure file.
+        trajf (str): Reference trajectory file (default = None, use coordinates in structf).
+        tstep (int): Timestep of trajectory to extract reference coordinates from (default = 0).
+        cachedir (str): Directory to store cache file in (default = directory of trajf, or of structf,
+            which is shared by all jobs using the same reference).
+
+    Attributes:
+        cachef (str): Path of cache file.
+    """
+    def __init__(self, structf, trajf=None, tstep=0, cachedir=None):
+        self.structf = structf
+        self.trajf = trajf
+        self.tstep = tstep
+        self.refu = None
+
+        keyfiles = [structf] if trajf is None else [structf, trajf]
+        key = "|".join("{}:{}:{}".format(os.path.abspath(f), os.path.getsize(f), os.path.getmtime(f)) for f in keyfiles)
+        key += "|{}".format(tstep)
+        if cachedir is None:
+            cachedir = os.path.dirname(os.path.abspath(keyfiles[-1]))
+        self.cachef = os.path.join(cachedir, "refcache_" + hashlib.sha1(key.encode()).hexdigest()[:16] + ".npz")
+
+    @staticmethod
+    def selection_key(selection):
+        """Returns key of selection string in cache file."""
+        return "sel_" + hashlib.sha1(selection.encode()).hexdigest()[:16]
+
+    def load(self):
+        """
+        Returns:
+            Dictionary mapping keys to cached reference coordinates (empty if no cache file exists).
+        """
+        if not os.path.exists(self.cachef):
+            return {}
+        with np.load(self.cachef) as cache:
+            return {key: cache[key] for key in cache.files}
+
+    def positions(self, selections):
+        """
+        Returns reference coordinates of selections, extracting and caching any selections
+        which are not yet cached.
+
+        Args:
+            selections (list): List of MDAnalysis selection strings.
+
+        Returns:
+            Dictionary mapping each selection string to array of shape (N, 3) containing reference coordinates.
+        """
+        cache = self.load()
+        missing = [selection for selection in selections if self.selection_key(selection) not in cache]
+        if len(missing) > 0:
+            if self.refu is None:
+                if self.trajf is None:
+                    self.refu = mda.Universe(self.structf)
+                else:
+                    self.refu = mda.Universe(self.structf, self.trajf)
+            self.refu.trajectory[self.tstep]
+
+            # Merge with entries written by other jobs since loading, then replace atomically
+            cache = self.load()
+            for selection in missing:
+                cache[self.selection_key(selection)] = self.refu.select_atoms(selection).positions.copy()
+            try:
+                fd, tmpf = tempfile.mkstemp(suffix=".npz", dir=os.path.dirname(self.cachef))
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, **cache)
+                os.replace(tmpf, self.cachef)
+            except OSError as e:
+                warnings.warn("Could not write reference cache file {}: {}".format(self.cachef, e))
+
+        return {selection: cache[self.selection_key(selection)] for selection in selections}
+
+
 class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
     """
     Calculates order parameters along a GROMACS simulation trajectory.
@@ -41,20 +657,47 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
                                         help="Reference structure file (.gro) for RMSD (default: same as trajf)")
         self.opt_file_args.add_argument("-reftrajf",
                                         help="Reference trajectory file (.xtc) for RMSD (default: same as trajf if refstructf is not specified.)")
+        self.opt_file_args.add_argument("-refcachedir",
+                                        help="Directory to cache reference coordinates in, shared across jobs (default: directory of reference trajectory, or structure, file)")
 
-        self.calc_args.add_argument("-select",
-                                    help="Atoms/groups to track order parameters for (MDA selection string)")
-        self.calc_args.add_argument("-align",
-                                    help="Atoms/groups for aligning trajectories across timesteps (MDA selection string)")
+        self.calc_args.add_argument("-select", nargs='+',
+                                    help="Atoms/groups to track order parameters for (one or more MDA selection strings, default = protein)")
+        self.calc_args.add_argument("-align", nargs='+',
+                                    help="Atoms/groups for aligning trajectories across timesteps (one or more MDA selection strings, default = backbone)")
         self.calc_args.add_argument("-skip",
                                     help="Number of frames to skip between analyses (default = None)")
+        self.calc_args.add_argument("-blocksize",
+                                    help="Number of frames to align and analyse together with batched array operations (default = 1)")
+        self.calc_args.add_argument("-chunksize",
+                                    help="Number of frames of per-atom deviations to buffer in memory before writing to memory-mapped .npy file (default = 100)")
         self.calc_args.add_argument("-reftstep",
                                     help="Timestep to extract reference coordinates from reference trajectory file for RMSD and SF (default = 0)")
 
+        self.calc_args.add_argument("--pairwise",
+                                    action="store_true",
+                                    help="Calculate frame-by-frame pairwise RMSD matrix of selection (written to memory-mapped .npy file)")
+        self.calc_args.add_argument("-tilesize",
+                                    help="Number of frames per tile for pairwise RMSD matrix calculation (default = 500)")
+        self.calc_args.add_argument("-nworkers",
+                                    help="Number of worker processes for pairwise RMSD matrix calculation (default = 1)")
+        self.calc_args.add_argument("--shape",
+                                    action="store_true",
+                                    help="Calculate gyration tensor eigenvalues, asphericity, acylindricity and relative shape anisotropy of selection")
+        self.calc_args.add_argument("--dihedrals",
+                                    action="store_true",
+                                    help="Calculate backbone phi/psi dihedrals of all protein residues and assign secondary structure (H/E/C) at each frame")
+        self.calc_args.add_argument("--rmsf",
+                                    action="store_true",
+                                    help="Calculate RMSF, mean structure and per-atom variance between obsstart and obsend with a streaming accumulator")
+
         self.out_args.add_argument("--genpdb",
                                    action="store_true",
                                    help="Write per-atom deviations data to pdb file")
 
+        self.observables = []
+        self.blocksize = 1
+        self.verbose = False
+
         self.misc_args.add_argument("--verbose",
                                     action="store_true",
                                     help="Display progress")
@@ -84,22 +727,15 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
         self.refstructf = self.args.refstructf
         self.reftrajf = self.args.reftrajf
 
-        if self.refstructf is not None and self.reftrajf is not None:
-            self.refu = mda.Universe(self.refstructf, self.reftrajf)
-        elif self.refstructf is not None and self.reftrajf is None:
-            self.refu = mda.Universe(self.refstructf)
-        elif self.refstructf is None and self.reftrajf is not None:
-            self.refu = mda.Universe(self.structf, self.reftrajf)
-        else:
-            self.refu = mda.Universe(self.structf, self.trajf)
-
-        self.select = self.args.select
-        if self.select is None:
-            self.select = 'protein'
+        self.selects = self.args.select
+        if self.selects is None:
+            self.selects = ['protein']
+        self.select = self.selects[0]
 
-        self.align = self.args.align
-        if self.align is None:
-            self.align = 'backbone'
+        self.aligns = self.args.align
+        if self.aligns is None:
+            self.aligns = ['backbone']
+        self.align = self.aligns[0]
 
         self.skip = self.args.skip
         if self.skip is not None:
@@ -107,15 +743,197 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
         else:
             self.skip = 1
 
+        self.blocksize = self.args.blocksize
+        if self.blocksize is not None:
+            self.blocksize = int(self.blocksize)
+        else:
+            self.blocksize = 1
+
+        self.chunksize = self.args.chunksize
+        if self.chunksize is not None:
+            self.chunksize = int(self.chunksize)
+        else:
+            self.chunksize = 100
+
         self.reftstep = self.args.reftstep
         if self.reftstep is not None:
             self.reftstep = int(self.reftstep)
         else:
             self.reftstep = 0
 
+        self.refcachedir = self.args.refcachedir
+
+        # Reference coordinates from a separate reference file are extracted once per
+        # (structure, trajectory, timestep, selection) and cached, so that the reference
+        # trajectory is only opened on a cache miss. If the reference is the analysed
+        # trajectory itself, they are read directly from the already open Universe.
+        if self.refstructf is not None and self.reftrajf is not None:
+            self.refu = ReferenceCache(self.refstructf, self.reftrajf, self.reftstep, self.refcachedir)
+        elif self.refstructf is not None and self.reftrajf is None:
+            self.refu = ReferenceCache(self.refstructf, None, self.reftstep, self.refcachedir)
+        elif self.refstructf is None and self.reftrajf is not None:
+            self.refu = ReferenceCache(self.structf, self.reftrajf, self.reftstep, self.refcachedir)
+        else:
+            self.refu = self.u
+
+        self.shape = self.args.shape
+        self.dihedrals = self.args.dihedrals
+        self.rmsf = self.args.rmsf
+
+        self.pairwise = self.args.pairwise
+
+        self.tilesize = self.args.tilesize
+        if self.tilesize is not None:
+            self.tilesize = int(self.tilesize)
+        else:
+            self.tilesize = 500
+
+        self.nworkers = self.args.nworkers
+        if self.nworkers is not None:
+            self.nworkers = int(self.nworkers)
+        else:
+            self.nworkers = 1
         self.genpdb = self.args.genpdb
         self.verbose = self.args.verbose
 
+    ###################################################
+    # Fused single-pass calculation of observables    #
+    ###################################################
+
+    def register_observable(self, name, func, selection, alignment=None, labels=None):
+        """
+        Registers a user-supplied per-frame observable to be calculated along with
+        Rg, RMSD and deviations, in the same pass over the trajectory. Its TimeSeries is saved to
+        `{opref}_{name}.pkl`.
+
+        Args:
+            name (str): Name of observable.
+            func (callable): Function `func(sel, coords, refcoords)` computing observable (see FrameObservable).
+            selection (str): MDAnalysis selection string, or key of selection parser.
+            alignment (str): MDAnalysis selection string, or key of selection parser, of alignment group
+                (default = None, no alignment).
+            labels (list): TimeSeries labels (default = [name]).
+        """
+        selection = self.selection_parser.get(selection, selection)
+        if alignment is not None:
+            alignment = self.selection_parser.get(alignment, alignment)
+        self.observables.append(FrameObservable(name, func, selection, alignment, labels))
+
+    def reference_positions(self, refu, reftstep, selections):
+        """
+        Returns reference coordinates of selections.
+
+        Args:
+            refu (mda.Universe or ReferenceCache): Reference Universe object, or reference coordinates cache.
+            reftstep (int): Reference timestep to extract reference coordinates from (ignored for ReferenceCache).
+            selections (list): List of MDAnalysis selection strings.
+
+        Returns:
+            Dictionary mapping each selection string to array of shape (N, 3) containing reference coordinates.
+        """
+        if isinstance(refu, ReferenceCache):
+            return refu.positions(selections)
+        refu.trajectory[reftstep]
+        return {selection: refu.select_atoms(selection).positions.copy() for selection in selections}
+
+    def calc_observables(self, u, refu, reftstep, skip, observables, blocksize=None):
+        """
+        Calculates any number of per-frame observables in a single pass over the trajectory.
+
+        Each frame is read once, and the alignment of each distinct alignment group is
+        calculated once per frame and shared between all observables using it.
+
+        If blocksize > 1, coordinates of blocks of frames are loaded into (F, N, 3) arrays,
+        all F alignments are calculated with a batched SVD, and observables are computed
+        for the whole block with array operations.
+
+        Args:
+            u (mda.Universe): Universe object.
+            refu (mda.Universe or ReferenceCache): Reference Universe object, or reference coordinates cache
+                (only required if an observable uses alignment).
+            reftstep (int): Reference timestep to extract reference coordinates from (ignored for ReferenceCache,
+                which is keyed by its own timestep).
+            skip (int): Resampling interval.
+            observables (list): List of FrameObservable objects.
+            blocksize (int): Number of frames per block (default = self.blocksize).
+
+        Returns:
+            Array containing times of frames. Values are stored in each observable.
+        """
+        if blocksize is None:
+            blocksize = self.blocksize
+
+        utraj = u.trajectory[0::skip]
+
+        # Extract reference coordinates before reading trajectory
+        refselections = set()
+        for obs in observables:
+            if obs.alignment is not None:
+                refselections.update([obs.selection, obs.alignment])
+        refpositions = {}
+        if len(refselections) > 0:
+            refpositions = self.reference_positions(refu, reftstep, sorted(refselections))
+
+        times = np.zeros(len(utraj))
+
+        alignments = {}
+        for obs in observables:
+            sel = u.select_atoms(obs.selection)
+            refcoords = None
+            if obs.alignment is not None:
+                if obs.alignment not in alignments:
+                    alignments[obs.alignment] = FrameAlignment(u.select_atoms(obs.alignment),
+                                                               refpositions[obs.alignment].copy())
+                refcoords = refpositions[obs.selection] - alignments[obs.alignment].aligninitcog
+            obs.setup(sel, refcoords, times)
+
+        if self.verbose:
+            pbar = tqdm(desc="Calculating order parameters", total=len(utraj))
+
+        if blocksize > 1:
+            # Buffers for coordinates of each distinct atom group over a block of frames
+            groups = {}
+            for alignment in alignments.values():
+                groups[alignment.align.indices.tobytes()] = alignment.align
+            for obs in observables:
+                groups[obs.sel.indices.tobytes()] = obs.sel
+            buffers = {key: np.zeros((blocksize, len(ag), 3)) for key, ag in groups.items()}
+
+            nbuf = 0
+            for tidx, ts in enumerate(utraj):
+                times[tidx] = ts.time
+                for key, ag in groups.items():
+                    buffers[key][nbuf] = ag.positions
+                nbuf += 1
+
+                if nbuf == blocksize or tidx == len(utraj) - 1:
+                    for alignment in alignments.values():
+                        alignment.update_block(buffers[alignment.align.indices.tobytes()][:nbuf])
+                    for obs in observables:
+                        coords = buffers[obs.sel.indices.tobytes()][:nbuf]
+                        if obs.alignment is not None:
+                            coords = alignments[obs.alignment].transform_block(coords)
+                        obs.update_block(tidx - nbuf + 1, coords)
+                    if self.verbose:
+                        pbar.update(nbuf)
+                    nbuf = 0
+
+            return times
+
+        for tidx, ts in enumerate(utraj):
+            times[tidx] = ts.time
+            for alignment in alignments.values():
+                alignment.update()
+            for obs in observables:
+                coords = obs.sel.positions
+                if obs.alignment is not None:
+                    coords = alignments[obs.alignment].transform(coords)
+                obs.update(tidx, coords)
+            if self.verbose:
+                pbar.update(1)
+
+        return times
+
     ###################################################
     # Weighted radius of gyration                     #
     # Rg(t)                                           #
@@ -163,42 +981,102 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
         Returns:
             TimeSeries object containing Rg values along trajectory.
         """
-        times = []
-        Rgs = []
-        sel = u.select_atoms(selection)
-        for ts in u.trajectory[0::skip]:
-            Rgval = self.calc_Rg_worker(sel.positions, sel.masses)
-            times.append(ts.time)
-            Rgs.append(Rgval)
-        ts_Rg = timeseries.TimeSeries(np.array(times), np.array(Rgs),
-                                      labels=['Rg'])
-        return ts_Rg
-
-    def plot_Rg(self, ts_Rg):
+        obs = self.Rg_observable(selection)
+        times = self.calc_observables(u, None, None, skip, [obs])
+        return obs.result(times)
+
+    def Rg_observable(self, selection):
+        """
+        Returns:
+            FrameObservable calculating radius of gyration of selection.
+        """
+        def Rg_func(sel, coords, refcoords):
+            return self.calc_Rg_worker(coords, sel.masses)
+
+        def Rg_block_func(sel, coords, refcoords):
+            masses = sel.masses
+            com = np.einsum('fni,n->fi', coords, masses) / np.sum(masses)
+            sq_distances = np.sum((coords - com[:, np.newaxis, :])**2, axis=2)
+            return np.sqrt(np.dot(sq_distances, masses) / np.sum(masses))
+
+        return FrameObservable("Rg", Rg_func, selection, labels=['Rg'], block_func=Rg_block_func)
+
+    def shape_observable(self, selection):
+        """
+        Returns:
+            FrameObservable calculating mass-weighted gyration tensor shape descriptors of selection
+            (columns given by SHAPE_DESCRIPTORS).
+        """
+        def shape_func(sel, coords, refcoords):
+            return gyration_tensor_descriptors(coords[np.newaxis, :, :], sel.masses)[0]
+
+        def shape_block_func(sel, coords, refcoords):
+            return gyration_tensor_descriptors(coords, sel.masses)
+
+        return FrameObservable("shape", shape_func, selection, labels=['Shape descriptor', 'Descriptor'],
+                               block_func=shape_block_func)
+
+    def calc_shape(self, u, skip, selection):
+        """
+        Calculates gyration tensor eigenvalues and shape descriptors of selection along trajectory.
+
+        Args:
+            u (mda.Universe): Universe.
+            skip (int): Resampling interval.
+            selection (str): MDAnalysis selection string.
+
+        Returns:
+            2-D TimeSeries object containing shape descriptors (columns given by SHAPE_DESCRIPTORS)
+            along trajectory.
+        """
+        obs = self.shape_observable(selection)
+        times = self.calc_observables(u, None, None, skip, [obs])
+        return obs.result(times)
+
+    def plot_shape(self, ts_shape, name="shape"):
+        """Plots gyration tensor eigenvalues and shape descriptors, and saves figure to file."""
+        fig, axs = plt.subplots(2, 1, sharex=True)
+        for col in range(1, 4):
+            axs[0].plot(ts_shape.time_array, ts_shape.data_array[:, col], label=SHAPE_DESCRIPTORS[col])
+        axs[0].set_ylabel(r"Eigenvalue ($\AA^2$)")
+        axs[0].legend()
+        for col in range(4, 7):
+            axs[1].plot(ts_shape.time_array, ts_shape.data_array[:, col], label=SHAPE_DESCRIPTORS[col])
+        axs[1].set_xlabel("Time")
+        axs[1].set_ylabel("Descriptor")
+        axs[1].legend()
+        fig.set_dpi(300)
+        self.save_figure(fig, suffix=name)
+        if self.show:
+            plt.show()
+        else:
+            plt.close()
+
+    def plot_Rg(self, ts_Rg, name="Rg"):
         """Plots Rg and saves figure to file."""
         fig = ts_Rg.plot()
         fig.set_dpi(300)
-        self.save_figure(fig, suffix="Rg")
+        self.save_figure(fig, suffix=name)
         if self.show:
             plt.show()
         else:
             plt.close()
 
-    def plot_ma_Rg(self, ts_Rg, window):
+    def plot_ma_Rg(self, ts_Rg, window, name="Rg"):
         """Plots moving average Rg and saves figure to file."""
         fig = ts_Rg.moving_average(window=window).plot()
         fig.set_dpi(300)
-        self.save_figure(fig, suffix="ma_Rg")
+        self.save_figure(fig, suffix="ma_" + name)
         if self.show:
             plt.show()
         else:
             plt.close()
 
-    def plot_cma_Rg(self, ts_Rg):
+    def plot_cma_Rg(self, ts_Rg, name="Rg"):
         """Plots cumulative moving average Rg and saves figure to file."""
         fig = ts_Rg.cumulative_moving_average().plot()
         fig.set_dpi(300)
-        self.save_figure(fig, suffix="cma_Rg")
+        self.save_figure(fig, suffix="cma_" + name)
         if self.show:
             plt.show()
         else:
@@ -279,7 +1157,7 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
 
         Args:
             u (mda.Universe): Universe object.
-            refu (mda.Universe): Reference Universe object.
+            refu (mda.Universe or ReferenceCache): Reference Universe object, or reference coordinates cache.
             reftstep (int): Reference timestep to calculate RMSD from.
             skip (int): Resampling interval.
             selection (mda.AtomGroup): MDAnalysis AtomGroup object containing atoms
@@ -290,56 +1168,58 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
         Returns:
             TimeSeries object containing RMSD values along trajectory.
         """
-        sel = u.select_atoms(selection)
-        refsel = refu.select_atoms(selection)
-        align = u.select_atoms(alignment)
-        refalign = refu.select_atoms(alignment)
+        obs = self.RMSD_observable(selection, alignment)
+        times = self.calc_observables(u, refu, reftstep, skip, [obs])
+        return obs.result(times)
 
-        refu.trajectory[reftstep]
-        initpos = refsel.positions.copy()
-        aligninitpos = refalign.positions.copy()
-
-        times = []
-        RMSDs = []
-        for ts in u.trajectory[0::skip]:
-            RMSDval = self.calc_RMSD_worker(initpos, sel.positions, aligninitpos, align.positions)
-            times.append(ts.time)
-            RMSDs.append(RMSDval)
-        return timeseries.TimeSeries(np.array(times), np.array(RMSDs), labels=['RMSD'])
-
-    def plot_RMSD(self, ts_RMSD):
+    def RMSD_observable(self, selection, alignment):
+        """
+        Returns:
+            FrameObservable calculating (unweighted) RMSD of selection from reference, after alignment.
+        """
+        def RMSD_func(sel, coords, refcoords):
+            return np.sqrt(np.mean(np.sum((coords - refcoords)**2, axis=-1), axis=-1))
+        return FrameObservable("RMSD", RMSD_func, selection, alignment, labels=['RMSD'], block_func=RMSD_func)
+
+    def plot_RMSD(self, ts_RMSD, select=None, align=None):
         """Plots RMSD and saves figure to file."""
-        fig = ts_RMSD.plot(label="RMSD between {} atoms, using {} atoms for alignment".format(self.select, self.align))
+        select = self.select if select is None else select
+        align = self.align if align is None else align
+        fig = ts_RMSD.plot(label="RMSD between {} atoms, using {} atoms for alignment".format(select, align))
         ax = fig.gca()
         ax.legend()
         fig.set_dpi(300)
-        self.save_figure(fig, suffix="RMSD_" + self.align + "_" + self.select)
+        self.save_figure(fig, suffix="RMSD_" + align + "_" + select)
         if self.show:
             plt.show()
         else:
             plt.close()
 
-    def plot_ma_RMSD(self, ts_RMSD, window):
+    def plot_ma_RMSD(self, ts_RMSD, window, select=None, align=None):
         """Plots moving average RMSD and saves figure to file."""
+        select = self.select if select is None else select
+        align = self.align if align is None else align
         ts_RMSD_ma = ts_RMSD.moving_average(window=window)
-        fig = ts_RMSD_ma.plot(label="RMSD between {} atoms, using {} atoms for alignment".format(self.select, self.align))
+        fig = ts_RMSD_ma.plot(label="RMSD between {} atoms, using {} atoms for alignment".format(select, align))
         ax = fig.gca()
         ax.legend()
         fig.set_dpi(300)
-        self.save_figure(fig, suffix="ma_RMSD_" + self.align + "_" + self.select)
+        self.save_figure(fig, suffix="ma_RMSD_" + align + "_" + select)
         if self.show:
             plt.show()
         else:
             plt.close()
 
-    def plot_cma_RMSD(self, ts_RMSD):
+    def plot_cma_RMSD(self, ts_RMSD, select=None, align=None):
         """Plots cumulative moving average RMSD and saves figure to file."""
+        select = self.select if select is None else select
+        align = self.align if align is None else align
         ts_RMSD_cma = ts_RMSD.cumulative_moving_average()
-        fig = ts_RMSD_cma.plot(label="RMSD between {} atoms, using {} atoms for alignment".format(self.select, self.align))
+        fig = ts_RMSD_cma.plot(label="RMSD between {} atoms, using {} atoms for alignment".format(select, align))
         ax = fig.gca()
         ax.legend()
         fig.set_dpi(300)
-        self.save_figure(fig, suffix="cma_RMSD_" + self.align + "_" + self.select)
+        self.save_figure(fig, suffix="cma_RMSD_" + align + "_" + select)
         if self.show:
             plt.show()
         else:
@@ -425,7 +1305,7 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
 
         Args:
             u (mda.Universe): Universe object.
-            refu (mda.Universe): Reference Universe object.
+            refu (mda.Universe or ReferenceCache): Reference Universe object, or reference coordinates cache.
             reftstep (int): Reference timestep to calculate RMSD from.
             skip (int): Resampling interval.
             selection (mda.AtomGroup): MDAnalysis AtomGroup object containing atoms
@@ -436,34 +1316,48 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
         Returns:
             2-D TimeSeries object containing deviation values along trajectory.
         """
-        sel = u.select_atoms(selection)
-        refsel = refu.select_atoms(selection)
-        align = u.select_atoms(alignment)
-        refalign = refu.select_atoms(alignment)
+        obs = self.deviations_observable(selection, alignment)
+        times = self.calc_observables(u, refu, reftstep, skip, [obs])
+        return obs.result(times)
 
-        refu.trajectory[reftstep]
-        initpos = refsel.positions.copy()
-        aligninitpos = refalign.positions.copy()
-
-        times = []
-        deviations = []
-        for ts in u.trajectory[0::skip]:
-            times.append(ts.time)
-            deviation = self.calc_deviation_worker(initpos, sel.positions, aligninitpos, align.positions)
-            deviations.append(deviation)
-        return timeseries.TimeSeries(np.array(times), np.array(deviations), labels=['Deviation', 'Atom index'])
-
-    def plot_deviations(self, ts_deviations):
-        """Plots deviations as a 2D heatmap."""
-        fig = ts_deviations.plot_2d_heatmap(cmap='hot')
+    def deviations_observable(self, selection, alignment, outf=None, chunksize=100):
+        """
+        Args:
+            selection (str): MDAnalysis selection string.
+            alignment (str): MDAnalysis selection string of alignment group.
+            outf (str): Path of .npy file to write float32 deviations to progressively, in chunks of
+                `chunksize` frames (default = None, store deviations in memory).
+            chunksize (int): Number of frames per chunk (default = 100).
+
+        Returns:
+            FrameObservable calculating per-atom deviations of selection from reference, after alignment.
+        """
+        def deviations_func(sel, coords, refcoords):
+            return np.sqrt(np.sum((coords - refcoords)**2, axis=-1))
+        if outf is not None:
+            return MemmapFrameObservable("deviations", deviations_func, selection, outf, alignment,
+                                         labels=['Deviation', 'Atom index'], block_func=deviations_func,
+                                         chunksize=chunksize)
+        return FrameObservable("deviations", deviations_func, selection, alignment,
+                               labels=['Deviation', 'Atom index'], block_func=deviations_func)
+
+    def plot_deviations(self, ts_deviations, select=None, align=None, maxpoints=1000):
+        """
+        Plots deviations as a 2D heatmap (resampled to at most maxpoints frames, so that only
+        the plotted frames of memory-mapped deviations are read).
+        """
+        select = self.select if select is None else select
+        align = self.align if align is None else align
+        stride = max(1, int(np.ceil(len(ts_deviations) / maxpoints)))
+        fig = ts_deviations[::stride].plot_2d_heatmap(cmap='hot')
         fig.set_dpi(300)
-        self.save_figure(fig, suffix="deviations_" + self.align + "_" + self.select)
+        self.save_figure(fig, suffix="deviations_" + align + "_" + select)
         if self.show:
             plt.show()
         else:
             plt.close()
 
-    def write_deviations_pdb(self, u, select, skip, ts_deviations):
+    def write_deviations_pdb(self, u, select, skip, ts_deviations, pdbtrj=None):
         """
         Writes per-atom-deviations to PDB file.
 
@@ -472,6 +1366,7 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
             select (str): MDAnalysis selection string describing atoms deviations are computed for.
             skip (int): Trajectory resampling interval.
             ts_deviations (TimeSeries): Atom deviations timeseries data.
+            pdbtrj (str): Path of PDB file to write (default = [opref]_deviations_[align]_[select].pdb).
 
         Raises:
             ValueError if the time for the same index in u.trajectory[::skip]
@@ -479,7 +1374,8 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
         """
         protein_subselection = u.select_atoms(select)
         u.add_TopologyAttr('tempfactors')
-        pdbtrj = self.opref + "_deviations_" + self.align + "_" + self.select + ".pdb"
+        if pdbtrj is None:
+            pdbtrj = self.opref + "_deviations_" + self.align + "_" + self.select + ".pdb"
 
         utraj = u.trajectory[::skip]
 
@@ -496,39 +1392,347 @@ class OrderParamsAnalysis(timeseries.TimeSeriesAnalysis):
                 else:
                     raise ValueError("Trajectory and TimeSeries times do not match at same index.")
 
+    ###################################################
+    # Backbone dihedrals and secondary structure      #
+    # phi_r(t), psi_r(t), SS_r(t)                     #
+    ###################################################
+
+    def calc_backbone_dihedrals(self, u, skip, selection="protein"):
+        """
+        Calculates backbone phi and psi dihedrals of all residues in selection along trajectory.
+
+        Args:
+            u (mda.Universe): Universe.
+            skip (int): Resampling interval.
+            selection (str): MDAnalysis selection string of residues (default = protein).
+
+        Returns:
+            3-D TimeSeries object containing dihedrals (in degrees) of shape (frames, 2, residues),
+            with phi along [:, 0, :] and psi along [:, 1, :].
+        """
+        obs = BackboneDihedralsObservable(selection)
+        times = self.calc_observables(u, None, None, skip, [obs])
+        return obs.result(times)
+
+    def calc_secondary_structure(self, ts_dihedrals):
+        """
+        Assigns secondary structure to each residue at each frame from backbone dihedrals
+        (see `assign_secondary_structure`), and calculates secondary structure content.
+
+        Args:
+            ts_dihedrals (TimeSeries): Backbone dihedrals TimeSeries from `calc_backbone_dihedrals`.
+
+        Returns:
+            {
+                ts_ss (TimeSeries): 2-D TimeSeries containing secondary structure codes (indices into
+                    SS_CODES) of shape (frames, residues).
+                ts_ss_content (TimeSeries): 2-D TimeSeries containing fraction of residues in each
+                    secondary structure of shape (frames, len(SS_CODES)).
+            }
+        """
+        ss = assign_secondary_structure(ts_dihedrals.data_array[:, 0, :], ts_dihedrals.data_array[:, 1, :])
+        ss_content = np.stack([np.mean(ss == code, axis=1) for code in range(len(SS_CODES))], axis=1)
+        ts_ss = timeseries.TimeSeries(ts_dihedrals.time_array, ss, labels=['Secondary structure', 'Residue index'])
+        ts_ss_content = timeseries.TimeSeries(ts_dihedrals.time_array, ss_content, labels=['Fraction of residues', 'Secondary structure'])
+        return ts_ss, ts_ss_content
+
+    def plot_secondary_structure(self, ts_ss, ts_ss_content):
+        """Plots per-residue secondary structure as a heatmap and secondary structure content, and saves figures to file."""
+        fig, ax = plt.subplots()
+        cmap = matplotlib.colors.ListedColormap(['k', 'b', 'c'])
+        im = ax.imshow(ts_ss.data_array, origin='lower', aspect='auto', cmap=cmap, vmin=-0.5, vmax=len(SS_CODES) - 0.5,
+                       extent=[-0.5, ts_ss.data_array.shape[1] - 0.5, ts_ss.time_array[0], ts_ss.time_array[-1]],
+                       interpolation='nearest')
+        cbar = fig.colorbar(im, ax=ax, ticks=range(len(SS_CODES)))
+        cbar.ax.set_yticklabels(SS_CODES)
+        ax.set_xlabel("Residue index")
+        ax.set_ylabel("Time (ps)")
+        fig.set_dpi(300)
+        self.save_figure(fig, suffix="secondary_structure")
+        if self.show:
+            plt.show()
+        else:
+            plt.close()
+
+        fig, ax = plt.subplots()
+        for code, label in enumerate(SS_CODES):
+            ax.plot(ts_ss_content.time_array, ts_ss_content.data_array[:, code], label=label)
+        ax.set_xlabel("Time (ps)")
+        ax.set_ylabel("Fraction of residues")
+        ax.legend()
+        fig.set_dpi(300)
+        self.save_figure(fig, suffix="ss_content")
+        if self.show:
+            plt.show()
+        else:
+            plt.close()
+
+    ###################################################
+    # Pairwise RMSD matrix                            #
+    # RMSD(t_i, t_j)                                  #
+    ###################################################
+
+    def calc_pairwise_RMSD(self, u, skip, selection, outf, tilesize=500, nworkers=1):
+        """
+        Calculates the (unweighted) RMSD after optimal superposition between all pairs of frames
+        u.trajectory[0::skip] of `selection`, and writes the symmetric matrix to a memory-mapped .npy file.
+
+        Centered coordinates are first written to a temporary memory-mapped file, so that
+        only one tile of frames is held in memory per worker. Tiles of the upper triangle of the
+        matrix are spread across a process pool.
+
+        Args:
+            u (mda.Universe): Universe object.
+            skip (int): Resampling interval.
+            selection (str): MDAnalysis selection string.
+            outf (str): Path of .npy file to write pairwise RMSD matrix to.
+            tilesize (int): Number of frames per tile (default = 500).
+            nworkers (int): Number of worker processes (default = 1).
+
+        Returns:
+            {
+                times (np.array): Times of frames.
+                pairwise_RMSD (np.memmap): Memory-mapped array of shape (nframes, nframes)
+                    containing pairwise RMSDs.
+            }
+        """
+        sel = u.select_atoms(selection)
+        utraj = u.trajectory[0::skip]
+        nframes = len(utraj)
+
+        # Write centered coordinates to temporary memory-mapped file
+        coordsf = os.path.splitext(outf)[0] + "_coords.npy"
+        try:
+            coords = np.lib.format.open_memmap(coordsf, mode='w+', dtype=np.float32, shape=(nframes, len(sel), 3))
+            times = np.zeros(nframes)
+            for tidx, ts in enumerate(utraj):
+                times[tidx] = ts.time
+                pos = sel.positions
+                coords[tidx] = pos - np.mean(pos, axis=0)
+            coords.flush()
+            del coords
+
+            pairwise_RMSD = np.lib.format.open_memmap(outf, mode='w+', dtype=np.float32, shape=(nframes, nframes))
+            pairwise_RMSD.flush()
+
+            tasks = []
+            for istart in range(0, nframes, tilesize):
+                for jstart in range(istart, nframes, tilesize):
+                    tasks.append((coordsf, outf, istart, min(istart + tilesize, nframes),
+                                  jstart, min(jstart + tilesize, nframes)))
+
+            if self.verbose:
+                pbar = tqdm(desc="Calculating pairwise RMSD tiles", total=len(tasks))
+
+            with Pool(processes=nworkers) as pool:
+                for _ in pool.imap_unordered(_pairwise_RMSD_worker, tasks):
+                    if self.verbose:
+                        pbar.update(1)
+        finally:
+            # Temporary coordinates can be as large as the trajectory, so are removed even on errors
+            if os.path.exists(coordsf):
+                os.remove(coordsf)
+
+        return times, np.load(outf, mmap_mode='r')
+
+    def plot_pairwise_RMSD(self, times, pairwise_RMSD, maxpoints=1000, select=None):
+        """
+        Plots pairwise RMSD matrix as a heatmap (resampled to at most maxpoints x maxpoints)
+        and saves figure to file.
+        """
+        select = self.select if select is None else select
+        stride = max(1, int(np.ceil(len(times) / maxpoints)))
+        fig, ax = plt.subplots()
+        im = ax.imshow(np.array(pairwise_RMSD[::stride, ::stride]), origin="lower", cmap="hot",
+                       extent=[times[0], times[-1], times[0], times[-1]])
+        fig.colorbar(im, label=r"RMSD ($\AA$)")
+        ax.set_xlabel("Time (ps)")
+        ax.set_ylabel("Time (ps)")
+        fig.set_dpi(300)
+        self.save_figure(fig, suffix="pairwise_RMSD_" + select)
+        if self.show:
+            plt.show()
+        else:
+            plt.close()
+
+    ###################################################
+    # Streaming root mean square fluctuations         #
+    # RMSF_i                                          #
+    ###################################################
+
+    def save_RMSF(self, RMSF_acc, select=None, align=None):
+        """
+        Saves RMSF, RMS deviation from reference, mean structure and per-atom variance from
+        streaming accumulator to file.
+
+        Args:
+            RMSF_acc (RMSFAccumulator): Accumulator after pass over trajectory.
+            select (str): Selection name used in file names (default = self.select).
+            align (str): Alignment name used in file names (default = self.align).
+
+        Returns:
+            Array of shape (3, N) containing atom indices, RMSF and RMS deviation from reference.
+        """
+        select = self.select if select is None else select
+        align = self.align if align is None else align
+        RMSF, RMSD_ref, mean, variance = RMSF_acc.result()
+        RMSF_data = np.vstack((RMSF_acc.sel.indices, RMSF, RMSD_ref))
+        suffix = "_" + align + "_" + select + ".npy"
+        np.save(self.opref + "_RMSF" + suffix, RMSF_data)
+        np.save(self.opref + "_mean_structure" + suffix, mean)
+        np.save(self.opref + "_variance" + suffix, variance)
+        return RMSF_data
+
+    def plot_RMSF(self, RMSF_data, select=None, align=None):
+        """Plots RMSF and RMS deviation from reference per atom, and saves figure to file."""
+        select = self.select if select is None else select
+        align = self.align if align is None else align
+        fig, ax = plt.subplots()
+        ax.plot(RMSF_data[1, :], label="RMSF")
+        ax.plot(RMSF_data[2, :], label="RMS deviation from reference")
+        ax.set_xlabel("Atom")
+        ax.set_ylabel(r"RMSF ($\AA$)")
+        ax.legend()
+        fig.set_dpi(300)
+        self.save_figure(fig, suffix="RMSF_" + align + "_" + select)
+        if self.show:
+            plt.show()
+        else:
+            plt.close()
+
+    def selection_name(self, name, select):
+        """
+        Returns:
+            Name of output files of per-selection observable `name` (e.g. Rg) for `select`, which
+            is `name` when a single selection is analysed and "[name]_[select]" otherwise.
+        """
+        if len(self.selects) == 1:
+            return name
+        return name + "_" + select
+
     def __call__(self):
         """Performs analysis."""
+        # All combinations of selections and alignment groups
+        combinations = [(select, align) for select in self.selects for align in self.aligns]
+
         # Retrieve value stored in parser if exists, else use as-is
-        mda_select = self.selection_parser.get(self.select, self.select)
-        mda_align = self.selection_parser.get(self.align, self.align)
+        mda_selects = {select: self.selection_parser.get(select, select) for select in self.selects}
+        mda_aligns = {align: self.selection_parser.get(align, align) for align in self.aligns}
 
         """Raw data"""
+        ts_Rg = {}
+        ts_shape = {}
+        ts_RMSD = {}
+        ts_deviations = {}
+        RMSF_data = {}
         if self.replot:
-            ts_Rg = self.load_TimeSeries(self.replotpref + "_Rg.pkl")
-            ts_RMSD = self.load_TimeSeries(self.replotpref + "_RMSD_" + self.align + "_" + self.select + ".pkl")
-            ts_deviations = self.load_TimeSeries(self.replotpref + "_deviations_" + self.align + "_" + self.select + ".pkl")
+            for select in self.selects:
+                ts_Rg[select] = self.load_TimeSeries(self.replotpref + "_" + self.selection_name("Rg", select) + ".pkl")
+                if self.shape:
+                    ts_shape[select] = self.load_TimeSeries(self.replotpref + "_" + self.selection_name("shape", select) + ".pkl")
+            if self.dihedrals:
+                ts_dihedrals = self.load_TimeSeries(self.replotpref + "_dihedrals.pkl")
+            for select, align in combinations:
+                ts_RMSD[(select, align)] = self.load_TimeSeries(self.replotpref + "_RMSD_" + align + "_" + select + ".pkl")
+                ts_deviations[(select, align)] = self.load_TimeSeries(self.replotpref + "_deviations_" + align + "_" + select + ".pkl")
+                if self.rmsf:
+                    RMSF_data[(select, align)] = np.load(self.replotpref + "_RMSF_" + align + "_" + select + ".npy")
         else:
-            ts_Rg = self.calc_Rg(self.u, self.skip, mda_select)
-            ts_RMSD = self.calc_RMSD(self.u, self.refu, self.reftstep, self.skip, mda_select, mda_align)
-            ts_deviations = self.calc_deviations(self.u, self.refu, self.reftstep, self.skip, mda_select, mda_align)
-
-        self.save_TimeSeries(ts_Rg, self.opref + "_Rg.pkl")
-        self.save_TimeSeries(ts_RMSD, self.opref + "_RMSD_" + self.align + "_" + self.select + ".pkl")
-        self.save_TimeSeries(ts_deviations, self.opref + "_deviations_" + self.align + "_" + self.select + ".pkl")
+            # Calculate all observables for all combinations in a single pass over the trajectory.
+            # Observables with the same alignment group share a single alignment per frame.
+            Rg_obs = {select: self.Rg_observable(mda_selects[select]) for select in self.selects}
+            shape_obs = {}
+            if self.shape:
+                shape_obs = {select: self.shape_observable(mda_selects[select]) for select in self.selects}
+            RMSD_obs = {}
+            deviations_obs = {}
+            RMSF_acc = {}
+            for select, align in combinations:
+                RMSD_obs[(select, align)] = self.RMSD_observable(mda_selects[select], mda_aligns[align])
+                deviations_obs[(select, align)] = self.deviations_observable(mda_selects[select], mda_aligns[align],
+                                                                             self.opref + "_deviations_" + align + "_" + select + ".npy",
+                                                                             self.chunksize)
+                if self.rmsf:
+                    RMSF_acc[(select, align)] = RMSFAccumulator(mda_selects[select], mda_aligns[align],
+                                                                self.obsstart, self.obsend)
+            observables = (list(Rg_obs.values()) + list(shape_obs.values()) + list(RMSD_obs.values()) + list(deviations_obs.values())
+                           + self.observables + list(RMSF_acc.values()))
+            if self.dihedrals:
+                dihedrals_obs = BackboneDihedralsObservable(self.selection_parser['protein'])
+                observables.append(dihedrals_obs)
+            times = self.calc_observables(self.u, self.refu, self.reftstep, self.skip, observables)
+
+            for select in self.selects:
+                ts_Rg[select] = Rg_obs[select].result(times)
+                if self.shape:
+                    ts_shape[select] = shape_obs[select].result(times)
+            for select, align in combinations:
+                ts_RMSD[(select, align)] = RMSD_obs[(select, align)].result(times)
+                ts_deviations[(select, align)] = deviations_obs[(select, align)].result(times)
+                if self.rmsf:
+                    RMSF_data[(select, align)] = self.save_RMSF(RMSF_acc[(select, align)], select, align)
+
+            if self.dihedrals:
+                ts_dihedrals = dihedrals_obs.result(times)
+
+            for obs in self.observables:
+                self.save_TimeSeries(obs.result(times), self.opref + "_" + obs.name + ".pkl")
+
+        for select in self.selects:
+            self.save_TimeSeries(ts_Rg[select], self.opref + "_" + self.selection_name("Rg", select) + ".pkl")
+            if self.shape:
+                self.save_TimeSeries(ts_shape[select], self.opref + "_" + self.selection_name("shape", select) + ".pkl")
+        for select, align in combinations:
+            self.save_TimeSeries(ts_RMSD[(select, align)], self.opref + "_RMSD_" + align + "_" + select + ".pkl")
+            self.save_TimeSeries(ts_deviations[(select, align)], self.opref + "_deviations_" + align + "_" + select + ".pkl")
+
+        if self.dihedrals:
+            ts_ss, ts_ss_content = self.calc_secondary_structure(ts_dihedrals)
+            self.save_TimeSeries(ts_dihedrals, self.opref + "_dihedrals.pkl")
+            self.save_TimeSeries(ts_ss, self.opref + "_secondary_structure.pkl")
+            self.save_TimeSeries(ts_ss_content, self.opref + "_ss_content.pkl")
 
         """Rg plots"""
-        self.plot_Rg(ts_Rg)
-        self.plot_ma_Rg(ts_Rg, self.window)
-        self.plot_cma_Rg(ts_Rg)
-
-        """RMSD plots"""
-        self.plot_RMSD(ts_RMSD)
-        self.plot_ma_RMSD(ts_RMSD, self.window)
-        self.plot_cma_RMSD(ts_RMSD)
-
-        """Per-atom deviations heatmap plot"""
-        self.plot_deviations(ts_deviations)
-
-        """Store per-atom deviations in PDB"""
-        if self.genpdb:
-            self.write_deviations_pdb(self.u, mda_select, self.skip, ts_deviations)
+        for select in self.selects:
+            self.plot_Rg(ts_Rg[select], self.selection_name("Rg", select))
+            self.plot_ma_Rg(ts_Rg[select], self.window, self.selection_name("Rg", select))
+            self.plot_cma_Rg(ts_Rg[select], self.selection_name("Rg", select))
+
+        """Shape descriptor plots"""
+        if self.shape:
+            for select in self.selects:
+                self.plot_shape(ts_shape[select], self.selection_name("shape", select))
+
+        """Secondary structure plots"""
+        if self.dihedrals:
+            self.plot_secondary_structure(ts_ss, ts_ss_content)
+
+        for select, align in combinations:
+            """RMSD plots"""
+            self.plot_RMSD(ts_RMSD[(select, align)], select, align)
+            self.plot_ma_RMSD(ts_RMSD[(select, align)], self.window, select, align)
+            self.plot_cma_RMSD(ts_RMSD[(select, align)], select, align)
+
+            """Per-atom deviations heatmap plot"""
+            self.plot_deviations(ts_deviations[(select, align)], select, align)
+
+            """RMSF plot"""
+            if self.rmsf:
+                self.plot_RMSF(RMSF_data[(select, align)], select, align)
+
+            """Store per-atom deviations in PDB"""
+            if self.genpdb:
+                self.write_deviations_pdb(self.u, mda_selects[select], self.skip, ts_deviations[(select, align)],
+                                          self.opref + "_deviations_" + align + "_" + select + ".pdb")
+
+        """Pairwise RMSD matrix"""
+        if self.pairwise:
+            for select in self.selects:
+                pairwisef = self.opref + "_pairwise_RMSD_" + select + ".npy"
+                if self.replot:
+                    times = ts_Rg[select].time_array
+                    pairwise_RMSD = np.load(self.replotpref + "_pairwise_RMSD_" + select + ".npy", mmap_mode='r')
+                else:
+                    times, pairwise_RMSD = self.calc_pairwise_RMSD(self.u, self.skip, mda_selects[select], pairwisef,
+                                                                   self.tilesize, self.nworkers)
+                self.plot_pairwise_RMSD(times, pairwise_RMSD, select=select)
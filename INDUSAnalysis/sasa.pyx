@@ -0,0 +1,316 @@
+"""
+Class for calculating per-atom solvent accessible surface areas (SASA) along GROMACS
+simulation trajectory, using the Shrake-Rupley algorithm.
+"""
+
+from multiprocessing import Pool
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import MDAnalysis as mda
+from MDAnalysis.lib.distances import capped_distance
+from MDAnalysis.topology.guessers import guess_atom_element
+from MDAnalysis.topology.tables import vdwradii
+
+from tqdm import tqdm
+
+from INDUSAnalysis import timeseries
+
+"""Cython"""
+cimport numpy as np
+
+
+def sphere_points(npoints):
+    """
+    Generates approximately uniformly distributed points on the unit sphere using
+    the golden section spiral.
+
+    Args:
+        npoints (int): Number of points.
+
+    Returns:
+        Array of shape (npoints, 3) containing points on unit sphere.
+    """
+    k = np.arange(npoints) + 0.5
+    z = 1 - 2 * k / npoints
+    r = np.sqrt(1 - z**2)
+    theta = np.pi * (3 - np.sqrt(5)) * k
+    return np.column_stack((r * np.cos(theta), r * np.sin(theta), z))
+
+
+def atom_radii(sel):
+    """
+    Returns van der Waals radii of atoms, from elements if present in topology, else
+    guessed from atom names.
+
+    Args:
+        sel (mda.AtomGroup): Atom group.
+
+    Returns:
+        Array of shape (N,) containing radii, in A.
+
+    Raises:
+        ValueError if no van der Waals radius is known for an element.
+    """
+    if hasattr(sel, 'elements'):
+        elements = [element.upper() for element in sel.elements]
+    else:
+        elements = [guess_atom_element(name) for name in sel.names]
+    radii = np.zeros(len(elements))
+    for idx, element in enumerate(elements):
+        if element not in vdwradii:
+            raise ValueError("No van der Waals radius known for element {} of atom {}".format(element, sel[idx].name))
+        radii[idx] = vdwradii[element]
+    return radii
+
+
+def calc_SASA_frame(coords, radii, points, probe_radius=1.4, chunksize=100000):
+    """
+    Calculates per-atom solvent accessible surface areas of a single frame with the
+    Shrake-Rupley algorithm.
+
+    Each atom's sphere of radius (r_i + probe_radius) is represented by the points
+    `points` scaled and translated onto it. A point is accessible if it does not lie
+    inside the expanded sphere of any other atom. Overlapping atom pairs are found with
+    a neighbor grid, so each atom is tested against nearby atoms only, and the point
+    occlusion tests of all pairs are vectorized (in chunks of pairs to bound memory).
+
+    Args:
+        coords (np.array): Array of shape (N, 3) containing coordinates.
+        radii (np.array): Array of shape (N,) containing van der Waals radii.
+        points (np.array): Array of shape (M, 3) containing points on unit sphere.
+        probe_radius (float): Solvent probe radius, in A (default = 1.4).
+        chunksize (int): Maximum number of atom pairs to test together (default = 100000).
+
+    Returns:
+        Array of shape (N,) containing SASA of each atom, in A^2.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    R = radii + probe_radius
+    natoms = len(coords)
+    occluded = np.zeros((natoms, len(points)), dtype=bool)
+
+    if natoms > 1:
+        pairs, distances = capped_distance(coords, coords, max_cutoff=2 * np.max(R), method='nsgrid')
+        i, j = pairs[:, 0], pairs[:, 1]
+        overlap = (i != j) & (distances < R[i] + R[j])
+        i, j = i[overlap], j[overlap]
+        order = np.argsort(i, kind='stable')
+        i, j = i[order], j[order]
+
+        for start in range(0, len(i), chunksize):
+            ci = i[start:start + chunksize]
+            cj = j[start:start + chunksize]
+            # Points on sphere of atom i relative to atom j, shape (P, M, 3)
+            rel = (coords[ci] - coords[cj])[:, np.newaxis, :] + R[ci][:, np.newaxis, np.newaxis] * points
+            inside = np.sum(rel**2, axis=2) < (R[cj]**2)[:, np.newaxis]
+            # Combine occlusion over neighbors of each atom (pairs are sorted by i)
+            atoms, starts = np.unique(ci, return_index=True)
+            occluded[atoms] |= np.logical_or.reduceat(inside, starts, axis=0)
+
+    accessible = 1 - np.mean(occluded, axis=1)
+    return 4 * np.pi * R**2 * accessible
+
+
+# Per-process state of SASA workers, set up once by _init_SASA_worker
+_worker = {}
+
+
+def _init_SASA_worker(universe, selection, radii, points, probe_radius):
+    """
+    Sets up process for frame-parallel SASA evaluation.
+
+    Args:
+        universe (mda.Universe or tuple): Universe, or (structf, trajf) to open Universe from.
+        selection (str): MDAnalysis selection string.
+        radii (np.array): Atom radii of selection.
+        points (np.array): Unit sphere points.
+        probe_radius (float): Solvent probe radius, in A.
+    """
+    if isinstance(universe, tuple):
+        universe = mda.Universe(*universe)
+    _worker.clear()
+    _worker.update(u=universe, sel=universe.select_atoms(selection), radii=radii, points=points,
+                   probe_radius=probe_radius)
+
+
+def _SASA_worker(frames):
+    """
+    Calculates per-atom SASA for a set of frames of the worker's Universe (for frame-parallel evaluation).
+
+    Args:
+        frames (np.array): Indices of frames.
+
+    Returns:
+        {
+            times (np.array): Times of frames.
+            SASA (np.array): Array of shape (len(frames), N) containing per-atom SASA.
+        }
+    """
+    u = _worker["u"]
+    sel = _worker["sel"]
+    times = np.zeros(len(frames))
+    SASA = np.zeros((len(frames), sel.n_atoms))
+    for fidx, frame in enumerate(frames):
+        ts = u.trajectory[frame]
+        times[fidx] = ts.time
+        SASA[fidx] = calc_SASA_frame(sel.positions, _worker["radii"], _worker["points"], _worker["probe_radius"])
+    return times, SASA
+
+
+class SASAAnalysis(timeseries.TimeSeriesAnalysis):
+    def __init__(self):
+        super().__init__()
+        self.req_file_args.add_argument("structf", help="Structure file (.gro, .tpr)")
+        self.req_file_args.add_argument("trajf", help="Compressed trajectory file (.xtc)")
+
+        self.calc_args.add_argument("-select", help="Atoms to calculate SASA for (MDA selection string, default = protein and not name H*)")
+        self.calc_args.add_argument("-probe", help="Solvent probe radius, in A (default = 1.4 A)")
+        self.calc_args.add_argument("-npoints", help="Number of points per atom sphere (default = 100)")
+        self.calc_args.add_argument("-skip", help="Number of frames to skip between analyses (default = 1)")
+        self.calc_args.add_argument("-nworkers", help="Number of worker processes to distribute frames over (default = 1)")
+        self.calc_args.add_argument("-framesperchunk", help="Number of frames per task sent to each worker process (default = 50)")
+
+        self.misc_args.add_argument("--verbose", action='store_true', help="Output progress of SASA calculation")
+
+        self.verbose = False
+
+    def read_args(self):
+        """
+        Stores arguments from TimeSeries `args` parameter in class variables.
+        """
+        super().read_args()
+        self.structf = self.args.structf
+        self.trajf = self.args.trajf
+
+        self.u = mda.Universe(self.structf, self.trajf)
+
+        self.select = self.args.select
+        if self.select is None:
+            self.select = "protein and not name H*"
+
+        self.probe = self.args.probe
+        if self.probe is not None:
+            self.probe = float(self.probe)
+        else:
+            self.probe = 1.4
+
+        self.npoints = self.args.npoints
+        if self.npoints is not None:
+            self.npoints = int(self.npoints)
+        else:
+            self.npoints = 100
+
+        self.skip = self.args.skip
+        if self.skip is not None:
+            self.skip = int(self.skip)
+        else:
+            self.skip = 1
+
+        self.nworkers = self.args.nworkers
+        if self.nworkers is not None:
+            self.nworkers = int(self.nworkers)
+        else:
+            self.nworkers = 1
+
+        self.framesperchunk = self.args.framesperchunk
+        if self.framesperchunk is not None:
+            self.framesperchunk = int(self.framesperchunk)
+        else:
+            self.framesperchunk = 50
+
+        self.verbose = self.args.verbose
+
+    def calc_trajSASA(self, u, selection, skip, probe_radius=1.4, npoints=100, nworkers=1, framesperchunk=50):
+        """
+        Calculates per-atom SASA of selection along trajectory.
+
+        Frames are split into chunks which are distributed over a process pool. Each worker
+        opens the trajectory once (or receives a copy of in-memory Universes once), and
+        tasks only contain frame indices.
+
+        Args:
+            u (mda.Universe): Universe.
+            selection (str): MDAnalysis selection string.
+            skip (int): Resampling interval.
+            probe_radius (float): Solvent probe radius, in A (default = 1.4).
+            npoints (int): Number of points per atom sphere (default = 100).
+            nworkers (int): Number of worker processes (default = 1).
+            framesperchunk (int): Number of frames per task (default = 50).
+
+        Returns:
+            2-D TimeSeries object containing per-atom SASA values (in A^2) along trajectory.
+        """
+        sel = u.select_atoms(selection)
+        radii = atom_radii(sel)
+        points = sphere_points(npoints)
+
+        frames = np.arange(len(u.trajectory))[::skip]
+        chunks = [frames[start:start + framesperchunk] for start in range(0, len(frames), framesperchunk)]
+
+        if self.verbose:
+            pbar = tqdm(desc="Calculating SASA", total=len(frames))
+
+        times = []
+        SASA = []
+        if nworkers == 1:
+            _init_SASA_worker(u, selection, radii, points, probe_radius)
+            for chunk in chunks:
+                chunk_times, chunk_SASA = _SASA_worker(chunk)
+                times.append(chunk_times)
+                SASA.append(chunk_SASA)
+                if self.verbose:
+                    pbar.update(len(chunk_times))
+            _worker.clear()
+        else:
+            # Workers reopen file-backed trajectories instead of receiving a pickled Universe
+            universe = u
+            if u.filename is not None and getattr(u.trajectory, "filename", None) is not None:
+                universe = (u.filename, u.trajectory.filename)
+            with Pool(processes=nworkers, initializer=_init_SASA_worker,
+                      initargs=(universe, selection, radii, points, probe_radius)) as pool:
+                for chunk_times, chunk_SASA in pool.imap(_SASA_worker, chunks):
+                    times.append(chunk_times)
+                    SASA.append(chunk_SASA)
+                    if self.verbose:
+                        pbar.update(len(chunk_times))
+
+        return timeseries.TimeSeries(np.concatenate(times), np.vstack(SASA), labels=['SASA', 'Atom index'])
+
+    def plot_total_SASA(self, ts_SASA):
+        """Plots total SASA of selection and saves figure to file."""
+        fig, ax = plt.subplots()
+        ax.plot(ts_SASA.time_array, ts_SASA.data_array.sum(axis=1))
+        ax.set_xlabel("Time (ps)")
+        ax.set_ylabel(r"Total SASA ($\AA^2$)")
+        fig.set_dpi(300)
+        self.save_figure(fig, suffix="total_SASA")
+        if self.show:
+            plt.show()
+        else:
+            plt.close()
+
+    def plot_SASA(self, ts_SASA):
+        """Plots per-atom SASA as a 2D heatmap and saves figure to file."""
+        fig = ts_SASA.plot_2d_heatmap(cmap='hot')
+        fig.set_dpi(300)
+        self.save_figure(fig, suffix="SASA")
+        if self.show:
+            plt.show()
+        else:
+            plt.close()
+
+    def __call__(self):
+        """Performs analysis."""
+        if self.replot:
+            ts_SASA = self.load_TimeSeries(self.replotpref + "_SASA.pkl")
+        else:
+            ts_SASA = self.calc_trajSASA(self.u, self.select, self.skip, self.probe, self.npoints,
+                                         self.nworkers, self.framesperchunk)
+
+        self.save_TimeSeries(ts_SASA, self.opref + "_SASA.pkl")
+
+        """Plots"""
+        self.plot_total_SASA(ts_SASA)
+        self.plot_SASA(ts_SASA)
@@ -2,6 +2,7 @@
 Defines classes for storing and analysing timeseries data.
 """
 import argparse
+import os
 import pickle
 import warnings
 
@@ -34,6 +35,10 @@ class TimeSeries:
         correct_contiguous (boolean): Ensure that for elements (i, i+1), the time at i+1 > time at i.
             If a pair is found such that the time at i+1 <= time at i, delete the preceding timeseries'
             data which is repeated. Useful for correcting INDUS outputs on restart from checkpoint. (Default=True)
+        copy (boolean): Copy data into a new array. If False, data is stored as-is, so that a memory-mapped
+            array (np.memmap) is read lazily. A TimeSeries with memory-mapped data is pickled with a reference
+            to the memory-mapped .npy file instead of the data itself. The .npy file is looked up in the directory
+            of the pickle file by `TimeSeriesAnalysis.load_TimeSeries`, so both can be moved together. (Default=True)
 
     Examples:
         >>> ts = TimeSeries([0, 100, 200], [10, 20, 10], ["Sample data"])
@@ -65,7 +70,7 @@ class TimeSeries:
         <TimeSeries object, ['Sample data'] with shape (6,), 6 time frames>
     """
 
-    def __init__(self, times, data, labels, correct_contiguous=True):
+    def __init__(self, times, data, labels, correct_contiguous=True, copy=True):
         """
         Creates time series class.
 
@@ -74,7 +79,10 @@ class TimeSeries:
             labels does not equal number of dimensions of data.
         """
         self._t = np.array(times)
-        self._x = np.array(data)
+        if copy:
+            self._x = np.array(data)
+        else:
+            self._x = data
         if self._t.shape[0] != self._x.shape[0]:
             raise ValueError("Time and data do not match along axis 0")
 
@@ -113,6 +121,45 @@ class TimeSeries:
     def __len__(self):
         return len(self._t)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_x_file', None)
+        state.pop('_x_path', None)
+        # Store reference to memory-mapped data file instead of data. The file name is resolved
+        # relative to the pickle file on loading; the original path is only a fallback for
+        # pickles which are not loaded from file (e.g. when passed between processes).
+        if isinstance(self._x, np.memmap):
+            state['_x_file'] = os.path.basename(self._x.filename)
+            state['_x_path'] = os.path.abspath(self._x.filename)
+            del state['_x']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if '_x_file' in state:
+            self._x = None
+            if os.path.exists(self._x_path):
+                self._x = np.load(self._x_path, mmap_mode='r')
+
+    def _load_data_file(self, dirname):
+        """
+        Memory-maps data of an unpickled TimeSeries from its .npy file in dirname, if present.
+
+        Args:
+            dirname (str): Directory to look up data file in.
+
+        Raises:
+            FileNotFoundError if data file is neither in dirname nor at its original path.
+        """
+        datafile = os.path.join(dirname, self._x_file)
+        if os.path.exists(datafile):
+            self._x = np.load(datafile, mmap_mode='r')
+        if self._x is None:
+            raise FileNotFoundError("Memory-mapped data file {} of TimeSeries not found in {} or at {}".format(
+                self._x_file, dirname, self._x_path))
+        del self._x_file
+        del self._x_path
+
     def __repr__(self):
         return "<{} object, {} with shape {}, {} time frames>".format(
             self.__class__.__name__, self._labels, self._x.shape, len(self._t))
@@ -166,11 +213,12 @@ class TimeSeries:
                 # Ensure that future searches start from this index
                 last_lookup = tidx
 
-        new_t = np.delete(self._t, list(set(delete_indices)), axis=0)
-        new_x = np.delete(self._x, list(set(delete_indices)), axis=0)
+        if len(delete_indices) > 0:
+            new_t = np.delete(self._t, list(set(delete_indices)), axis=0)
+            new_x = np.delete(self._x, list(set(delete_indices)), axis=0)
 
-        self._t = new_t
-        self._x = new_x
+            self._t = new_t
+            self._x = new_x
 
         if self._t.shape[0] != self._x.shape[0]:
             raise ValueError("Time and data do not match along axis 0")
@@ -526,10 +574,15 @@ class TimeSeriesAnalysis:
 
         Returns:
             TimeSeries object loaded from file
+
+        Raises:
+            FileNotFoundError if TimeSeries data is memory-mapped and its .npy file is missing.
         """
         with open(filename, 'rb') as f:
             tso = pickle.load(f)
-            return tso
+        if isinstance(tso, TimeSeries) and hasattr(tso, '_x_file'):
+            tso._load_data_file(os.path.dirname(os.path.abspath(filename)))
+        return tso
 
     def parse_args(self, args=None):
         """
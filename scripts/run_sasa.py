@@ -0,0 +1,22 @@
+"""Runs per-atom solvent accessible surface area analysis by creating, processing, and calling a
+SASAAnalysis object. Arguments are read from the command line."""
+
+from INDUSAnalysis import sasa
+from INDUSAnalysis.lib import profiling
+import matplotlib.pyplot as plt
+
+
+@profiling.timefunc
+def main():
+    warnings = "Proceed with caution: this script requires PBC-corrected protein structures!"
+    sa = sasa.SASAAnalysis()
+    sa.parse_args()
+    sa.read_args()
+    startup_string = "#### SASA Analysis ####\n" + warnings + "\n"
+    print(startup_string)
+    sa()
+    plt.close('all')
+
+
+if __name__ == "__main__":
+    main()
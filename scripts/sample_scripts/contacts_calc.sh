@@ -23,6 +23,18 @@ args=(
 -skip 2
 # Number of bins for histogram
 -bins 20
+# Calculate residue-level contact map instead of atom-level contact map (any/count)
+#-resmap any
+# Also calculate contact lifetimes, survival function and autocorrelation
+#--lifetimes
+
+# Calculate fraction of native contacts Q(t) instead of all contacts
+#--native
+# Structure file to extract native contacts from [default: frame -nativetstep of trajectory]
+#-nativestructf /path/to/native.gro
+# Switching function parameters for Q(t) (beta in 1/A, lambda)
+#-Qbeta 5.0
+#-Qlambda 1.8
 
 # Time to begin averaging at (in ps)
 -obsstart 500
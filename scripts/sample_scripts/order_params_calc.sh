@@ -11,15 +11,32 @@ args=(
 /path/to/traj.xtc
 # Reference trajectory file for alignment [default: same as trajectory file]
 #-reftrajf /path/to/reftraj.xtc
+# Directory to cache extracted reference coordinates in, shared across jobs [default: directory of reference trajectory, or reference structure, file]
+#-refcachedir /path/to/refcache
 # Timestep to read reference structure from
 -reftstep 0
 
-# Selection group to use for aligning structures
+# Selection group(s) to use for aligning structures
 -align backbone
-# Selection group to calculate RMSD for
+# Selection group(s) to calculate RMSD for (all select/align combinations are computed in one pass)
 -select heavy
+#-select backbone heavy side_chain_heavy
 # Interval (number of frames) to read trajctory when performing calculations
 -skip 2
+# Number of frames to align and analyse together (batched alignment)
+#-blocksize 100
+# Number of frames of per-atom deviations to buffer before writing to memory-mapped file
+#-chunksize 100
+# Calculate gyration tensor eigenvalues and shape descriptors
+#--shape
+# Calculate backbone phi/psi dihedrals and per-frame secondary structure (H/E/C)
+#--dihedrals
+# Calculate RMSF with streaming accumulator (between -obsstart and -obsend)
+#--rmsf
+# Calculate pairwise RMSD matrix between frames, in tiles across worker processes
+#--pairwise
+#-tilesize 500
+#-nworkers 8
 
 # Window (number of frames) for calculating smoothed averages
 -window 50
@@ -0,0 +1,51 @@
+#!/bin/bash
+
+# Script to run a per-atom solvent accessible surface area (SASA) post-processing calculation
+# using INDUSAnalysis
+
+# Arguments for run_sasa [Comment out]
+args=(
+# GROMACS structure (.gro)/portable run (.tpr) file
+/path/to/prod.tpr
+# GROMACS trajectory file
+/path/to/traj.xtc
+
+# Atoms to calculate SASA for
+-select "protein and not name H*"
+# Solvent probe radius (in A)
+-probe 1.4
+# Number of points per atom sphere
+-npoints 100
+# Interval (number of frames) to read trajctory when performing calculations
+-skip 2
+# Number of worker processes to distribute frames over
+#-nworkers 8
+# Number of frames per task sent to each worker process
+#-framesperchunk 50
+
+# Prefix of output image and data files
+-opref indus
+# Output format of image files
+-oformat png
+# DPI of image files
+-dpi 300
+
+# Replot from existing data (do not perform calculations)
+#--replot
+# Prefix of calculation files to replot data from
+#-replotpref indus
+
+# Show Matplotlib plots
+#--show
+# Perform calculations on remote cluster [=> use text-only Matplotlib backend]
+--remote
+# Output
+--verbose
+)
+
+# INDUSAnalysis root directory
+root_dir=~/analysis_scripts
+
+set -x
+
+python -u $root_dir/scripts/run_sasa.py "${args[@]}"
@@ -53,6 +53,45 @@ def test_contacts_alk_ua_r4_5_n0_poly():
     cts()
 
 
+@profiling.timefuncfile("test_exec_times.txt")
+def test_contacts_alk_ua_r4_5_n3_native():
+    if not os.path.exists('contacts_test_data'):
+        os.makedirs('contacts_test_data')
+
+    cts = contacts.ContactsAnalysis()
+    args = ['c30_poly.gro', 'c30_poly.xtc',
+            '-apsp_structf', 'c30.tpr',
+            '-method', 'alk-ua', '-distcutoff', '4.5', '-connthreshold', '3', '-skip', '1',
+            '--native', '-nativetstep', '0',
+            '-obsstart', '0',
+            '-opref', 'contacts_test_data/poly_r4.5_n3', '-oformat', 'png', '-dpi', '300',
+            '--remote']
+    if __name__ == "__main__":
+        args.append("--verbose")
+    cts.parse_args(args)
+    cts.read_args()
+    cts()
+
+
+@profiling.timefuncfile("test_exec_times.txt")
+def test_contacts_alk_ua_r4_5_n3_lifetimes():
+    if not os.path.exists('contacts_test_data'):
+        os.makedirs('contacts_test_data')
+
+    cts = contacts.ContactsAnalysis()
+    args = ['c30_poly.gro', 'c30_poly.xtc',
+            '-apsp_structf', 'c30.tpr',
+            '-method', 'alk-ua', '-distcutoff', '4.5', '-connthreshold', '3', '-skip', '1', '-bins', '10',
+            '-obsstart', '0', '--lifetimes',
+            '-opref', 'contacts_test_data/poly_r4.5_n3', '-oformat', 'png', '-dpi', '300',
+            '--remote']
+    if __name__ == "__main__":
+        args.append("--verbose")
+    cts.parse_args(args)
+    cts.read_args()
+    cts()
+
+
 @profiling.timefuncfile("test_exec_times.txt")
 def test_contacts_atomic_h_r7_n0():
     if not os.path.exists('contacts_test_data'):
@@ -89,6 +128,24 @@ def test_contacts_atomic_h_r7_n5():
     cts()
 
 
+@profiling.timefuncfile("test_exec_times.txt")
+def test_contacts_atomic_h_r7_n5_resmap():
+    if not os.path.exists('contacts_test_data'):
+        os.makedirs('contacts_test_data')
+
+    cts = contacts.ContactsAnalysis()
+    args = ['indus.tpr', 'indus_mol_skip.xtc',
+            '-method', 'atomic-h', '-distcutoff', '7.0', '-connthreshold', '5', '-skip', '50', '-bins', '10',
+            '-obsstart', '500', '-resmap', 'any',
+            '-opref', 'contacts_test_data/indus_r7_n5', '-oformat', 'png', '-dpi', '300',
+            '--remote']
+    if __name__ == "__main__":
+        args.append("--verbose")
+    cts.parse_args(args)
+    cts.read_args()
+    cts()
+
+
 @profiling.timefuncfile("test_exec_times.txt")
 def test_contacts_atomic_sh_r7_n0():
     if not os.path.exists('contacts_test_data'):
@@ -0,0 +1,42 @@
+"""
+Integration tests for per-atom solvent accessible surface areas.
+
+If run with pytest, verbose outputs are suppressed.
+
+Execution times for test cases will be reported to `test_exec_times.txt`
+For detailed profiling, run `python -m cProfile test_realdata.py`.
+"""
+
+import os
+import sys
+import inspect
+import re
+
+from INDUSAnalysis import sasa
+from INDUSAnalysis.lib import profiling
+
+
+@profiling.timefuncfile("test_exec_times.txt")
+def test_sasa_alk_ua_nworkers2():
+    if not os.path.exists('sasa_test_data'):
+        os.makedirs('sasa_test_data')
+
+    sa = sasa.SASAAnalysis()
+    args = ['c30.tpr', 'c30.xtc',
+            '-select', 'name C*', '-probe', '1.4', '-npoints', '100', '-skip', '1',
+            '-nworkers', '2', '-framesperchunk', '5',
+            '-opref', 'sasa_test_data/poly', '-oformat', 'png', '-dpi', '300',
+            '--remote']
+    if __name__ == "__main__":
+        args.append("--verbose")
+    sa.parse_args(args)
+    sa.read_args()
+    sa()
+
+
+if __name__ == "__main__":
+    all_objects = inspect.getmembers(sys.modules[__name__])
+    for obj in all_objects:
+        if re.match("^test_+", obj[0]):
+            print(obj[0])
+            obj[1]()
@@ -0,0 +1,72 @@
+import numpy as np
+
+from INDUSAnalysis.ensemble.polymers.bootstrap import RunningStats, SharedBootstrap, boot_phi_stars, replica_seed, resample_windows
+
+
+def window_means(windows_boot, scale):
+    return {"mean": scale * np.array([win.mean() for win in windows_boot]),
+            "total": np.array([sum(len(win) for win in windows_boot)])}
+
+
+def test_SharedBootstrap():
+    """Tests that replicas are independent of worker and task assignment, and match direct resampling"""
+    windows = [np.random.rand(n) for n in [100, 50, 75]]
+    outputs = {"mean": (3,), "total": (1,)}
+
+    with SharedBootstrap(windows, window_means, outputs, args=(2.0,)) as boot:
+        serial = boot.run(0, 10)
+        serial_batch = boot.run(10, 5)
+
+    with SharedBootstrap(windows, window_means, outputs, args=(2.0,), nworkers=2) as boot:
+        parallel = boot.run(0, 15, chunksize=4)
+
+    assert(serial["mean"].shape == (10, 3))
+    assert(np.all(serial["total"] == 225))
+    assert(np.allclose(np.vstack((serial["mean"], serial_batch["mean"])), parallel["mean"]))
+
+    data = np.concatenate(windows)
+    offsets = np.array([0, 100, 150, 225])
+    windows_boot = resample_windows(data, offsets, replica_seed(16091, 12))
+    assert(np.allclose(window_means(windows_boot, 2.0)["mean"], parallel["mean"][12]))
+
+
+def test_RunningStats():
+    """Tests batched online mean and standard deviation"""
+    samples = np.random.rand(50, 4)
+    stats = RunningStats()
+    for start, stop in [(0, 7), (7, 20), (20, 21), (21, 50)]:
+        stats.update(samples[start:stop])
+    assert(stats.n == 50)
+    assert(np.allclose(stats.mean, samples.mean(axis=0)))
+    assert(np.allclose(stats.std(), samples.std(axis=0)))
+
+
+def test_SharedBootstrap_adaptive():
+    """Tests that adaptive runs stop on convergence or budget, and match fixed runs"""
+    windows = [np.random.rand(n) for n in [100, 50, 75]]
+    outputs = {"mean": (3,), "total": (1,)}
+
+    with SharedBootstrap(windows, window_means, outputs, args=(2.0,)) as boot:
+        fixed = boot.run(0, 40)
+        budget = boot.run_adaptive(10, 1e-12, 40)
+        converged = boot.run_adaptive(10, 0.5, 1000, derived=lambda results: {"max": results["mean"].max(axis=1)})
+
+    assert(np.allclose(budget["mean"], fixed["mean"]))
+    assert(20 <= len(converged["mean"]) < 1000)
+    assert(len(converged["mean"]) % 10 == 0)
+
+
+def test_boot_phi_stars():
+    """Tests that phi_1* and phi_2* are the two highest peaks of each replica, in order of phi"""
+    phi_vals = np.linspace(0, 1, 101)
+
+    def peak(center, height):
+        return height * np.exp(-((phi_vals - center) / 0.02) ** 2)
+
+    N_var_all = np.array([peak(0.2, 10) + peak(0.5, 3) + peak(0.8, 20),
+                          peak(0.3, 15) + peak(0.6, 12) + peak(0.9, 1)])
+    phi_1_stars, phi_2_stars, all_peaks = boot_phi_stars(N_var_all, phi_vals, peak_cut=2)
+    assert(np.allclose(phi_1_stars, [0.2, 0.3]))
+    assert(np.allclose(phi_2_stars, [0.8, 0.6]))
+    assert(np.allclose(all_peaks[0], [0.8, 0.2, 0.5]))
+    assert(np.allclose(all_peaks[1], [0.3, 0.6]))
@@ -0,0 +1,147 @@
+import numpy as np
+
+from INDUSAnalysis import contacts
+
+
+def test_native_pairs():
+    """Tests extraction of native pairs with candidate exclusions."""
+    cts = contacts.ContactsAnalysis()
+    coords = np.array([[0.0, 0.0, 0.0],
+                       [1.0, 0.0, 0.0],
+                       [2.0, 0.0, 0.0],
+                       [10.0, 0.0, 0.0]])
+    candidates = np.ones((4, 4), dtype=bool)
+    np.fill_diagonal(candidates, False)
+    # Exclude bonded pair (0, 1)
+    candidates[0, 1] = candidates[1, 0] = False
+
+    native_i, native_j, native_r0 = cts.calc_native_pairs(coords, candidates, 2.5)
+    assert(np.all(native_i == np.array([0, 1])))
+    assert(np.all(native_j == np.array([2, 2])))
+    assert(np.allclose(native_r0, np.array([2.0, 1.0])))
+
+
+def test_Q_native_structure():
+    """Tests Q for native structure and for fully separated structure."""
+    cts = contacts.ContactsAnalysis()
+    coords = 10 * np.random.random_sample((20, 3)).astype(np.float32)
+    candidates = np.ones((20, 20), dtype=bool)
+    native_i, native_j, native_r0 = cts.calc_native_pairs(coords, candidates, 5.0)
+
+    # At r = r0, each switching function is close to 1 for lambda = 1.8
+    Q = cts.calc_Q_worker(coords, native_i, native_j, native_r0, 5.0, 1.8)
+    assert(Q > 0.95)
+
+    # At r = lambda * r0, each switching function is exactly 0.5
+    Q = cts.calc_Q_worker(coords, native_i, native_j, native_r0 / 1.8, 5.0, 1.8)
+    assert(np.isclose(Q, 0.5, atol=1e-4))
+
+    # Expanded structure has no native contacts
+    Q = cts.calc_Q_worker(100 * coords, native_i, native_j, native_r0, 5.0, 1.8)
+    assert(np.isclose(Q, 0.0))
+
+
+def test_residue_contacts_accumulator():
+    """Tests reduction of atom-level contact matrices to residue-level contact maps."""
+    import MDAnalysis as mda
+
+    # 2 residues of 2 atoms each
+    u = mda.Universe.empty(4, n_residues=2, atom_resindex=[0, 0, 1, 1], trajectory=True)
+    sel = u.atoms
+    # All pairs i < j are candidates
+    pair_i, pair_j = np.triu_indices(4, k=1)
+
+    def formed(pairs):
+        return np.array([(i, j) in pairs for i, j in zip(pair_i, pair_j)])
+
+    # Residues in contact in one of two frames, through two atom pairs
+    for mode, expected in [("any", [[0, 0.5], [0.5, 0]]), ("count", [[0, 1], [1, 0]])]:
+        acc = contacts.ResidueContactsAccumulator(mode)
+        acc.setup(sel, pair_i, pair_j, 2)
+        acc.update(formed([(0, 2), (1, 2)]))
+        acc.update(formed([]))
+        assert(np.allclose(acc.mean_rescontactmatrix(), np.array(expected)))
+
+    # Intra-residue contact (0, 1) and inter-residue contact (0, 2) each count once
+    for mode, expected in [("any", [[1, 1], [1, 0]]), ("count", [[1, 1], [1, 0]])]:
+        acc = contacts.ResidueContactsAccumulator(mode)
+        acc.setup(sel, pair_i, pair_j, 1)
+        acc.update(formed([(0, 1), (0, 2)]))
+        assert(np.allclose(acc.mean_rescontactmatrix(), np.array(expected)))
+
+
+def test_contact_lifetimes_accumulator():
+    """Tests run-length encoded lifetimes, survival function and autocorrelation against dense histories."""
+    nsel = 6
+    nframes = 50
+    candidates = np.ones((nsel, nsel), dtype=bool)
+    np.fill_diagonal(candidates, False)
+    pair_i, pair_j = np.nonzero(np.triu(candidates, k=1))
+
+    # Dense histories of shape (nframes, npairs)
+    h = np.random.random_sample((nframes, len(pair_i))) < 0.6
+
+    acc = contacts.ContactLifetimesAccumulator()
+    acc.setup(None, pair_i, pair_j, nframes)
+    for t in range(nframes):
+        acc.update(h[t])
+
+    # Runs reproduce histories
+    pairs, starts, lengths, censored = acc.runs()
+    hdecoded = np.zeros(h.shape, dtype=bool)
+    for p, s, l in zip(pairs, starts, lengths):
+        hdecoded[s:s + l, p] = True
+    assert(np.all(hdecoded == h))
+    assert(np.all(censored == (starts + lengths == nframes)))
+
+    lifetimes, counts = acc.lifetime_distribution(include_censored=True)
+    assert(np.sum(counts * lifetimes) == np.sum(h))
+
+    # Brute force survival function and autocorrelation
+    S = acc.survival_function()
+    C = acc.autocorrelation(batchsize=4)
+    for tau in [0, 1, 3, 10]:
+        origins = np.sum(h[:nframes - tau])
+        survived = np.all([h[k:nframes - tau + k] for k in range(tau + 1)], axis=0)
+        assert(np.isclose(S[tau], np.sum(survived) / origins))
+        assert(np.isclose(C[tau], np.sum(h[:nframes - tau] & h[tau:]) / origins))
+    assert(np.isclose(S[0], 1.0))
+
+
+def test_trajcontacts_resmap():
+    """Tests contacts of candidate pairs against distance matrices, with and without the dense mean contact matrix."""
+    import MDAnalysis as mda
+    from MDAnalysis.coordinates.memory import MemoryReader
+
+    # 4 residues of 3 atoms each
+    natoms = 12
+    nframes = 5
+    u = mda.Universe.empty(natoms, n_residues=4, atom_resindex=np.repeat(np.arange(4), 3), trajectory=True)
+    traj = 6 * np.random.random_sample((nframes, natoms, 3))
+    u.load_new(traj.astype(np.float32), format=MemoryReader)
+    candidates = np.random.random_sample((natoms, natoms)) < 0.7
+    candidates = np.triu(candidates, k=1)
+    candidates = candidates | candidates.T
+
+    cts = contacts.ContactsAnalysis()
+    cts.verbose = False
+    ts_contacts, mean_contactmatrix = cts.calc_trajcontacts_frames(u, u.atoms, candidates, 3.0, None, None, 1)
+
+    contactmatrices = np.array([candidates & (np.linalg.norm(traj[t][:, None] - traj[t][None, :], axis=-1) < 3.0)
+                                for t in range(nframes)])
+    assert(np.allclose(ts_contacts.data_array, contactmatrices.sum(axis=(1, 2))))
+    assert(np.allclose(mean_contactmatrix, contactmatrices.mean(axis=0)))
+
+    # Residue-level map only
+    resacc = contacts.ResidueContactsAccumulator("count")
+    ts_contacts_res, mean_contactmatrix_res = cts.calc_trajcontacts_frames(u, u.atoms, candidates, 3.0, None, None, 1,
+                                                                           accumulators=[resacc], dense=False)
+    assert(mean_contactmatrix_res is None)
+    assert(np.array_equal(ts_contacts_res.data_array, ts_contacts.data_array))
+    resmap = np.zeros((4, 4))
+    for i in range(natoms):
+        for j in range(i + 1, natoms):
+            resmap[i // 3, j // 3] += mean_contactmatrix[i, j]
+            if i // 3 != j // 3:
+                resmap[j // 3, i // 3] += mean_contactmatrix[i, j]
+    assert(np.allclose(resacc.mean_rescontactmatrix(), resmap))
@@ -0,0 +1,36 @@
+import numpy as np
+
+from INDUSAnalysis.lib.histogram import FixedBinHistogram
+
+
+def test_FixedBinHistogram_matches_numpy():
+    """Tests counts and densities against np.histogram, including values on bin edges"""
+    x = 3 * np.random.randn(1000)
+    x = np.concatenate([x, np.linspace(-4.3, 5.1, 21)])
+    hist = FixedBinHistogram(-4.3, 5.1, 20)
+    hist.add(x)
+
+    counts, edges = np.histogram(x, bins=20, range=[-4.3, 5.1])
+    density, edges = np.histogram(x, bins=20, range=[-4.3, 5.1], density=True)
+    assert(np.all(hist.counts[0] == counts))
+    assert(np.allclose(hist.density()[0], density))
+    assert(np.allclose(hist.edges, edges))
+
+
+def test_FixedBinHistogram_series():
+    """Tests incremental accumulation and multiple series with stacked offsets"""
+    xs = [np.random.randint(0, 50, size=n) for n in [100, 10, 0, 200]]
+
+    hist_series = FixedBinHistogram.integer(0, 49, nseries=4)
+    hist_series.add_series(xs)
+
+    hist_incremental = FixedBinHistogram.integer(0, 49, nseries=4)
+    for series, x in enumerate(xs):
+        # Split each series across two "files"
+        hist_incremental.add(x[:len(x) // 2], series=series)
+        hist_incremental.add(x[len(x) // 2:], series=series)
+
+    for series, x in enumerate(xs):
+        assert(np.all(hist_series.counts[series] == np.bincount(x, minlength=50)))
+    assert(np.all(hist_series.counts == hist_incremental.counts))
+    assert(np.allclose(hist_series.centers, np.arange(50)))
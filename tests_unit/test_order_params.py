@@ -1,4 +1,7 @@
+import os
+
 import numpy as np
+import pytest
 from scipy.spatial.transform import Rotation as scipy_R
 
 from INDUSAnalysis import protein_order_params
@@ -15,6 +18,40 @@ def coords_generator(boxlen, natoms):
     return coords
 
 
+def random_trajectory(natoms, nframes, noise=0.0):
+    """Generates randomly rotated random coordinates of shape (nframes, natoms, 3), with optional noise, for test cases."""
+    return np.array([scipy_R.from_rotvec(np.random.random_sample(3)).apply(coords_generator(10, natoms))
+                     + noise * np.random.random_sample((natoms, 3)) for t in range(nframes)])
+
+
+def memory_universe(traj, n_residues=1, atom_resindex=None, dimensions=None, dt=1, **attrs):
+    """
+    Creates Universe with in-memory trajectory traj of shape (nframes, natoms, 3) for test cases.
+    Topology attributes (e.g. names, masses) are passed as keyword arguments.
+    """
+    import MDAnalysis as mda
+    from MDAnalysis.coordinates.memory import MemoryReader
+
+    u = mda.Universe.empty(traj.shape[1], n_residues=n_residues, atom_resindex=atom_resindex, trajectory=True)
+    for attr, values in attrs.items():
+        u.add_TopologyAttr(attr, values)
+    u.load_new(np.asarray(traj).astype(np.float32), format=MemoryReader, dimensions=dimensions, dt=dt)
+    return u
+
+
+def write_universe(u, tmp_path):
+    """Writes structure (.gro) and trajectory (.xtc) files of Universe to tmp_path, and returns their paths."""
+    import MDAnalysis as mda
+
+    structf = str(tmp_path / "struct.gro")
+    trajf = str(tmp_path / "traj.xtc")
+    u.atoms.write(structf)
+    with mda.Writer(trajf, u.atoms.n_atoms) as W:
+        for ts in u.trajectory:
+            W.write(u.atoms)
+    return structf, trajf
+
+
 def test_RMSD_basic():
     """Tests RMSD for known transformation."""
 
@@ -88,3 +125,342 @@ def test_deviation_translate_rotate_known():
     calc_deviations = op.calc_deviation_worker(coords, newcoords, coords, newcoords)
     known_deviations = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 1.0])
     assert(np.allclose(calc_deviations, known_deviations))
+
+
+def test_fused_observables():
+    """Tests single-pass observables with shared alignment against per-frame workers."""
+    natoms = 12
+    nframes = 6
+    u = memory_universe(random_trajectory(natoms, nframes, noise=0.5), names=['CA'] * 6 + ['CB'] * 6,
+                        masses=np.random.random_sample(natoms) + 1)
+    refu = u.copy()
+
+    op = protein_order_params.OrderParamsAnalysis()
+    Rg_obs = op.Rg_observable("all")
+    RMSD_obs = op.RMSD_observable("all", "name CA")
+    deviations_obs = op.deviations_observable("name CB", "name CA")
+    times = op.calc_observables(u, refu, 2, 1, [Rg_obs, RMSD_obs, deviations_obs])
+    assert(len(times) == nframes)
+
+    refu.trajectory[2]
+    initcoords = refu.atoms.positions.copy()
+    for tidx, ts in enumerate(u.trajectory):
+        coords = u.atoms.positions
+        assert(np.isclose(Rg_obs.values[tidx], op.calc_Rg_worker(coords, u.atoms.masses)))
+        assert(np.isclose(RMSD_obs.values[tidx], op.calc_RMSD_worker(initcoords, coords, initcoords[:6], coords[:6]), atol=1e-5))
+        assert(np.allclose(deviations_obs.values[tidx], op.calc_deviation_worker(initcoords[6:], coords[6:], initcoords[:6], coords[:6]), atol=1e-5))
+    assert(np.isclose(RMSD_obs.values[2], 0, atol=1e-4))
+
+
+def test_batched_rotation_matrices():
+    """Tests batched Kabsch rotations for known random rotations."""
+    coords = coords_generator(10, 10)
+    coords = coords - np.mean(coords, axis=0)
+    rots = scipy_R.from_rotvec(np.random.random_sample((5, 3)))
+    # Rotate reference by inverse rotations => R[f] rotates block[f] back onto reference
+    block = np.array([rots[f].inv().apply(coords) for f in range(5)])
+    R = protein_order_params.batched_rotation_matrices(block, coords)
+    assert(np.allclose(R, rots.as_matrix()))
+    for f in range(5):
+        assert(np.allclose(np.dot(block[f], R[f].T), coords))
+
+
+def test_block_observables():
+    """Tests block mode of single-pass observables against frame-by-frame mode."""
+    natoms = 12
+    nframes = 7
+    u = memory_universe(random_trajectory(natoms, nframes), names=['CA'] * 6 + ['CB'] * 6,
+                        masses=np.random.random_sample(natoms) + 1)
+    refu = u.copy()
+
+    op = protein_order_params.OrderParamsAnalysis()
+    results = []
+    for blocksize in [1, 3]:
+        observables = [op.Rg_observable("all"), op.RMSD_observable("all", "name CA"),
+                       op.deviations_observable("name CB", "name CA")]
+        op.calc_observables(u, refu, 0, 1, observables, blocksize=blocksize)
+        results.append([obs.values for obs in observables])
+    for frame_values, block_values in zip(results[0], results[1]):
+        assert(np.allclose(frame_values, block_values, atol=1e-4))
+
+
+def test_streaming_RMSF():
+    """Tests streaming RMSF accumulator against stored deviations, in frame and block modes."""
+    natoms = 10
+    nframes = 9
+    u = memory_universe(random_trajectory(natoms, nframes), dt=10, names=['CA'] * natoms)
+    refu = u.copy()
+
+    op = protein_order_params.OrderParamsAnalysis()
+    for blocksize in [1, 4]:
+        deviations_obs = op.deviations_observable("all", "name CA")
+        aligned_obs = protein_order_params.FrameObservable("aligned", lambda sel, coords, refcoords: coords,
+                                                           "all", "name CA")
+        RMSF_acc = protein_order_params.RMSFAccumulator("all", "name CA", start_time=20, end_time=70)
+        times = op.calc_observables(u, refu, 0, 1, [deviations_obs, aligned_obs, RMSF_acc], blocksize=blocksize)
+        RMSF, RMSD_ref, mean, variance = RMSF_acc.result()
+
+        window = (times >= 20) & (times <= 70)
+        assert(RMSF_acc.count == np.sum(window))
+        assert(np.allclose(mean, np.mean(aligned_obs.values[window], axis=0), atol=1e-4))
+        assert(np.allclose(variance, np.var(aligned_obs.values[window], axis=0), atol=1e-4))
+        assert(np.allclose(RMSF, np.sqrt(np.sum(np.var(aligned_obs.values[window], axis=0), axis=1)), atol=1e-4))
+        assert(np.allclose(RMSD_ref, np.sqrt(np.mean(deviations_obs.values[window] ** 2, axis=0)), atol=1e-4))
+
+
+def test_pairwise_RMSD(tmp_path):
+    """Tests tiled pairwise RMSD matrix against RMSD worker."""
+    natoms = 8
+    nframes = 11
+    u = memory_universe(random_trajectory(natoms, nframes))
+
+    op = protein_order_params.OrderParamsAnalysis()
+    times, pairwise_RMSD = op.calc_pairwise_RMSD(u, 1, "all", str(tmp_path / "pairwise.npy"), tilesize=4, nworkers=2)
+
+    coords = u.trajectory.timeseries(order='fac').astype(np.float64)
+    for i in range(nframes):
+        for j in range(nframes):
+            assert(np.isclose(pairwise_RMSD[i, j], op.calc_RMSD_worker(coords[i], coords[j], coords[i], coords[j]), atol=1e-4))
+    assert(not os.path.exists(str(tmp_path / "pairwise_coords.npy")))
+
+    # Temporary coordinates file is removed if calculation fails
+    with pytest.raises(ValueError):
+        op.calc_pairwise_RMSD(u, 1, "all", str(tmp_path / "pairwise_failed.npy"), tilesize=0)
+    assert(not os.path.exists(str(tmp_path / "pairwise_failed_coords.npy")))
+
+
+def test_shape_descriptors():
+    """Tests batched gyration tensor descriptors against Rg worker and known shapes."""
+    natoms = 10
+    nframes = 7
+    u = memory_universe(np.array([coords_generator(10, natoms) for t in range(nframes)]),
+                        masses=np.random.random_sample(natoms) + 1)
+
+    op = protein_order_params.OrderParamsAnalysis()
+    ts_shape = op.calc_shape(u, 1, "all")
+    op.blocksize = 3
+    ts_shape_block = op.calc_shape(u, 1, "all")
+    assert(ts_shape.data_array.shape == (nframes, 7))
+    assert(np.allclose(ts_shape.data_array, ts_shape_block.data_array))
+    for tidx, ts in enumerate(u.trajectory):
+        assert(np.isclose(ts_shape.data_array[tidx, 0], op.calc_Rg_worker(u.atoms.positions, u.atoms.masses)))
+
+    # Rod along z: only lambda_z is nonzero, b = lambda_z, c = 0, kappa^2 = 1
+    rod = np.zeros((1, 5, 3))
+    rod[0, :, 2] = np.arange(5)
+    descriptors = protein_order_params.gyration_tensor_descriptors(rod, np.ones(5))[0]
+    assert(np.allclose(descriptors[1:4], [0, 0, 2]))
+    assert(np.allclose(descriptors[4:], [2, 0, 1]))
+
+    # Regular tetrahedron: isotropic, all descriptors vanish
+    tetra = np.array([[[1, 1, 1], [1, -1, -1], [-1, 1, -1], [-1, -1, 1]]], dtype=float)
+    descriptors = protein_order_params.gyration_tensor_descriptors(tetra, np.ones(4))[0]
+    assert(np.allclose(descriptors[4:], 0))
+
+
+def test_memmap_deviations(tmp_path):
+    """Tests chunked memory-mapped deviations against in-memory deviations, and pickling by reference."""
+    import pickle
+
+    natoms = 9
+    nframes = 11
+    u = memory_universe(random_trajectory(natoms, nframes, noise=0.5))
+    refu = u.copy()
+
+    op = protein_order_params.OrderParamsAnalysis()
+    ts_deviations = op.calc_deviations(u, refu, 0, 1, "all", "all")
+
+    for blocksize in [1, 4]:
+        outf = str(tmp_path / "deviations_{}.npy".format(blocksize))
+        obs = op.deviations_observable("all", "all", outf=outf, chunksize=3)
+        times = op.calc_observables(u, refu, 0, 1, [obs], blocksize=blocksize)
+        ts_memmap = obs.result(times)
+        assert(isinstance(ts_memmap.data_array, np.memmap))
+        assert(ts_memmap.data_array.dtype == np.float32)
+        assert(np.allclose(ts_memmap.data_array, ts_deviations.data_array, atol=1e-4))
+
+        ts_loaded = pickle.loads(pickle.dumps(ts_memmap))
+        assert(isinstance(ts_loaded.data_array, np.memmap))
+        assert(np.array_equal(ts_loaded.data_array, ts_memmap.data_array))
+        assert(np.array_equal(ts_loaded.time_array, ts_memmap.time_array))
+
+    # Data file is found next to the pickle file after both are moved
+    os.mkdir(str(tmp_path / "moved"))
+    op.save_TimeSeries(ts_memmap, str(tmp_path / "deviations.pkl"))
+    for f in ["deviations.pkl", "deviations_4.npy"]:
+        os.replace(str(tmp_path / f), str(tmp_path / "moved" / f))
+    ts_loaded = op.load_TimeSeries(str(tmp_path / "moved" / "deviations.pkl"))
+    assert(isinstance(ts_loaded.data_array, np.memmap))
+    assert(os.path.dirname(ts_loaded.data_array.filename) == str(tmp_path / "moved"))
+    assert(np.array_equal(ts_loaded.data_array, ts_memmap.data_array))
+
+    os.remove(str(tmp_path / "moved" / "deviations_4.npy"))
+    with pytest.raises(FileNotFoundError):
+        op.load_TimeSeries(str(tmp_path / "moved" / "deviations.pkl"))
+
+
+def build_backbone(phis, psis, omega=180.0):
+    """Builds N, CA, C backbone coordinates with given dihedrals (in degrees) using NeRF."""
+    bonds = {'N-CA': 1.458, 'CA-C': 1.525, 'C-N': 1.329}
+    angles = {'N-CA-C': 111.2, 'CA-C-N': 116.2, 'C-N-CA': 121.7}
+
+    def place(a, b, c, bond, angle, torsion):
+        angle, torsion = np.radians(angle), np.radians(torsion)
+        bc = (c - b) / np.linalg.norm(c - b)
+        n = np.cross(b - a, bc)
+        n /= np.linalg.norm(n)
+        m = np.column_stack((bc, np.cross(n, bc), n))
+        d = bond * np.array([-np.cos(angle), np.sin(angle) * np.cos(torsion), np.sin(angle) * np.sin(torsion)])
+        return c + m.dot(d)
+
+    coords = [np.array([0.0, 1.458, 0.0]), np.array([0.0, 0.0, 0.0]),
+              np.array([1.525 * np.sin(np.radians(111.2)), -1.525 * np.cos(np.radians(111.2)), 0.0])]
+    for res in range(1, len(phis)):
+        coords.append(place(coords[-3], coords[-2], coords[-1], bonds['C-N'], angles['CA-C-N'], psis[res - 1]))
+        coords.append(place(coords[-3], coords[-2], coords[-1], bonds['N-CA'], angles['C-N-CA'], omega))
+        coords.append(place(coords[-3], coords[-2], coords[-1], bonds['CA-C'], angles['N-CA-C'], phis[res]))
+    return np.array(coords)
+
+
+def test_backbone_dihedrals_secondary_structure():
+    """Tests vectorized backbone dihedrals and secondary structure assignment on built helix/strand/coil peptide."""
+    from MDAnalysis.lib.distances import calc_dihedrals
+
+    # 6 helix residues, 2 coil residues, 5 strand residues, 1 isolated helical residue
+    phis = np.array([-57.0] * 6 + [60.0] * 2 + [-120.0] * 5 + [-57.0])
+    psis = np.array([-47.0] * 6 + [40.0] * 2 + [130.0] * 5 + [-47.0])
+    nres = len(phis)
+    coords = build_backbone(phis, psis)
+
+    u = memory_universe(np.array([coords, coords + 1.0]), n_residues=nres, atom_resindex=np.repeat(np.arange(nres), 3),
+                        names=['N', 'CA', 'C'] * nres, resids=np.arange(1, nres + 1))
+
+    op = protein_order_params.OrderParamsAnalysis()
+    ts_dihedrals = op.calc_backbone_dihedrals(u, 1, "all")
+    assert(ts_dihedrals.data_array.shape == (2, 2, nres))
+    phi = ts_dihedrals.data_array[0, 0, :]
+    psi = ts_dihedrals.data_array[0, 1, :]
+    assert(np.isnan(phi[0]) and np.isnan(psi[-1]))
+    assert(np.allclose(phi[1:], phis[1:], atol=0.05))
+    assert(np.allclose(psi[:-1], psis[:-1], atol=0.05))
+
+    # Compare with MDAnalysis dihedrals
+    quads = np.array([[3 * r - 1, 3 * r, 3 * r + 1, 3 * r + 2] for r in range(1, nres)])
+    mda_phi = np.degrees(calc_dihedrals(*[coords[quads[:, k]] for k in range(4)]))
+    assert(np.allclose(phi[1:], mda_phi, atol=0.05))
+
+    op.blocksize = 2
+    ts_dihedrals_block = op.calc_backbone_dihedrals(u, 1, "all")
+    assert(np.allclose(ts_dihedrals.data_array, ts_dihedrals_block.data_array, equal_nan=True))
+
+    ts_ss, ts_ss_content = op.calc_secondary_structure(ts_dihedrals)
+    ss = "".join(protein_order_params.SS_CODES[code] for code in ts_ss.data_array[0])
+    # Terminal residues have undefined dihedrals
+    assert(ss == "CHHHHH" + "CC" + "EEEEE" + "C")
+    assert(np.allclose(ts_ss_content.data_array[0], [4 / 14, 5 / 14, 5 / 14]))
+
+    # Helical runs shorter than minhelix are coil
+    assert(np.all(protein_order_params.assign_secondary_structure([-57.0] * 3, [-47.0] * 3) == 0))
+
+
+def test_reference_cache(tmp_path):
+    """Tests that cached reference coordinates match reference Universe, and are reused without reopening trajectory."""
+    import MDAnalysis as mda
+
+    natoms = 8
+    nframes = 5
+    u = memory_universe(random_trajectory(natoms, nframes, noise=0.5), dimensions=[50, 50, 50, 90, 90, 90],
+                        names=['CA'] * 4 + ['CB'] * 4, resnames=['ALK'], resids=[1])
+    structf, trajf = write_universe(u, tmp_path)
+
+    u = mda.Universe(structf, trajf)
+    refu = mda.Universe(structf, trajf)
+    op = protein_order_params.OrderParamsAnalysis()
+    ts_RMSD = op.calc_RMSD(u, refu, 2, 1, "all", "name CA")
+
+    refcache = protein_order_params.ReferenceCache(structf, trajf, 2, str(tmp_path))
+    ts_RMSD_cache = op.calc_RMSD(u, refcache, None, 1, "all", "name CA")
+    assert(np.array_equal(ts_RMSD.data_array, ts_RMSD_cache.data_array))
+    assert(os.path.exists(refcache.cachef))
+
+    # A new cache for the same reference reads coordinates from file without opening the trajectory
+    refcache = protein_order_params.ReferenceCache(structf, trajf, 2, str(tmp_path))
+    positions = refcache.positions(["all", "name CA"])
+    assert(refcache.refu is None)
+    refu.trajectory[2]
+    assert(np.array_equal(positions["all"], refu.atoms.positions))
+
+    # Different timestep uses different cache file
+    assert(protein_order_params.ReferenceCache(structf, trajf, 3, str(tmp_path)).cachef != refcache.cachef)
+
+    # Reference from the analysed trajectory is read from its Universe, without a cache file
+    op = protein_order_params.OrderParamsAnalysis()
+    op.parse_args([structf, trajf, "-opref", str(tmp_path / "out" / "indus")])
+    op.read_args()
+    assert(op.refu is op.u)
+
+    # Cache file for a separate reference is shared by jobs with different output directories
+    op = protein_order_params.OrderParamsAnalysis()
+    op.parse_args([structf, trajf, "-refstructf", structf, "-opref", str(tmp_path / "out" / "indus")])
+    op.read_args()
+    op_other = protein_order_params.OrderParamsAnalysis()
+    op_other.parse_args([structf, trajf, "-refstructf", structf, "-opref", str(tmp_path / "other" / "indus")])
+    op_other.read_args()
+    assert(os.path.dirname(op.refu.cachef) == str(tmp_path))
+    assert(op.refu.cachef == op_other.refu.cachef)
+
+
+def test_multiple_selections_alignments(tmp_path):
+    """
+    Tests that analysing two selections with two alignment groups in one pass matches separate single-selection
+    runs, and that outputs are written to, and replotted from, per-selection files.
+    """
+    # 4 alanine residues
+    nres = 4
+    names = ['N', 'CA', 'C', 'O', 'CB']
+    u = memory_universe(random_trajectory(nres * len(names), 6, noise=0.5), n_residues=nres,
+                        atom_resindex=np.repeat(np.arange(nres), len(names)), dimensions=[50, 50, 50, 90, 90, 90],
+                        names=names * nres, resnames=['ALA'] * nres, resids=np.arange(1, nres + 1))
+    structf, trajf = write_universe(u, tmp_path)
+
+    def run(opref, selects, aligns, replotpref=None):
+        op = protein_order_params.OrderParamsAnalysis()
+        args = [structf, trajf, "-select"] + selects + ["-align"] + aligns + ["-opref", opref, "-window", "2", "--remote"]
+        if replotpref is not None:
+            args += ["--replot", "-replotpref", replotpref]
+        op.parse_args(args)
+        op.read_args()
+        op()
+
+    selects = ["heavy", "side_chain"]
+    aligns = ["backbone", "alpha_C"]
+    multipref = str(tmp_path / "multi")
+    run(multipref, selects, aligns)
+
+    for select in selects:
+        for align in aligns:
+            singlepref = str(tmp_path / "single_{}_{}".format(select, align))
+            run(singlepref, [select], [align])
+            ts_single = protein_order_params.OrderParamsAnalysis.load_TimeSeries(singlepref + "_Rg.pkl")
+            ts_multi = protein_order_params.OrderParamsAnalysis.load_TimeSeries(multipref + "_Rg_" + select + ".pkl")
+            assert(np.allclose(ts_multi.data_array, ts_single.data_array))
+            for name in ["RMSD", "deviations"]:
+                suffix = "_" + name + "_" + align + "_" + select + ".pkl"
+                ts_single = protein_order_params.OrderParamsAnalysis.load_TimeSeries(singlepref + suffix)
+                ts_multi = protein_order_params.OrderParamsAnalysis.load_TimeSeries(multipref + suffix)
+                assert(np.allclose(ts_multi.time_array, ts_single.time_array))
+                assert(np.allclose(ts_multi.data_array, ts_single.data_array))
+    assert(not os.path.exists(multipref + "_Rg.pkl"))
+
+    # Replot reads per-selection files, and saves them again under new prefix
+    replotpref = str(tmp_path / "replot")
+    run(replotpref, selects, aligns, replotpref=multipref)
+    for select in selects:
+        ts_multi = protein_order_params.OrderParamsAnalysis.load_TimeSeries(multipref + "_Rg_" + select + ".pkl")
+        ts_replot = protein_order_params.OrderParamsAnalysis.load_TimeSeries(replotpref + "_Rg_" + select + ".pkl")
+        assert(np.array_equal(ts_replot.data_array, ts_multi.data_array))
+        for align in aligns:
+            suffix = "_RMSD_" + align + "_" + select + ".pkl"
+            ts_multi = protein_order_params.OrderParamsAnalysis.load_TimeSeries(multipref + suffix)
+            ts_replot = protein_order_params.OrderParamsAnalysis.load_TimeSeries(replotpref + suffix)
+            assert(np.array_equal(ts_replot.data_array, ts_multi.data_array))
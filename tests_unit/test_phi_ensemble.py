@@ -0,0 +1,100 @@
+import numpy as np
+from scipy.special import logsumexp
+
+from INDUSAnalysis.ensemble.polymers.phi_ensemble import BasinRatio, PhiEnsemble2D, phi_ensemble_cumulants, refine_phi_peaks, sample_bins
+
+
+def test_phi_ensemble_cumulants():
+    """Tests chunked phi-ensemble cumulants against direct reweighting"""
+    x_l = np.concatenate((np.random.normal(20, 4, 5000), np.random.normal(80, 6, 5000)))
+    G_l = -0.5 * ((x_l - 50) / 30) ** 2
+    beta = 0.4
+    phi_vals = np.linspace(-2, 5, 37)
+
+    cumulants = phi_ensemble_cumulants(x_l, G_l, phi_vals, beta, ncumulants=3, phi_chunk=10, sample_chunk=999, nthreads=2)
+    assert(cumulants.shape == (3, 37))
+
+    for i, phi in enumerate(phi_vals):
+        log_w = G_l - beta * phi * x_l
+        w = np.exp(log_w - logsumexp(log_w))
+        mean = np.sum(w * x_l)
+        assert(np.isclose(cumulants[0, i], mean))
+        assert(np.isclose(cumulants[1, i], np.sum(w * (x_l - mean) ** 2)))
+        assert(np.isclose(cumulants[2, i], np.sum(w * (x_l - mean) ** 3)))
+
+
+class Calc:
+    def __init__(self, x_l, G_l):
+        self.x_l = x_l
+        self.G_l = G_l
+
+
+def test_refine_phi_peaks():
+    """Tests that peaks of Var(x) refined from a coarse grid match peaks on a dense grid"""
+    x_l = np.concatenate((np.random.normal(20, 4, 5000), np.random.normal(80, 6, 5000)))
+    calc = Calc(x_l, np.zeros(len(x_l)))
+    beta = 0.4
+
+    phi_dense = np.linspace(-2, 2, 4001)
+    var_dense = phi_ensemble_cumulants(calc.x_l, calc.G_l, phi_dense, beta)[1]
+
+    phi_coarse = np.linspace(-2, 2, 21)
+    var_coarse = phi_ensemble_cumulants(calc.x_l, calc.G_l, phi_coarse, beta)[1]
+    peak = np.argmax(var_coarse)
+
+    phi_peaks, N_avg_peaks, N_var_peaks = refine_phi_peaks(calc, phi_coarse, [peak], beta, tol=1e-5)
+    assert(abs(phi_peaks[0] - phi_dense[np.argmax(var_dense)]) < 1e-3)
+    assert(np.isclose(N_var_peaks[0], var_dense.max(), rtol=1e-4))
+
+
+def test_sample_bins():
+    """Tests assignment of samples to bins centered at bin points"""
+    bin_points = np.linspace(0, 10, 11)
+    x_l = np.array([-1, -0.4, 0.6, 4.49, 9.6, 10.49, 10.6])
+    assert(np.all(sample_bins(x_l, bin_points) == [-1, 0, 1, 4, 10, 10, -1]))
+    assert(np.all(sample_bins(x_l, bin_points, bin_style='left') == [-1, -1, 0, 4, 9, 10, 10]))
+
+
+def test_BasinRatio():
+    """Tests derivative and root of log ratio of basin probabilities"""
+    x_l = np.concatenate((np.random.normal(20, 4, 5000), np.random.normal(80, 6, 5000)))
+    G_l = np.random.normal(0, 0.1, len(x_l))
+    beta = 0.4
+    ratio = BasinRatio(x_l, G_l, x_l < 50, x_l >= 50, beta)
+
+    f, df = ratio(0.1)
+    h = 1e-6
+    assert(np.isclose(df, (ratio(0.1 + h)[0] - ratio(0.1 - h)[0]) / (2 * h), rtol=1e-4))
+
+    phi_root = ratio.root(-1, tol=1e-8)
+    assert(abs(ratio(phi_root)[0]) < 1e-6)
+    log_w = G_l - beta * phi_root * x_l
+    assert(np.isclose(logsumexp(log_w[x_l < 50]), logsumexp(log_w[x_l >= 50])))
+    assert(ratio.nevals < 30)
+
+
+def test_PhiEnsemble2D():
+    """Tests batched 2D reweighting against weighted 2D histograms"""
+    x_l = np.random.uniform(0, 100, 20000)
+    y_l = 0.1 * x_l + np.random.normal(0, 1, len(x_l))
+    G_l = np.random.normal(0, 0.5, len(x_l))
+    beta = 0.4
+    x_bin_points = np.linspace(0, 100, 21)
+    y_bin_points = np.linspace(0, 10, 11)
+    x_edges = np.append(x_bin_points - 2.5, 102.5)
+    y_edges = np.append(y_bin_points - 0.5, 10.5)
+
+    ens = PhiEnsemble2D(x_l, y_l, G_l, x_bin_points, y_bin_points, beta)
+    for phi in [-0.5, 0, 0.5]:
+        w = np.exp(G_l - beta * phi * x_l)
+        hist, _, _ = np.histogram2d(x_l, y_l, bins=[x_edges, y_edges], weights=w)
+        with np.errstate(divide='ignore'):
+            ref = -np.log(hist)
+        betaF = ens.betaF(phi)
+        occupied = np.isfinite(ref)
+        assert(np.all(np.isfinite(betaF) == occupied))
+        assert(np.allclose(betaF[occupied] - betaF[occupied].min(), ref[occupied] - ref[occupied].min()))
+
+        betaF_y = ens.betaF_second(phi)
+        ref_y = -np.log(hist.sum(axis=0))
+        assert(np.allclose(betaF_y - betaF_y.min(), ref_y - ref_y.min()))
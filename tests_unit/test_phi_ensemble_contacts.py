@@ -0,0 +1,120 @@
+import numpy as np
+
+from INDUSAnalysis import contacts
+from INDUSAnalysis.ensemble.proteins.denaturation.contacts.phi_ensemble_contacts import (
+    SparseContactsAccumulator, contact_break_phi, excluded_pair_keys, frame_contact_keys)
+
+
+def alkane_universe(nchains, chainlength, nframes, boxsize=8.0):
+    """Creates Universe of linear united-atom alkane chains with random coordinates."""
+    import MDAnalysis as mda
+    from MDAnalysis.coordinates.memory import MemoryReader
+
+    natoms = nchains * chainlength
+    u = mda.Universe.empty(natoms, n_residues=nchains, atom_resindex=np.repeat(np.arange(nchains), chainlength),
+                           trajectory=True)
+    u.add_TopologyAttr('name', ['C'] * natoms)
+    u.add_TopologyAttr('resname', ['ALK'] * nchains)
+    u.add_TopologyAttr('bonds', [(c * chainlength + k, c * chainlength + k + 1)
+                                 for c in range(nchains) for k in range(chainlength - 1)])
+    traj = boxsize * np.random.random_sample((nframes, natoms, 3))
+    u.load_new(traj.astype(np.float32), format=MemoryReader)
+    return u
+
+
+class ContactMatrixRecorder:
+    """Records dense contact matrix at each frame."""
+    def setup(self, sel, pair_i, pair_j, nframes):
+        self.nsel = len(sel)
+        self.pair_i, self.pair_j = pair_i, pair_j
+        self.contactmatrices = []
+
+    def update(self, formed):
+        contactmatrix = np.zeros((self.nsel, self.nsel), dtype=bool)
+        contactmatrix[self.pair_i, self.pair_j] = formed
+        contactmatrix[self.pair_j, self.pair_i] = formed
+        self.contactmatrices.append(contactmatrix)
+
+
+def dense_contacts(u, connthreshold, distcutoff, allowed=None):
+    """
+    Returns alkane united atoms, dense candidates, mean contact matrix, and contact matrix at each frame,
+    from ContactsAnalysis.
+    """
+    cts = contacts.ContactsAnalysis()
+    cts.u_apsp = u
+    cts.alk_resname = "ALK"
+    cts.verbose = False
+    sel, candidates = cts.calc_contact_candidates(u, "alk-ua", connthreshold)
+    if allowed is not None:
+        candidates &= np.outer(allowed, allowed)
+    recorder = ContactMatrixRecorder()
+    ts_contacts, mean_contactmatrix = cts.calc_trajcontacts_frames(u, sel, candidates, distcutoff, None, None, 1,
+                                                                   accumulators=[recorder])
+    return sel, candidates, mean_contactmatrix, recorder.contactmatrices
+
+
+def test_excluded_pair_keys():
+    """Tests bond-network exclusions against candidates from all-pairs-shortest-path distances."""
+    u = alkane_universe(3, 6, 1)
+    for connthreshold in [0, 1, 2, 4]:
+        sel, candidates, _, _ = dense_contacts(u, connthreshold, 5.0)
+        nsel = len(sel)
+        ei, ej = np.nonzero(np.triu(~candidates, k=1))
+        assert(np.array_equal(excluded_pair_keys(sel, connthreshold), ei * nsel + ej))
+
+
+def test_sparse_contacts_dense():
+    """Tests sparse per-frame contacts and accumulated counts against dense contact matrices."""
+    nframes = 12
+    distcutoff = 3.0
+    connthreshold = 2
+    u = alkane_universe(3, 6, nframes)
+    sel, candidates, mean_contactmatrix, contactmatrices = dense_contacts(u, connthreshold, distcutoff)
+    nsel = len(sel)
+    excluded_keys = excluded_pair_keys(sel, connthreshold)
+
+    # Only atoms 3 onwards allowed to form contacts (as for side-chain heavy atoms)
+    allowed = np.arange(nsel) >= 3
+    _, _, _, allowed_contactmatrices = dense_contacts(u, connthreshold, distcutoff, allowed)
+
+    # Small buffer, to merge several times
+    acc = SparseContactsAccumulator(nsel, buffersize=5)
+    for tidx, ts in enumerate(u.trajectory):
+        keys = frame_contact_keys(sel.positions, distcutoff, excluded_keys)
+        ci, cj = np.nonzero(np.triu(contactmatrices[tidx], k=1))
+        assert(np.array_equal(np.sort(keys), ci * nsel + cj))
+
+        ci, cj = np.nonzero(np.triu(allowed_contactmatrices[tidx], k=1))
+        assert(np.array_equal(np.sort(frame_contact_keys(sel.positions, distcutoff, excluded_keys, allowed)),
+                              ci * nsel + cj))
+
+        acc.update(keys)
+    acc.merge()
+
+    assert(acc.nframes == nframes)
+    assert(np.all(np.diff(acc.keys) > 0))
+    pi, pj = np.divmod(acc.keys, nsel)
+    mean_sparse = np.zeros((nsel, nsel))
+    mean_sparse[pi, pj] = acc.counts / acc.nframes
+    assert(np.allclose(mean_sparse, np.triu(mean_contactmatrix, k=1)))
+
+
+def test_contact_break_phi():
+    """Tests phi values at which contacts break against brute-force search."""
+    phivals = np.array([0.0, 0.5, 1.0, 1.5, 2.0])
+    mean_contacts = np.random.random_sample((len(phivals), 40))
+    breakfrac = 0.5
+
+    formed, break_phi = contact_break_phi(phivals, mean_contacts, breakfrac)
+    assert(np.array_equal(formed, mean_contacts[0] >= breakfrac))
+
+    expected = []
+    for pair in np.nonzero(mean_contacts[0] >= breakfrac)[0]:
+        phi_break = np.nan
+        for phi_idx in range(len(phivals)):
+            if mean_contacts[phi_idx, pair] < breakfrac:
+                phi_break = phivals[phi_idx]
+                break
+        expected.append(phi_break)
+    assert(np.array_equal(break_phi, np.array(expected), equal_nan=True))
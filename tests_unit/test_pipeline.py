@@ -0,0 +1,85 @@
+import pytest
+
+from INDUSAnalysis.ensemble.polymers.pipeline import Stage, StageGraph, set_config_value
+
+
+def test_StageGraph(tmp_path):
+    """Tests dependency ordering and content-hash invalidation of stages"""
+    config = {"a": {"x": 1, "y": 2}, "b": {"guess": 0}, "windows": {"unbiased": "f0", 10: "f1"}}
+    inputf = tmp_path / "input.dat"
+    inputf.write_text("1 2 3")
+    statefile = str(tmp_path / "stages.json")
+    ran = []
+
+    def stage_func(name):
+        def func():
+            ran.append(name)
+            if name == "opt":
+                # Updates entry it reads
+                config["b"]["guess"] += 1
+        return func
+
+    graph = StageGraph([
+        Stage("load", stage_func("load"), config_keys=["a.x", "windows"], files=lambda config: [str(inputf)]),
+        Stage("calc", stage_func("calc"), deps=["load"], config_keys=["a.y"]),
+        Stage("opt", stage_func("opt"), deps=["calc"], config_keys=["b.guess"], writes=["b.guess"]),
+        Stage("plot", stage_func("plot"), deps=["load"])
+    ])
+
+    assert(graph.order(["opt"]) == ["load", "calc", "opt"])
+
+    assert(graph.run(["opt", "plot"], lambda: config, statefile) == ["load", "calc", "opt", "plot"])
+    assert(graph.run(["opt", "plot"], lambda: config, statefile) == [])
+
+    # Config change propagates downstream only
+    config["a"]["y"] = 3
+    assert(graph.run(["opt", "plot"], lambda: config, statefile) == ["calc", "opt"])
+
+    # Input file change propagates to all stages
+    inputf.write_text("1 2 3 4")
+    assert(graph.run(["opt", "plot"], lambda: config, statefile) == ["load", "calc", "opt", "plot"])
+
+    assert(graph.run(["plot"], lambda: config, statefile, force=True) == ["load", "plot"])
+    assert(len(ran) == 12)
+
+    with pytest.raises(ValueError):
+        graph.order(["unknown"])
+
+    with pytest.raises(ValueError):
+        StageGraph([Stage("s1", None, deps=["s2"]), Stage("s2", None, deps=["s1"])])
+
+
+def test_StageGraph_parallel(tmp_path):
+    """Tests that parallel runs respect dependencies and apply config updates of workers in the coordinator"""
+    config = {"a": {"x": 1}, "b": {"guess": 0}}
+    statefile = str(tmp_path / "stages.json")
+
+    def execute(name):
+        (tmp_path / name).write_text(" ".join(sorted(p.name for p in tmp_path.iterdir())))
+        if name == "opt":
+            return {"b.guess": config["a"]["x"] + 1}
+        return {}
+
+    def apply_updates(updates):
+        for key, value in updates.items():
+            set_config_value(config, key, value)
+
+    graph = StageGraph([
+        Stage("load", None, config_keys=["a.x"]),
+        Stage("opt", None, deps=["load"], writes=["b.guess"]),
+        Stage("plot", None, deps=["load"]),
+        Stage("use", None, deps=["opt"], config_keys=["b.guess"])
+    ])
+
+    ran = graph.run(["use", "plot"], lambda: config, statefile, nworkers=2, execute=execute, apply_updates=apply_updates)
+    assert(sorted(ran) == ["load", "opt", "plot", "use"])
+    assert(config["b"]["guess"] == 2)
+    # Each stage ran after its dependencies
+    assert("load" in (tmp_path / "opt").read_text().split())
+    assert("opt" in (tmp_path / "use").read_text().split())
+
+    assert(graph.run(["use", "plot"], lambda: config, statefile, nworkers=2, execute=execute, apply_updates=apply_updates) == [])
+    config["a"]["x"] = 2
+    ran = graph.run(["use", "plot"], lambda: config, statefile, nworkers=2, execute=execute, apply_updates=apply_updates)
+    assert(sorted(ran) == ["load", "opt", "plot", "use"])
+    assert(config["b"]["guess"] == 3)
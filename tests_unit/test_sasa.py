@@ -0,0 +1,95 @@
+import numpy as np
+
+from INDUSAnalysis import sasa
+
+
+def test_SASA_isolated_and_overlapping_spheres():
+    """Tests Shrake-Rupley SASA against analytical areas of isolated and overlapping spheres."""
+    points = sasa.sphere_points(5000)
+    radii = np.array([1.7, 1.5])
+    probe = 1.4
+    R = radii + probe
+
+    # Isolated atoms
+    coords = np.array([[0, 0, 0], [20, 0, 0]])
+    SASA = sasa.calc_SASA_frame(coords, radii, points, probe)
+    assert(np.allclose(SASA, 4 * np.pi * R**2))
+
+    # Overlapping atoms: area of sphere i outside sphere j is 4 pi R_i^2 - 2 pi R_i h_i,
+    # where h_i is the height of the buried spherical cap
+    d = 4.0
+    coords = np.array([[0, 0, 0], [d, 0, 0]])
+    SASA = sasa.calc_SASA_frame(coords, radii, points, probe)
+    h = R - (d**2 + R**2 - R[::-1]**2) / (2 * d)
+    assert(np.allclose(SASA, 4 * np.pi * R**2 - 2 * np.pi * R * h, rtol=1e-2))
+
+
+def test_SASA_neighbor_grid():
+    """Tests neighbor grid SASA against brute force occlusion tests over all atom pairs."""
+    natoms = 40
+    coords = np.random.random_sample((natoms, 3)) * 12
+    radii = np.random.choice([1.52, 1.55, 1.7, 1.8], natoms)
+    points = sasa.sphere_points(100)
+    probe = 1.4
+
+    SASA = sasa.calc_SASA_frame(coords, radii, points, probe, chunksize=37)
+
+    R = radii + probe
+    SASA_brute = np.zeros(natoms)
+    for i in range(natoms):
+        spherepoints = coords[i] + R[i] * points
+        occluded = np.zeros(len(points), dtype=bool)
+        for j in range(natoms):
+            if j != i:
+                occluded |= np.sum((spherepoints - coords[j])**2, axis=1) < R[j]**2
+        SASA_brute[i] = 4 * np.pi * R[i]**2 * (1 - occluded.mean())
+    assert(np.allclose(SASA, SASA_brute))
+
+
+def test_trajSASA_parallel():
+    """Tests that frame-parallel SASA time series matches serial calculation."""
+    import MDAnalysis as mda
+    from MDAnalysis.coordinates.memory import MemoryReader
+
+    natoms = 20
+    nframes = 7
+    u = mda.Universe.empty(natoms, trajectory=True)
+    u.add_TopologyAttr('name', ['C'] * 10 + ['O'] * 10)
+    traj = np.random.random_sample((nframes, natoms, 3)) * 10
+    u.load_new(traj.astype(np.float32), format=MemoryReader)
+
+    sa = sasa.SASAAnalysis()
+    ts_serial = sa.calc_trajSASA(u, "all", 2, npoints=50)
+    ts_parallel = sa.calc_trajSASA(u, "all", 2, npoints=50, nworkers=2, framesperchunk=1)
+    assert(ts_serial.data_array.shape == (4, natoms))
+    assert(np.allclose(ts_serial.time_array, ts_parallel.time_array))
+    assert(np.allclose(ts_serial.data_array, ts_parallel.data_array))
+
+
+def test_trajSASA_parallel_files(tmp_path):
+    """Tests that frame-parallel SASA of a file-backed Universe, reopened by each worker, matches serial calculation."""
+    import MDAnalysis as mda
+    from MDAnalysis.coordinates.memory import MemoryReader
+
+    natoms = 20
+    nframes = 5
+    u = mda.Universe.empty(natoms, n_residues=1, trajectory=True)
+    u.add_TopologyAttr('name', ['C'] * 10 + ['O'] * 10)
+    u.add_TopologyAttr('resname', ['MOL'])
+    u.add_TopologyAttr('resid', [1])
+    traj = np.random.random_sample((nframes, natoms, 3)) * 10
+    u.load_new(traj.astype(np.float32), format=MemoryReader, dimensions=[50, 50, 50, 90, 90, 90])
+    structf = str(tmp_path / "struct.gro")
+    trajf = str(tmp_path / "traj.xtc")
+    u.atoms.write(structf)
+    with mda.Writer(trajf, natoms) as W:
+        for ts in u.trajectory:
+            W.write(u.atoms)
+
+    u = mda.Universe(structf, trajf)
+    sa = sasa.SASAAnalysis()
+    ts_serial = sa.calc_trajSASA(u, "all", 1, npoints=50)
+    ts_parallel = sa.calc_trajSASA(u, "all", 1, npoints=50, nworkers=2, framesperchunk=2)
+    assert(ts_serial.data_array.shape == (nframes, natoms))
+    assert(np.allclose(ts_serial.time_array, ts_parallel.time_array))
+    assert(np.allclose(ts_serial.data_array, ts_parallel.data_array))
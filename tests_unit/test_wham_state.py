@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from INDUSAnalysis.ensemble.polymers.wham_state import CalcState
+
+
+def test_CalcState(tmp_path):
+    """Tests save/load roundtrip of solved WHAM state and restoring it onto a new calculation object"""
+    calc = SimpleNamespace(x_l=np.random.rand(100), G_l=np.log(np.full(100, 0.01)), g_i=np.array([0, 1.5]))
+    umbrellas = {"potential": "harmonic", "KAPPA": 0.5, "n_star_win": ["unbiased", 10]}
+    CalcState.from_calc(calc, [60, 40], 0.4, umbrellas).save(str(tmp_path / "calc_state"))
+
+    state = CalcState.load(str(tmp_path / "calc_state"))
+    assert(isinstance(state.G_l, np.memmap))
+    assert(state.beta == 0.4)
+    assert(state.umbrellas == umbrellas)
+    assert(np.all(state.N_i == [60, 40]))
+
+    calc_restored = state.restore(SimpleNamespace())
+    for name in ["x_l", "G_l", "g_i"]:
+        assert(np.allclose(getattr(calc_restored, name), getattr(calc, name)))
+
+    # Overwrite existing state
+    calc.g_i = np.array([0, 2.5])
+    CalcState.from_calc(calc, [60, 40], 0.4, umbrellas).save(str(tmp_path / "calc_state"))
+    assert(np.allclose(CalcState.load(str(tmp_path / "calc_state")).g_i, [0, 2.5]))
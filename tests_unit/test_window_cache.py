@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+
+from INDUSAnalysis.ensemble.polymers.window_cache import WindowCache
+
+
+def test_WindowCache(tmp_path):
+    """Tests that cached windows are memory-mapped, and that entries are invalidated by file and parameter changes"""
+    files = []
+    for i in range(3):
+        f = tmp_path / "win{}.dat".format(i)
+        np.savetxt(f, np.random.rand(10 + i))
+        files.append(str(f))
+
+    nreads = [0]
+
+    def reader():
+        nreads[0] += 1
+        return [np.loadtxt(f)[::step] for f in files]
+
+    cache = WindowCache(str(tmp_path / "cache"))
+    step = 1
+    arrays = cache.get("x", files, {"step": step}, reader)
+    arrays_cached = cache.get("x", files, {"step": step}, reader)
+    assert(nreads[0] == 1)
+    assert([len(arr) for arr in arrays_cached] == [10, 11, 12])
+    for arr, f in zip(arrays_cached, files):
+        assert(isinstance(arr, np.memmap))
+        assert(np.allclose(arr, np.loadtxt(f)))
+
+    # Change in slicing parameters
+    step = 2
+    arrays = cache.get("x", files, {"step": step}, reader)
+    assert(nreads[0] == 2)
+    assert([len(arr) for arr in arrays] == [5, 6, 6])
+
+    # Change in source file
+    np.savetxt(files[1], np.random.rand(20))
+    os.utime(files[1], (0, 0))
+    arrays = cache.get("x", files, {"step": step}, reader)
+    assert(nreads[0] == 3)
+    assert(len(arrays[1]) == 10)